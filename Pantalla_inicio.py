@@ -1,6 +1,5 @@
 import streamlit as st
-import importlib.util
-import sys
+import importlib
 
 # ==========================================
 # 1. CONFIGURACIÓN Y ESTILOS
@@ -44,7 +43,25 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================================
-# 2. LÓGICA DE AUTENTICACIÓN
+# 2. REGISTRO DE PÁGINAS
+# ==========================================
+# Cada página es una función sin argumentos. Las de planificación viven en
+# su propio módulo y se importan la primera vez que se abren (pandas, numpy,
+# openpyxl… no se cargan hasta entonces), así el login aparece al instante.
+def pagina_perezosa(modulo, funcion="main"):
+    """Entrada de página que importa `modulo` solo cuando se abre."""
+    def entrada():
+        getattr(importlib.import_module(modulo), funcion)()
+    return entrada
+
+PAGINAS = {
+    "Nueva propuesta": pagina_perezosa("V3"),
+    "Historial de propuestas": pagina_perezosa("historial"),
+    "Calendarios": pagina_perezosa("calendario"),
+}
+
+# ==========================================
+# 3. LÓGICA DE AUTENTICACIÓN
 # ==========================================
 if 'autenticado' not in st.session_state:
     st.session_state.autenticado = False
@@ -64,7 +81,7 @@ if not st.session_state.autenticado:
     st.stop()
 
 # ==========================================
-# 3. SIDEBAR (PERMANENTE)
+# 4. SIDEBAR (PERMANENTE)
 # ==========================================
 with st.sidebar:
     st.markdown('<div class="mosh-logo">Proyecto-X</div>', unsafe_allow_html=True)
@@ -92,7 +109,7 @@ with st.sidebar:
         st.rerun()
 
 # ==========================================
-# 4. CUERPO PRINCIPAL (CONTENIDO DINÁMICO)
+# 5. CUERPO PRINCIPAL (CONTENIDO DINÁMICO)
 # ==========================================
 
 # Cabecera de Grifols (Siempre visible)
@@ -102,22 +119,7 @@ with head_col2: st.markdown('<div style="color: #003366; font-size: 24px; font-w
 st.write("---")
 
 # Lógica de despliegue
-if st.session_state.current_page == 'Nueva propuesta':
-    # Intentamos importar y ejecutar el archivo V3.py
-    try:
-        import V3
-        # Importante: Aquí llamamos a la función principal de tu V3.py
-        # Si tu V3.py no tiene funciones y es código directo, se ejecutará al importar
-        # pero es mejor llamar a una función específica:
-        V3.main() 
-    except Exception as e:
-        st.error(f"Error al cargar la librería V3: {e}")
-        st.info("Asegúrate de que V3.py esté en la raíz de tu repositorio y tenga una función llamada main()")
-
-elif st.session_state.current_page == 'Historial de propuestas':
-    st.header("Historial de propuestas")
-    st.write("Aquí se mostrará el histórico de datos.")
-
-elif st.session_state.current_page == 'Calendarios':
-    st.header("Calendarios de Producción")
-    st.write("Vista de planificación.")
+try:
+    PAGINAS[st.session_state.current_page]()
+except Exception as e:
+    st.error(f"Error al cargar la página '{st.session_state.current_page}': {e}")
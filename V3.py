@@ -7,22 +7,45 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-from datetime import datetime, timedelta
-
-# ------------------------------------------------------------
-# CONFIGURACIÓN DE PÁGINA
-# ------------------------------------------------------------
-st.set_page_config(
-    page_title="Sistema de Cálculo de Fabricación",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
+import json
+import weakref
+from datetime import datetime
+
+from planificador import (
+    to_float_safe, norm_code, a_fechas,
+    modo_C_en_bloques, bloques_con_horas, reunir_bloques,
+    acumular_cubo, reunir_cubo, horas_por_centro, total_propuestas, carga_semanal,
+    POLITICAS_ORDEN, agregar_bloque, consumo_de_propuestas, exportar_en_bloques, TAM_BLOQUE,
+)
+from ingesta import leer_en_paralelo, huella_bytes, huella_df
+from paralelo import planificar_por_centros
+from historial import registrar_ejecucion
+from esquemas import normalizar_columnas
+from calendario import cargar_calendarios, lunes_semana
+from replanes import (
+    nueva_cache, clave_replan, tamano, buscar, guardar,
+    registrar_paso, puede_deshacer, puede_rehacer, mover,
+)
+from compromisos import (
+    liberar_plan, borrar_compromisos, ultima_liberacion,
+    cargar_carga_comprometida, cargar_demanda_comprometida, demanda_pendiente,
+)
+from maestros import huella_maestro, buscar_maestro, compartir_maestro, indice, estado_maestros
+from memoria import nueva_sesion, testigo_sesion, guardar_marco, leer_marco, estado_memoria
+from perfilado import perfilar, resumen_perfil, comprimir_captura
+from visor import visor_paginado, vista_previa, resumen_columnas
+from asignacion import (
+    plantas_por_centro, matriz_costes, asignar_centros, cuotas_semana, repartir_por_cuotas,
+)
+from diferencias import (
+    CLAVES_DIFERENCIA, diferencia_propuestas, resumen_diferencias, horas_desplazadas,
+    materiales_cambiados, claves_en,
 )
 
 # ------------------------------------------------------------
 # ESTILOS CSS 
 # ------------------------------------------------------------
-st.markdown("""
+ESTILOS = """
 <style>
 .main { padding-top: 2rem; }
 
@@ -48,7 +71,7 @@ h2 { color: #2c3e50; border-bottom: 3px solid #1f77b4; padding-bottom: 0.5rem; }
 .stButton > button { width: 100%; font-weight: bold; border-radius: 8px; }
 .small-note { color:#7f8c8d; font-size:0.85rem; }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # ------------------------------------------------------------
 # RUTA
@@ -56,6 +79,14 @@ h2 { color: #2c3e50; border-bottom: 3px solid #1f77b4; padding-bottom: 0.5rem; }
 UPLOAD_DIR = "archivos_cargados"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Nombres en pantalla de las políticas de orden del planificador
+ORDENES_UI = {
+    None: "Orden de llegada (por material)",
+    "fecha": "Fecha de necesidad más temprana",
+    "prioridad": "Prioridad del cliente y fecha",
+    "lote": "Fecha y lote más pequeño",
+}
+
 # ------------------------------------------------------------
 # UTILIDADES
 # ------------------------------------------------------------
@@ -68,61 +99,53 @@ def guardar_archivo(archivo, nombre):
             f.write(archivo.getbuffer())
         return p
 
-def to_float_safe(v, default=0.0):
-    if pd.isna(v): return float(default)
-    if isinstance(v, str):
-        v = v.replace(",", ".").strip()
-        if v == "": return float(default)
-    try:
-        return float(v)
-    except:
-        return float(default)
-
-def norm_code(code):
-    s = str(code).strip()
-    if s.endswith(".0"): s = s[:-2]
-    digits = "".join(ch for ch in s if s and ch.isdigit())
-    if digits == "": return s
-    if len(digits) < 4:
-        digits = digits.zfill(4)
-    return digits
-
-def semana_iso_str_from_ts(ts: pd.Timestamp) -> str:
-    """Devuelve semana ISO como 'YYYY-Www' (lunes-domingo)."""
-    iso = ts.isocalendar()
-    return f"{int(iso.year)}-W{int(iso.week):02d}"
-
-def detectar_columna_cliente(df):
-    posibles = [
-        "cliente","client","customer",
-        "id cliente","codigo cliente","cod cliente",
-        "cliente id","sap cliente"
-    ]
-    low = {c: c.lower().strip() for c in df.columns}
-    for orig, l in low.items():
-        for p in posibles:
-            if p == l or p in l:
-                return orig
-    return None
+# Los DataFrames propios de la sesión (demanda, propuestas, cubos…) se
+# guardan en el gobernador de memoria (ver memoria.py), no en session_state
+def id_sesion():
+    if "id_sesion" not in st.session_state:
+        st.session_state.id_sesion = nueva_sesion()
+        # Al descartarse la sesión se borran sus marcos (ver memoria.py)
+        st.session_state.testigo_sesion = testigo_sesion(st.session_state.id_sesion)
+    return st.session_state.id_sesion
+
+def guardar_df(clave, df):
+    guardar_marco(id_sesion(), clave, df)
+
+def leer_df(clave):
+    return leer_marco(id_sesion(), clave)
+
+def guardar_estado(estado):
+    """Estado del cálculo (ver ejecutar_modoC_base): sus DataFrames van al gobernador."""
+    marcos = sorted(k for k, v in estado.items() if isinstance(v, pd.DataFrame))
+    for k in marcos:
+        guardar_df(f"estado_{k}", estado[k])
+    st.session_state.estado_calculo = {
+        **{k: v for k, v in estado.items() if k not in marcos}, "marcos": marcos,
+    }
+
+def leer_estado():
+    """Estado del último cálculo con sus DataFrames (None si no hay o ha caducado)."""
+    estado = st.session_state.get("estado_calculo")
+    if estado is None:
+        return None
+    marcos = {k: leer_df(f"estado_{k}") for k in estado["marcos"]}
+    if any(v is None for v in marcos.values()):
+        return None
+    return {**estado, **marcos}
 
 def leer_capacidades(df_cap):
     if "Centro" not in df_cap.columns:
         st.error("❌ Falta la columna 'Centro' en Capacidad")
         st.stop()
 
-    col_lower = {c: c.lower().strip() for c in df_cap.columns}
-    cap_col = None
-    for c, low in col_lower.items():
-        if low == "capacidad horas" or ("capacidad" in low and "hora" in low):
-            cap_col = c
-            break
-    if cap_col is None:
+    # Columnas ya con nombre canónico (ver esquemas.py)
+    if "Capacidad horas" not in df_cap.columns:
         st.error("❌ No se encuentra la columna 'Capacidad horas' en Capacidad")
         st.stop()
 
     capacidades = {}
     for _, r in df_cap.iterrows():
-        capacidades[norm_code(r["Centro"])] = to_float_safe(r[cap_col], 0)
+        capacidades[norm_code(r["Centro"])] = to_float_safe(r["Capacidad horas"], 0)
     return capacidades
 
 def detectar_centros_desde_capacidades(capacidades):
@@ -131,440 +154,722 @@ def detectar_centros_desde_capacidades(capacidades):
     MCH = next((k for k in keys if k.endswith("184")), keys[-1])
     return DG, MCH, keys
 
-def repartir_porcentaje(df_semana, pct_dg, dg, mch):
-    if pct_dg <= 0:
-        df_semana["Centro"] = mch
-        return df_semana
-    if pct_dg >= 100:
-        df_semana["Centro"] = dg
-        return df_semana
-
-    df_semana = df_semana.sort_values("Horas", ascending=False)
-    total = df_semana["Horas"].sum()
-    objetivo = total * (pct_dg / 100)
-
-    acum = 0
-    destinos = []
-    for _, r in df_semana.iterrows():
-        if acum < objetivo:
-            destinos.append(dg)
-            acum += r["Horas"]
-        else:
-            destinos.append(mch)
-
-    df_semana["Centro"] = destinos
-    return df_semana
+# ------------------------------------------------------------
+# Generación inicial (usa el planificador por lotes)
+# ------------------------------------------------------------
+def agregar_demanda(df_mat, df_cli, df_dem, capacidades, plantas):
+    """Decisión de centro por coste y demanda agregada por material, centro y fecha."""
+    # Fechas y semana ISO
+    df_dem = df_dem.copy()
+    df_dem["Fecha_DT"] = a_fechas(df_dem["Fecha de necesidad"])
+    iso = df_dem["Fecha_DT"].dt.isocalendar()
+    df_dem["Semana_Label"] = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+
+    # Merge con maestros (columnas canónicas resueltas al cargar)
+    if "Cliente" not in df_dem.columns or "Cliente" not in df_cli.columns:
+        st.error("❌ No se encontró la columna de cliente en Demanda o Clientes.")
+        st.stop()
+
+    df = df_dem.merge(df_mat, on=["Material", "Unidad"], how="left")
+    df = df.merge(df_cli, on="Cliente", how="left")
+
+    # Decisión por coste: matriz demanda × centro y argmin por filas
+    costes, permitido = matriz_costes(df, plantas, capacidades)
+    df["Centro_Base"] = asignar_centros(costes, permitido, plantas)
+
+    # Para el desvío por capacidad: coste total en cada centro y si la
+    # demanda puede ir a más de un centro (no es de un cliente exclusivo)
+    columnas_coste = [f"Coste {c}" for c in plantas]
+    df[columnas_coste] = costes
+    df["Desviable"] = permitido.sum(axis=1) > 1
+
+    # Agrupar demanda base
+    g = df.groupby(
+        ["Material","Unidad","Centro_Base","Fecha de necesidad","Semana_Label"], dropna=False
+    ).agg({
+        "Cantidad":"sum",
+        "Tamaño lote mínimo":"first",
+        "Tamaño lote máximo":"first",
+        **{c: "sum" for c in columnas_coste},
+        "Desviable":"all",
+        # Prioridad del cliente más urgente de la agrupación (menor = antes)
+        **({"Prioridad":"min"} if "Prioridad" in df.columns else {}),
+    }).reset_index()
+    # Coste por unidad (media ponderada por cantidad) en cada centro
+    g[columnas_coste] = g[columnas_coste].div(g["Cantidad"].where(g["Cantidad"] != 0), axis=0)
+
+    g = g.rename(columns={
+        "Centro_Base":"Centro",
+        "Fecha de necesidad":"Fecha",
+        "Semana_Label":"Semana"
+    })
+    g["Centro"] = g["Centro"].apply(norm_code)
+    g["Lote_min"] = g["Tamaño lote mínimo"]
+    g["Lote_max"] = g["Tamaño lote máximo"]
+    return g[["Material","Unidad","Centro","Cantidad","Fecha","Semana","Lote_min","Lote_max",
+              *columnas_coste, "Desviable", *(["Prioridad"] if "Prioridad" in g.columns else [])]]
+
+
+def ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem, calendarios=None, coste_retraso=None, orden=None,
+                        atras=None, consumido=None, cubierta=None, previo=None):
+    # Arranque en caliente: `consumido` son las horas ya comprometidas por
+    # centro y día y `cubierta` la demanda que ya está en planes liberados
+    # (ver compromisos.py); solo se planifica la demanda pendiente.
+    #
+    # Incremental: `previo` es el estado de un cálculo anterior con los
+    # mismos maestros y opciones. Solo se recalculan la decisión de centro y
+    # la agregación de los materiales cuya demanda cambió, y solo se vuelven
+    # a planificar los centros afectados (sin desvío, cada centro se
+    # planifica con independencia de los demás); el resto se reutiliza.
+    capacidades = dict(indice(df_cap, "capacidades", leer_capacidades))
+    DG_code, MCH_code, _ = detectar_centros_desde_capacidades(capacidades)
+    plantas = plantas_por_centro(df_cap, DG_code, MCH_code)
+
+    afectados = None
+    if previo is None:
+        g = agregar_demanda(df_mat, df_cli, df_dem, capacidades, plantas)
+    else:
+        cambiados = materiales_cambiados(previo["dem"], df_dem)
+        en_previo = claves_en(previo["g"], cambiados)
+        g_cambio = agregar_demanda(df_mat, df_cli, df_dem[claves_en(df_dem, cambiados)], capacidades, plantas)
+        g = pd.concat([previo["g"][~en_previo], g_cambio], ignore_index=True).sort_values(
+            ["Material","Unidad","Centro","Fecha","Semana"], kind="stable", ignore_index=True
+        )
+        if coste_retraso is None:
+            afectados = set(previo["g"].loc[en_previo, "Centro"]) | set(g_cambio["Centro"])
+
+    pendiente = demanda_pendiente(g, cubierta)
+    a_planificar = pendiente
+    conservadas = {}
+    if previo is not None:
+        # En orden de llegada los materiales se planifican uno tras otro: los
+        # anteriores al primer material cambiado salen igual, así que se
+        # conservan sus órdenes y su consumo de capacidad se reconstruye
+        cambiada_prev = claves_en(previo["pendiente"], cambiados)
+        cambiada_nueva = claves_en(pendiente, cambiados)
+        corte = 0
+        if orden is None:
+            corte = min(
+                int(np.argmax(cambiada_prev)) if cambiada_prev.any() else len(cambiada_prev),
+                int(np.argmax(cambiada_nueva)) if cambiada_nueva.any() else len(cambiada_nueva),
+            )
+        if corte:
+            prefijo = pendiente.iloc[:corte]
+            en_prefijo = claves_en(previo["propuesta"], prefijo[["Material","Unidad"]].drop_duplicates())
+            conservadas["prefijo"] = previo["propuesta"][en_prefijo]
+            consumo = consumo_de_propuestas(prefijo, conservadas["prefijo"], df_mat, DG_code, plantas)
+            consumido = consumo if consumido is None else pd.concat([consumido, consumo], ignore_index=True)
+            a_planificar = pendiente.iloc[corte:]
+        if afectados is not None:
+            # Sin desvío, los centros sin cambios conservan sus órdenes
+            fuera = ~previo["propuesta"]["Centro"].isin(afectados)
+            if corte:
+                fuera &= ~en_prefijo
+            conservadas["centros"] = previo["propuesta"][fuera]
+            a_planificar = a_planificar[a_planificar["Centro"].isin(afectados)]
+
+    # Propuestas (planificador por lotes con capacidad, cada centro en un
+    # proceso si la demanda es grande), con las horas calculadas bloque a
+    # bloque según salen del planificador
+    bloques = planificar_por_centros(
+        df_agr=a_planificar,
+        df_mat=df_mat,
+        capacidades=capacidades,
+        DG_code=DG_code, MCH_code=MCH_code,
+        calendarios=calendarios, plantas=plantas,
+        coste_retraso=coste_retraso, orden=orden, atras=atras, consumido=consumido
+    )
+    partes = []
+    df_c = reunir_bloques(acumular_cubo(bloques_con_horas(bloques, df_mat, DG_code, plantas), partes))
+
+    if conservadas:
+        # Órdenes conservadas + nuevas en el orden de un cálculo completo y
+        # renumeradas: primero las del prefijo y el resto por material y
+        # centro (con políticas de orden la numeración puede variar)
+        partes += [agregar_bloque(c) for c in conservadas.values()]
+        if "centros" in conservadas:
+            df_c = pd.concat([conservadas["centros"], df_c], ignore_index=True).sort_values(
+                ["Material","Unidad","Centro"], kind="stable", ignore_index=True
+            )
+        if "prefijo" in conservadas:
+            df_c = pd.concat([conservadas["prefijo"], df_c], ignore_index=True)
+        df_c["Nº de propuesta"] = np.arange(1, len(df_c) + 1)
+    cubo = reunir_cubo(partes)
+
+    estado = {
+        "dem": df_dem, "g": g, "pendiente": pendiente, "propuesta": df_c, "cubo": cubo,
+        # Demanda que cubre esta propuesta (la que se guarda al liberarla)
+        "demanda": pendiente[["Material","Unidad","Fecha","Cantidad"]],
+        # Cálculo incremental: materiales con cambios y centros re‑planificados
+        "cambiados": None if previo is None else len(cambiados),
+        "afectados": afectados,
+    }
+    return df_c, capacidades, DG_code, MCH_code, cubo, estado
 
 # ------------------------------------------------------------
-# Planificador por lotes con capacidad diaria
+# Reajuste semanal + Replanificación
 # ------------------------------------------------------------
-def modo_C(df_agr, df_mat, capacidades, DG_code, MCH_code):
-    tiempos = df_mat[[
-        "Material","Unidad",
-        "Tiempo fabricación unidad DG",
-        "Tiempo fabricación unidad MCH",
-        "Tamaño lote mínimo","Tamaño lote máximo"
-    ]].drop_duplicates()
-
-    df = df_agr.merge(tiempos, on=["Material","Unidad"], how="left")
-
-    capacidad_restante = {}
-    def get_cap(centro, fecha):
-        key = (centro, fecha)
-        if key not in capacidad_restante:
-            capacidad_restante[key] = capacidades.get(centro, 0)
-        return capacidad_restante[key]
-
-    def consume(centro, fecha, h):
-        capacidad_restante[(centro, fecha)] = max(0.0, get_cap(centro, fecha) - h)
-
-    def horas_nec(centro, qty, r):
-        tu = r["Tiempo fabricación unidad DG"] if centro == DG_code else r["Tiempo fabricación unidad MCH"]
-        return qty * to_float_safe(tu)
-
-    def cant_por_cap(centro, cap_h, r):
-        tu = r["Tiempo fabricación unidad DG"] if centro == DG_code else r["Tiempo fabricación unidad MCH"]
-        tu = to_float_safe(tu)
-        if tu == 0: return 0
-        return cap_h / tu
-
-    out = []
-    contador = 1
-
-    for _, r in df.iterrows():
-        centro = norm_code(r["Centro"])
-        fecha = pd.to_datetime(r["Fecha"]).normalize()
-        semana = semana_iso_str_from_ts(fecha)
-
-        cantidad = to_float_safe(r.get("Cantidad", 0), 0)
-        lote_min = to_float_safe(r.get("Lote_min", r.get("Tamaño lote mínimo", 0)), 0)
-        lote_max = to_float_safe(r.get("Lote_max", r.get("Tamaño lote máximo", 1)), 1)
-
-        total = max(cantidad, lote_min)
-        lote_max = max(1.0, lote_max)
-
-        partes = []
-        pendiente = total
-        while pendiente > 0:
-            q = min(pendiente, lote_max)
-            partes.append(round(q,2))
-            pendiente -= q
-
-        for ql in partes:
-            p = ql
-            while p > 0:
-                cap = get_cap(centro, fecha)
-                hnec = horas_nec(centro, p, r)
-
-                if cap >= hnec:
-                    consume(centro, fecha, hnec)
-                    out.append({
-                        "Nº de propuesta": contador,
-                        "Material": r["Material"],
-                        "Centro": centro,
-                        "Clase de orden": "NORM",
-                        "Cantidad a fabricar": round(p,2),
-                        "Unidad": r["Unidad"],
-                        "Fecha": fecha.strftime("%d.%m.%Y"),
-                        "Semana": semana,          # (se usa internamente)
-                        "Lote_min": lote_min,
-                        "Lote_max": lote_max
-                    })
-                    contador += 1
-                    p = 0
-                else:
-                    posible = cant_por_cap(centro, cap, r)
-                    if posible <= 0:
-                        fecha += timedelta(days=1)
-                        semana = semana_iso_str_from_ts(fecha)
-                        continue
-
-                    hprod = horas_nec(centro, posible, r)
-                    consume(centro, fecha, hprod)
-                    out.append({
-                        "Nº de propuesta": contador,
-                        "Material": r["Material"],
-                        "Centro": centro,
-                        "Clase de orden": "NORM",
-                        "Cantidad a fabricar": round(posible,2),
-                        "Unidad": r["Unidad"],
-                        "Fecha": fecha.strftime("%d.%m.%Y"),
-                        "Semana": semana,
-                        "Lote_min": lote_min,
-                        "Lote_max": lote_max
-                    })
-                    contador += 1
-                    p -= posible
-
-    return pd.DataFrame(out)
+def replanificar_con_porcentajes(df_base, df_mat, capacidades, DG_code, MCH_code, ajustes,
+                                 calendarios=None, plantas=None, orden=None, atras=None, consumido=None,
+                                 valla=None):
+    # `ajustes[sem]` es el % de DG (dos centros) o {centro: %} (N centros)
+    #
+    # Horizonte congelado: las semanas anteriores a `valla` ('YYYY-Www') ya
+    # están en planta y se conservan tal cual; sus horas se descuentan de la
+    # capacidad y solo se reparten y re‑planifican las semanas siguientes.
+    semana = df_base["Semana"].astype(str)
+    congelada = (semana < valla).to_numpy() if valla else np.zeros(len(df_base), dtype=bool)
+    df_congelado = df_base[congelada]
+    df_libre = df_base[~congelada]
+
+    if len(df_congelado):
+        reservado = df_congelado[["Centro","Fecha","Horas"]]
+        if atras is not None:
+            # Hacia atrás no se adelanta nada dentro de la ventana congelada
+            lunes = lunes_semana(valla)
+            dias = pd.date_range(lunes - pd.Timedelta(days=atras), lunes - pd.Timedelta(days=1))
+            reservado = pd.concat([reservado, pd.DataFrame({
+                "Centro": np.repeat(list(capacidades), len(dias)),
+                "Fecha": np.tile(dias, len(capacidades)),
+                "Horas": np.inf,
+            })], ignore_index=True)
+        consumido = reservado if consumido is None else pd.concat([consumido, reservado], ignore_index=True)
+
+    df_repartido = []
+    for sem, df_sem in df_libre.groupby(semana[~congelada].where(df_libre["Semana"].notna())):
+        df_sem = repartir_por_cuotas(df_sem.copy(), cuotas_semana(ajustes.get(sem, 50), DG_code, MCH_code))
+        df_repartido.append(df_sem)
+
+    df_adj = pd.concat(df_repartido, ignore_index=True) if df_repartido else df_libre.copy()
+
+    df_adj_pre = df_adj.rename(columns={"Cantidad a fabricar":"Cantidad"})[
+        ["Material","Unidad","Centro","Cantidad","Fecha","Semana","Lote_min","Lote_max"]
+    ]
+    bloques = modo_C_en_bloques(
+        df_adj_pre, df_mat, capacidades, DG_code, MCH_code, calendarios=calendarios, plantas=plantas,
+        orden=orden, atras=atras, consumido=consumido
+    )
+
+    # Recalcular Horas (y el cubo de carga a la vez)
+    partes = []
+    df_final = reunir_bloques(acumular_cubo(bloques_con_horas(bloques, df_mat, DG_code, plantas), partes))
+    if len(df_congelado):
+        # Las órdenes congeladas van primero, con su numeración de siempre
+        partes.append(agregar_bloque(df_congelado))
+        df_final["Nº de propuesta"] += int(df_congelado["Nº de propuesta"].max())
+        df_final = pd.concat([df_congelado, df_final], ignore_index=True) if len(df_final) else df_congelado.reset_index(drop=True)
+    return df_final, reunir_cubo(partes)
 
 # ------------------------------------------------------------
-# ENCABEZADO — Título y subtítulo centrados en la página
+# Historial: cada cálculo queda registrado (ver historial.py)
 # ------------------------------------------------------------
-st.markdown(
-    """
-    <div style="width:100%;display:flex;justify-content:center;">
-        <div style="max-width:1000px;width:100%;text-align:center;">
-            <h1 style="color:#1f77b4;margin-bottom:0.6rem;">📊 Sistema de Cálculo de Fabricación</h1>
-            <p style="color:#2c3e50;font-size:1.05rem;line-height:1.45;margin:.2rem 0 0 0;padding:0 12px;">
-                Carga los 4 archivos Excel necesarios, se ejecutará una primera planificación,
-                y en caso de ser necesario, ajusta los porcentajes por semana y genera la planificación completa.
-            </p>
-        </div>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
-st.markdown("---")
+def registrar_en_historial(tipo, propuesta, cubo, ajustes=None, base_id=None, base=None):
+    """Registra el cálculo y devuelve su id (None si no se pudo guardar)."""
+    hashes = {
+        TIPOS_CARGA[clave]: st.session_state.get(f"hash_{clave}") or huella_df(archivo(clave))
+        for clave in TIPOS_CARGA
+    }
+    try:
+        return registrar_ejecucion(
+            tipo, st.session_state.get("usuario"), hashes, ajustes, propuesta, cubo,
+            base_id=base_id, base=base,
+        )
+    except Exception as e:
+        st.warning(f"No se pudo guardar la ejecución en el historial: {e}")
+        return None
 
-# ============================================================
-# TABS
-# ============================================================
-tab1, tab2 = st.tabs(["📥 Carga de Archivos", "⚙️ Ajuste y Ejecución"])
+# ------------------------------------------------------------
+# Perfilado: con «Perfilar» activado el cálculo se captura (ver perfilado.py)
+# ------------------------------------------------------------
+def calcular(tipo, funcion, **argumentos):
+    """`funcion(**argumentos)`, perfilada y guardada si la sesión tiene «Perfilar» activado."""
+    if not st.session_state.get("perfilar", False):
+        return funcion(**argumentos)
+    resultado, carpeta = perfilar(tipo, funcion, argumentos)
+    if carpeta is None:
+        st.warning("Hay otro perfilador activo en el servidor; el cálculo se ha hecho sin perfilar.")
+    else:
+        st.session_state.ultimo_perfil = carpeta
+    return resultado
+
+def bloque_perfil():
+    carpeta = st.session_state.get("ultimo_perfil")
+    if not carpeta or not os.path.isdir(carpeta):
+        return
+    with st.expander("⏱️ Último perfil capturado"):
+        st.caption(
+            f"Captura en `{carpeta}`. Para repetir el cálculo sin interfaz: "
+            f"`python perfilado.py \"{carpeta}\" --perfilar`"
+        )
+        st.dataframe(resumen_perfil(carpeta).style.format({"Propio (s)": "{:.3f}", "Acumulado (s)": "{:.3f}"}),
+                     use_container_width=True)
+        st.download_button(
+            "⬇️ Descargar captura (pstats, pilas colapsadas y entradas)",
+            data=comprimir_captura(carpeta), file_name=f"{os.path.basename(carpeta)}.zip",
+            mime="application/zip",
+        )
+
+# ------------------------------------------------------------
+# Utilidad: mostrar y descargar sin Semana/Lote_min/Lote_max
+# ------------------------------------------------------------
+@st.fragment
+def mostrar_detalle_y_descargar(df, nombre_descarga, cubo=None):
+    cols_visibles = [
+        "Nº de propuesta","Material","Centro","Clase de orden",
+        "Cantidad a fabricar","Unidad","Fecha"
+    ]
+    cols_presentes = [c for c in cols_visibles if c in df.columns]
 
-# Variables de estado
-df_cap = df_mat = df_cli = df_dem = None
+    # Solo viaja al navegador la página pedida (filtro y orden en el servidor)
+    opciones = {} if cubo is None else {
+        "centros": sorted(cubo["Centro"].unique()), "semanas": sorted(cubo["Semana"].unique())
+    }
+    visor_paginado(df, clave=f"visor_{nombre_descarga}", columnas=cols_presentes, **opciones)
+
+    # El Excel se genera una vez por propuesta, no en cada rerun
+    output_path = os.path.join(UPLOAD_DIR, f"{nombre_descarga} {datetime.now().strftime('%Y%m%d')}.xlsx")
+    clave_excel = f"excel_{nombre_descarga}"
+    try:
+        ref, ruta = st.session_state.get(clave_excel, (None, None))
+        if ref is None or ref() is not df or ruta != output_path:
+            # Se escribe por bloques de filas (ver exportar_en_bloques). Son
+            # vistas de la propuesta ya numerada, no los bloques del
+            # planificador: la numeración final (órdenes conservadas o
+            # congeladas delante) solo se conoce al terminar el cálculo
+            exportar_en_bloques(
+                (df.iloc[i:i + TAM_BLOQUE] for i in range(0, len(df), TAM_BLOQUE)), output_path, cols_presentes
+            )
+            st.session_state[clave_excel] = (weakref.ref(df), output_path)
+        with open(output_path, "rb") as f:
+            st.download_button(
+                f"📥 Descargar {nombre_descarga} (Excel)",
+                data=f,
+                file_name=f"{nombre_descarga} {datetime.now().strftime('%Y%m%d')}.xlsx"
+            )
+    except Exception as e:
+        st.info(f"No se pudo generar el Excel: {e}")
+
+def mostrar_metricas(etiqueta, cubo, centros):
+    horas = horas_por_centro(cubo)
+    m = st.columns(1 + len(centros))
+    m[0].metric(f"Total Propuestas ({etiqueta})", f"{total_propuestas(cubo):,}".replace(",", "."))
+    for col, centro in zip(m[1:], centros):
+        col.metric(f"Horas totales {centro}", f"{horas.get(centro, 0):,.1f}h".replace(",", "."))
+
+# ------------------------------------------------------------
+# Cambios entre la propuesta inicial y la re‑planificada
+# ------------------------------------------------------------
+@st.fragment
+def mostrar_diferencias(dif, cubo_ini, cubo_fin, centros):
+    r = resumen_diferencias(dif)
+    m = st.columns(4)
+    m[0].metric("Claves añadidas", f"{r['añadidas']:,}".replace(",", "."))
+    m[1].metric("Claves eliminadas", f"{r['eliminadas']:,}".replace(",", "."))
+    m[2].metric("Claves modificadas", f"{r['modificadas']:,}".replace(",", "."))
+    m[3].metric("Cantidad movida", f"{r['cantidad_movida']:,.0f}".replace(",", "."),
+                delta=f"{r['delta_ordenes']:+,} órdenes".replace(",", "."), delta_color="off")
+
+    st.caption("Horas desplazadas por semana (re‑planificado − inicial)")
+    st.dataframe(horas_desplazadas(cubo_ini, cubo_fin, centros).style.format("{:+,.1f}"), use_container_width=True)
+
+    cambios = dif[dif["Cambio"] != "Igual"]
+    visor_paginado(
+        cambios, clave="visor_diferencias",
+        columnas=CLAVES_DIFERENCIA + ["Cambio", "Cantidad inicial", "Cantidad replan", "Δ Cantidad", "Δ Horas", "Δ Ordenes"],
+        alto=320,
+    )
+
+# Archivos de entrada: (clave en session_state, título, etiqueta del uploader,
+# key del uploader, nombre con el que se guarda, alto de la vista previa)
+CARGAS = [
+    ("df_cap", "### 🏭 Capacidad de planta", "Subir Capacidad (Capacidad horas por Centro)", "u1", "Capacidad planta", 150),
+    ("df_mat", "### 📦 Maestro de materiales", "Subir Materiales", "u2", "Maestro materiales", 400),
+    ("df_cli", "### 👥 Maestro de clientes", "Subir Clientes", "u3", "Maestro clientes", 400),
+    ("df_dem", "### 📈 Demanda", "Subir Demanda", "u4", "Demanda", 400),
+]
+
+# Tipo de cada archivo en el registro de esquemas
+TIPOS_CARGA = {"df_cap": "capacidad", "df_mat": "materiales", "df_cli": "clientes", "df_dem": "demanda"}
+
+# Archivos que son iguales para todos los planificadores: se comparten
+# entre sesiones (ver maestros.py); la demanda es de cada sesión
+MAESTROS = ("df_cap", "df_mat", "df_cli")
+
+def archivo(clave):
+    """Archivo cargado: los maestros están en session_state y la demanda en el gobernador."""
+    return st.session_state.get(clave) if clave in MAESTROS else leer_df(clave)
 
 # =========================
 # TAB 1 — CARGA
 # =========================
-with tab1:
+def tab_carga():
     st.subheader("📁 Carga tus archivos Excel")
 
     col1, col2 = st.columns(2)
-
-    # Capacidad
-    with col1:
-        st.markdown('<div class="section-container">', unsafe_allow_html=True)
-        st.markdown("### 🏭 Capacidad de planta")
-        f1 = st.file_uploader("Subir Capacidad (Capacidad horas por Centro)", type=["xlsx"], key="u1", label_visibility="collapsed")
-        if f1:
-            try:
-                df_cap = pd.read_excel(f1)
-                guardar_archivo(f1, "Capacidad planta")
-                st.session_state.df_cap = df_cap.copy()
-                st.success("✅ Cargado")
-                st.dataframe(df_cap, use_container_width=True, height=150)
-                st.caption("Lee exactamente la columna **Capacidad horas** por **Centro** (ej.: 0833=40, 0184=20).")
-            except Exception as e:
-                st.error(f"Error al leer Capacidad: {e}")
-        else:
-            st.info("Esperando archivo…")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # Materiales
-    with col2:
-        st.markdown('<div class="section-container">', unsafe_allow_html=True)
-        st.markdown("### 📦 Maestro de materiales")
-        f2 = st.file_uploader("Subir Materiales", type=["xlsx"], key="u2", label_visibility="collapsed")
-        if f2:
-            try:
-                df_mat = pd.read_excel(f2)
-                guardar_archivo(f2, "Maestro materiales")
-                st.session_state.df_mat = df_mat.copy()
+    col3, col4 = st.columns(2)
+    columnas_carga = [col1, col2, col3, col4]
+
+    # Uploaders
+    subidos = {}
+    for (clave, titulo, etiqueta, key, _, _), col in zip(CARGAS, columnas_carga):
+        with col:
+            st.markdown('<div class="section-container">', unsafe_allow_html=True)
+            st.markdown(titulo)
+            subidos[clave] = st.file_uploader(etiqueta, type=["xlsx"], key=key, label_visibility="collapsed")
+
+    # Solo se leen los archivos nuevos (los ya leídos siguen en la sesión),
+    # y todos a la vez en el pool de procesos de `ingesta`
+    nuevos = {
+        clave: f for clave, f in subidos.items()
+        if f is not None and (st.session_state.get(f"id_{clave}") != f.file_id or archivo(clave) is None)
+    }
+    errores = {}
+    if nuevos:
+        nombres = {c[0]: c[4] for c in CARGAS}
+        datos = {c: f.getvalue() for c, f in nuevos.items()}
+        huellas = {c: huella_bytes(d) for c, d in datos.items()}
+
+        def cargado(clave, df):
+            if clave in MAESTROS:
+                st.session_state[clave] = df
+            else:
+                guardar_df(clave, df)
+            st.session_state[f"id_{clave}"] = nuevos[clave].file_id
+            st.session_state[f"hash_{clave}"] = huellas[clave]
+            st.session_state[f"resumen_{clave}"] = indice(df, "resumen", resumen_columnas)
+            guardar_archivo(nuevos[clave], nombres[clave])
+
+        # Los maestros que ya leyó otra sesión salen de la caché compartida
+        for clave in [c for c in datos if c in MAESTROS]:
+            vista = buscar_maestro(huella_maestro(TIPOS_CARGA[clave], huellas[clave]))
+            if vista is not None:
+                cargado(clave, vista)
+                del datos[clave]
+
+        if datos:
+            barra = st.progress(0.0, text=f"Leyendo {len(datos)} archivo(s)…")
+
+            def avance(clave, hechos):
+                barra.progress(hechos / len(datos), text=f"✅ {nombres[clave]} leído ({hechos}/{len(datos)})")
+
+            resultados = leer_en_paralelo(datos, al_terminar=avance)
+            for clave, res in resultados.items():
+                if isinstance(res, Exception):
+                    errores[clave] = res
+                    continue
+                df = normalizar_columnas(TIPOS_CARGA[clave], res)
+                if clave in MAESTROS:
+                    df = compartir_maestro(huella_maestro(TIPOS_CARGA[clave], huellas[clave]), df)
+                cargado(clave, df)
+            barra.empty()
+
+    # Estado y vista previa de cada archivo
+    for (clave, _, _, _, nombre, alto), col in zip(CARGAS, columnas_carga):
+        with col:
+            if subidos[clave] is None:
+                st.info("Esperando archivo…")
+            elif clave in errores:
+                st.error(f"Error al leer {nombre}: {errores[clave]}")
+            else:
                 st.success("✅ Cargado")
-                st.dataframe(df_mat, use_container_width=True, height=400)
-            except Exception as e:
-                st.error(f"Error al leer Materiales: {e}")
-        else:
-            st.info("Esperando archivo…")
-        st.markdown('</div>', unsafe_allow_html=True)
+                vista_previa(archivo(clave), st.session_state.get(f"resumen_{clave}"), alto)
+                if clave == "df_cap":
+                    st.caption("Lee exactamente la columna **Capacidad horas** por **Centro** (ej.: 0833=40, 0184=20).")
+            st.markdown('</div>', unsafe_allow_html=True)
 
-    col3, col4 = st.columns(2)
+# ------------------------------------------------------------
+# Bloque de reajuste: fragmento que se re‑ejecuta solo
+# ------------------------------------------------------------
+# Marcos de cada resultado de re‑planificación: los de la caché se guardan
+# en el gobernador como "<marco>:<clave>" y el vigente con su nombre
+MARCOS_REPLAN = ("df_final_reajuste", "cubo_final", "diferencias")
 
-    # Clientes
-    with col3:
-        st.markdown('<div class="section-container">', unsafe_allow_html=True)
-        st.markdown("### 👥 Maestro de clientes")
-        f3 = st.file_uploader("Subir Clientes", type=["xlsx"], key="u3", label_visibility="collapsed")
-        if f3:
-            try:
-                df_cli = pd.read_excel(f3)
-                guardar_archivo(f3, "Maestro clientes")
-                st.session_state.df_cli = df_cli.copy()
-                st.success("✅ Cargado")
-                st.dataframe(df_cli, use_container_width=True, height=400)
-            except Exception as e:
-                st.error(f"Error al leer Clientes: {e}")
-        else:
-            st.info("Esperando archivo…")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # Demanda
-    with col4:
-        st.markdown('<div class="section-container">', unsafe_allow_html=True)
-        st.markdown("### 📈 Demanda")
-        f4 = st.file_uploader("Subir Demanda", type=["xlsx"], key="u4", label_visibility="collapsed")
-        if f4:
+def descartar_replanes(claves):
+    for clave in claves:
+        for m in MARCOS_REPLAN:
+            guardar_df(f"{m}:{clave}", None)
+
+def aplicar_replan(ajustes, valla):
+    """Re‑planifica con `ajustes` (o recupera el resultado de la caché) y lo deja en la sesión.
+
+    Devuelve False si no se pudo re‑planificar (el error ya se muestra).
+    """
+    cache = st.session_state.cache_replan
+    calendarios = cargar_calendarios()
+    # Orden y planificación hacia atrás: los del cálculo inicial, no los del selector actual
+    orden = st.session_state.get("orden_plan")
+    atras = st.session_state.get("atras_calculo")
+    clave = clave_replan(
+        st.session_state.firma_base, ajustes, valla=valla, calendarios=calendarios, orden=orden, atras=atras
+    )
+    resultado = buscar(cache, clave)
+    marcos = [leer_df(f"{m}:{clave}") for m in MARCOS_REPLAN] if resultado is not None else []
+    if resultado is None or any(m is None for m in marcos):
+        df_base = leer_df("df_base")
+        with st.spinner("Aplicando reparto y re‑planificando…"):
             try:
-                df_dem = pd.read_excel(f4)
-                guardar_archivo(f4, "Demanda")
-                st.session_state.df_dem = df_dem.copy()
-                st.success("✅ Cargado")
-                st.dataframe(df_dem, use_container_width=True, height=400)
-            except Exception as e:
-                st.error(f"Error al leer Demanda: {e}")
-        else:
-            st.info("Esperando archivo…")
-        st.markdown('</div>', unsafe_allow_html=True)
+                df_final, cubo_final = calcular(
+                    "replan", replanificar_con_porcentajes,
+                    df_base=df_base,
+                    df_mat=st.session_state.df_mat,
+                    capacidades=st.session_state.capacidades,
+                    DG_code=st.session_state.DG,
+                    MCH_code=st.session_state.MCH,
+                    ajustes=ajustes,
+                    calendarios=calendarios,
+                    plantas=st.session_state.plantas,
+                    orden=orden,
+                    atras=atras,
+                    consumido=leer_df("consumido"),
+                    valla=valla
+                )
+            except ValueError as e:
+                st.error(f"❌ No se pudo re‑planificar: {e}")
+                return False
+            dif = diferencia_propuestas(df_base, df_final)
+        # La re‑planificación se guarda como cambios sobre el cálculo inicial
+        eid = registrar_en_historial(
+            "replan", df_final, cubo_final, ajustes,
+            base_id=st.session_state.get("id_historial_base"), base=df_base,
+        )
+        marcos = [df_final, cubo_final, dif]
+        for m, df in zip(MARCOS_REPLAN, marcos):
+            guardar_df(f"{m}:{clave}", df)
+        resultado = (eid,)
+        descartar_replanes(guardar(cache, clave, resultado, tamano(*marcos)))
+    registrar_paso(cache, clave, ajustes, {"valla": valla})
+
+    for m, df in zip(MARCOS_REPLAN, marcos):
+        guardar_df(m, df)
+    st.session_state.id_historial_final = resultado[0]
+    st.session_state.plan_liberado = False
+    st.session_state.aviso_replan = True
+    return True
+
+@st.fragment
+def bloque_reajuste(lista_semanas, centros):
+    # Mover un slider re‑ejecuta solo este bloque; al aplicar se relanza la
+    # página completa para pintar los resultados nuevos.
+    cache = st.session_state.cache_replan
+
+    # Deshacer / rehacer: antes de crear los widgets se les devuelve el
+    # valor de la configuración a la que se vuelve
+    n1, n2, n3 = st.columns([1, 1, 2])
+    paso = (
+        -1 if n1.button("↶ Deshacer", use_container_width=True, disabled=not puede_deshacer(cache))
+        else 1 if n2.button("↷ Rehacer", use_container_width=True, disabled=not puede_rehacer(cache))
+        else 0
+    )
+    n3.caption(
+        f"Configuración {cache['posicion'] + 1} de {len(cache['pasos'])} · "
+        f"{len(cache['entradas'])} resultados en caché ({cache['bytes'] / 2**20:,.1f} MB)".replace(",", ".")
+    )
+    if paso:
+        _, ajustes_paso, opciones = mover(cache, paso)
+        for sem, v in ajustes_paso.items():
+            if not isinstance(v, dict):
+                st.session_state[f"slider_{sem}"] = v
+        if any(isinstance(v, dict) for v in ajustes_paso.values()):
+            st.session_state.cuotas_iniciales = pd.DataFrame.from_dict(ajustes_paso, orient="index")
+            st.session_state.pop("cuotas_semanas", None)
+        st.session_state.valla = opciones.get("valla")
+        if aplicar_replan(ajustes_paso, opciones.get("valla")):
+            st.rerun()
+
+    ajustes = {}
+    # Horizonte congelado: las semanas anteriores a la valla no se tocan
+    valla = st.selectbox(
+        "Primera semana re‑planificable (las anteriores quedan congeladas)", lista_semanas, key="valla",
+    ) if lista_semanas else None
+    if len(centros) <= 2:
+        st.markdown("**Configura los porcentajes por semana (0% = MCH · 100% = DG)**")
+        cols_sliders = st.columns(4)
+        for i, sem in enumerate(lista_semanas):
+            with cols_sliders[i % 4]:
+                # 50% por defecto; el valor vive en la sesión (deshacer/rehacer lo cambia)
+                st.session_state.setdefault(f"slider_{sem}", 50)
+                ajustes[sem] = st.slider(f"Sem {sem}", 0, 100, key=f"slider_{sem}", disabled=sem < valla)
+    else:
+        # Con más de dos centros: % de horas de cada centro por semana
+        st.markdown("**Configura el reparto por semana (% de horas de cada centro)**")
+        iniciales = st.session_state.get("cuotas_iniciales")
+        cuotas = st.data_editor(
+            iniciales.reindex(index=lista_semanas, columns=centros).fillna(round(100 / len(centros), 1))
+            if iniciales is not None
+            else pd.DataFrame(round(100 / len(centros), 1), index=lista_semanas, columns=centros),
+            use_container_width=True, key="cuotas_semanas",
+            column_config={c: st.column_config.NumberColumn(c, min_value=0, max_value=100) for c in centros},
+        )
+        ajustes = {sem: fila.to_dict() for sem, fila in cuotas.iterrows()}
+
+    st.info("Pulsa **Aplicar porcentajes** para re‑planificar.")
+    if st.button("Aplicar porcentajes y re‑planificar", use_container_width=True):
+        if aplicar_replan(ajustes, valla):
+            st.rerun()
+
+def bloque_liberar():
+    # Liberar el plan vigente (el re‑planificado si lo hay): sus horas quedan
+    # comprometidas para los cálculos siguientes
+    st.subheader("📤 Liberar plan")
+    replan = leer_df("df_final_reajuste") is not None
+    c1, c2 = st.columns(2)
+    if c1.button("Marcar como liberado", use_container_width=True,
+                 disabled=st.session_state.get("plan_liberado", False)):
+        plan = leer_df("df_final_reajuste" if replan else "df_base")
+        eid = st.session_state.get("id_historial_final") if replan else st.session_state.get("id_historial_base")
+        liberar_plan(plan, leer_df("demanda_plan"), st.session_state.get("usuario"), eid,
+                     firma=st.session_state.get("firma_base"))
+        st.session_state.plan_liberado = True
+        st.session_state.aviso_liberado = f"✅ Plan {'re‑planificado' if replan else 'inicial'} liberado: sus horas cuentan como comprometidas."
+        st.rerun()
+    if c2.button("Vaciar capacidad comprometida", use_container_width=True):
+        borrar_compromisos()
+        st.session_state.aviso_liberado = "✅ Capacidad comprometida vaciada."
+        st.rerun()
+    if st.session_state.get("aviso_liberado"):
+        st.success(st.session_state.pop("aviso_liberado"))
 
 # =========================
 # TAB 2 — EJECUCIÓN + REAJUSTE
 # =========================
-with tab2:
+def tab_ejecucion():
     # Recuperamos DataFrames (cargados en Tab 1)
-    df_cap = st.session_state.get("df_cap", None)
-    df_mat = st.session_state.get("df_mat", None)
-    df_cli = st.session_state.get("df_cli", None)
-    df_dem = st.session_state.get("df_dem", None)
+    df_cap, df_mat, df_cli, df_dem = (archivo(c) for c in TIPOS_CARGA)
 
     if any(x is None for x in [df_cap, df_mat, df_cli, df_dem]):
         st.warning("⚠️ Por favor, carga los 4 archivos en la pestaña anterior para habilitar los ajustes.")
-        st.stop()
-
-    # Limpieza de columnas
-    for d in [df_cap, df_mat, df_cli, df_dem]:
-        d.columns = d.columns.str.strip()
-
-    # -----------------------------
-    # Generación inicial (usa el planificador por lotes)
-    # -----------------------------
-    def ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem):
-        capacidades = leer_capacidades(df_cap)
-        DG_code, MCH_code, _ = detectar_centros_desde_capacidades(capacidades)
-
-        # Fechas y semana ISO
-        df_dem = df_dem.copy()
-        df_dem["Fecha_DT"] = pd.to_datetime(df_dem["Fecha de necesidad"])
-        iso = df_dem["Fecha_DT"].dt.isocalendar()
-        df_dem["Semana_Label"] = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
-
-        # Merge con maestros
-        col_cli_dem = detectar_columna_cliente(df_dem)
-        col_cli_cli = detectar_columna_cliente(df_cli)
-        if not col_cli_dem or not col_cli_cli:
-            st.error("❌ No se encontró la columna de cliente en Demanda o Clientes.")
-            st.stop()
-
-        df = df_dem.merge(df_mat, on=["Material", "Unidad"], how="left")
-        df = df.merge(df_cli, left_on=col_cli_dem, right_on=col_cli_cli, how="left")
-
-        # Decisión por coste
-        COL_COST_DG = next((c for c in df.columns if "dg" in c.lower() and "cost" in c.lower()), None)
-        COL_COST_MCH = next((c for c in df.columns if "mch" in c.lower() and "cost" in c.lower()), None)
-
-        def decidir_centro(r):
-            c1 = to_float_safe(r.get(COL_COST_DG, 0))
-            c2 = to_float_safe(r.get(COL_COST_MCH, 0))
-            return DG_code if c1 < c2 else MCH_code
-
-        df["Centro_Base"] = df.apply(decidir_centro, axis=1)
-
-        # Agrupar demanda base
-        g = df.groupby(
-            ["Material","Unidad","Centro_Base","Fecha de necesidad","Semana_Label"], dropna=False
-        ).agg({
-            "Cantidad":"sum",
-            "Tamaño lote mínimo":"first",
-            "Tamaño lote máximo":"first"
-        }).reset_index()
-
-        g = g.rename(columns={
-            "Centro_Base":"Centro",
-            "Fecha de necesidad":"Fecha",
-            "Semana_Label":"Semana"
-        })
-        g["Centro"] = g["Centro"].apply(norm_code)
-        g["Lote_min"] = g["Tamaño lote mínimo"]
-        g["Lote_max"] = g["Tamaño lote máximo"]
-
-        # Propuestas (planificador por lotes con capacidad)
-        df_c = modo_C(
-            df_agr=g[["Material","Unidad","Centro","Cantidad","Fecha","Semana","Lote_min","Lote_max"]],
-            df_mat=df_mat,
-            capacidades=capacidades,
-            DG_code=DG_code, MCH_code=MCH_code
-        )
-
-        # Calcular horas
-        tiempos = df_mat[["Material","Unidad","Tiempo fabricación unidad DG","Tiempo fabricación unidad MCH"]].drop_duplicates()
-        df_c = df_c.merge(tiempos, on=["Material","Unidad"], how="left")
-        df_c["Horas"] = np.where(
-            df_c["Centro"].astype(str) == str(DG_code),
-            df_c["Cantidad a fabricar"] * df_c["Tiempo fabricación unidad DG"],
-            df_c["Cantidad a fabricar"] * df_c["Tiempo fabricación unidad MCH"]
-        )
-
-        return df_c, capacidades, DG_code, MCH_code
-
-    # -----------------------------
-    # Reajuste semanal + Replanificación
-    # -----------------------------
-    def replanificar_con_porcentajes(df_base, df_mat, capacidades, DG_code, MCH_code, ajustes):
-        df_repartido = []
-        for sem in sorted(df_base["Semana"].dropna().astype(str).unique().tolist()):
-            df_sem = df_base[df_base["Semana"].astype(str) == sem].copy()
-            if df_sem.empty:
-                continue
-            pct = ajustes.get(sem, 50)
-            df_sem = repartir_porcentaje(df_sem, pct, DG_code, MCH_code)
-            df_repartido.append(df_sem)
-
-        df_adj = pd.concat(df_repartido, ignore_index=True) if df_repartido else df_base.copy()
-
-        df_adj_pre = df_adj.rename(columns={"Cantidad a fabricar":"Cantidad"})[
-            ["Material","Unidad","Centro","Cantidad","Fecha","Semana","Lote_min","Lote_max"]
-        ]
-        df_final = modo_C(df_adj_pre, df_mat, capacidades, DG_code, MCH_code)
-
-        # Recalcular Horas
-        tiempos = df_mat[["Material","Unidad","Tiempo fabricación unidad DG","Tiempo fabricación unidad MCH"]].drop_duplicates()
-        df_final = df_final.merge(tiempos, on=["Material","Unidad"], how="left")
-        df_final["Horas"] = np.where(
-            df_final["Centro"].astype(str) == str(DG_code),
-            df_final["Cantidad a fabricar"] * df_final["Tiempo fabricación unidad DG"],
-            df_final["Cantidad a fabricar"] * df_final["Tiempo fabricación unidad MCH"]
-        )
-        return df_final
+        return
 
     # -----------------------------
     # UI — Paso 1: Generación inicial
     # -----------------------------
     st.subheader("🚀 Generación inicial de la planificación")
 
+    # Desvío por capacidad: si un centro está lleno, mandar la orden ese mismo
+    # día a otro centro cuando el sobrecoste sea menor que el de retrasarla
+    d1, d2 = st.columns(2)
+    desviar = d1.checkbox("Desviar a otro centro cuando no haya capacidad", key="desviar")
+    coste_retraso = d2.number_input(
+        "Coste de retraso (por unidad y día)", min_value=0.0, value=0.5, step=0.1,
+        key="coste_retraso", disabled=not desviar
+    )
+    # Orden en que los lotes cogen la capacidad (ver POLITICAS_ORDEN)
+    orden = st.selectbox(
+        "Orden de planificación", [None, *POLITICAS_ORDEN], key="orden_calculo",
+        format_func=lambda o: ORDENES_UI.get(o, o),
+    )
+    # Justo a tiempo: fabricar en los últimos días libres antes de la fecha
+    # de necesidad en lugar de retrasar cuando ese día está lleno
+    j1, j2 = st.columns(2)
+    justo_a_tiempo = j1.checkbox("Planificar hacia atrás (justo a tiempo)", key="justo_a_tiempo")
+    dias_atras = j2.number_input(
+        "Adelantar como máximo (días)", min_value=0, value=30, step=1,
+        key="dias_atras", disabled=not justo_a_tiempo
+    )
+    atras = int(dias_atras) if justo_a_tiempo else None
+
+    # Arranque en caliente: descontar lo que ya se liberó en cálculos anteriores
+    liberacion = ultima_liberacion()
+    en_caliente = st.checkbox(
+        "Partir de la capacidad ya liberada (solo planificar la demanda nueva)",
+        key="en_caliente", disabled=liberacion is None,
+    )
+    if liberacion is not None:
+        st.caption(f"Última liberación: {liberacion[0]} · {liberacion[1] or '—'} · {liberacion[2]:,.1f} h".replace(",", "."))
+
+    # Incremental: si solo cambió la demanda respecto al último cálculo, se
+    # reutiliza lo que no cambió (mismos maestros, calendarios y opciones)
+    calendarios = cargar_calendarios()
+    firma = json.dumps([
+        *[st.session_state.get(f"hash_{k}") or huella_df(st.session_state[k]) for k in ("df_cap", "df_mat", "df_cli")],
+        calendarios, coste_retraso if desviar else None, orden, atras,
+        list(liberacion) if en_caliente and liberacion else None,
+    ], sort_keys=True, default=str)
+    previo = st.session_state.get("estado_calculo")
+    incremental = st.checkbox(
+        "Cálculo incremental (solo recalcular los materiales cuya demanda cambió)",
+        key="incremental", disabled=previo is None or previo.get("firma") != firma,
+    )
+
+    # Perfilado: el cálculo inicial y las re‑planificaciones se capturan con
+    # sus entradas para reproducirlos fuera de la sesión
+    st.checkbox("Perfilar este cálculo (cProfile)", key="perfilar")
+
     if st.button("🚀 EJECUTAR CÁLCULO DE PROPUESTA", use_container_width=True):
         with st.spinner("Generando planificación inicial…"):
-            df_base, capacidades, DG, MCH = ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem)
+            consumido = cargar_carga_comprometida() if en_caliente else None
+            try:
+                df_base, capacidades, DG, MCH, cubo_base, estado = calcular(
+                    "inicial", ejecutar_modoC_base,
+                    df_cap=df_cap, df_mat=df_mat, df_cli=df_cli, df_dem=df_dem, calendarios=calendarios,
+                    coste_retraso=coste_retraso if desviar else None, orden=orden, atras=atras,
+                    consumido=consumido,
+                    cubierta=cargar_demanda_comprometida() if en_caliente else None,
+                    previo=leer_estado() if incremental and previo and previo.get("firma") == firma else None,
+                )
+            except ValueError as e:
+                # Demanda sin fecha o sin capacidad suficiente en el horizonte
+                st.error(f"❌ No se pudo calcular la propuesta: {e}")
+                return
+        estado["firma"] = firma
+        guardar_df("df_base", df_base)
+        guardar_df("cubo_base", cubo_base)
+        guardar_df("demanda_plan", estado["demanda"])
+        guardar_estado(estado)
 
         st.session_state.calculo_realizado = True
-        st.session_state.df_base = df_base
         st.session_state.capacidades = capacidades
         st.session_state.DG = DG
         st.session_state.MCH = MCH
-
+        st.session_state.plantas = plantas_por_centro(df_cap, DG, MCH)
+        st.session_state.orden_plan = orden
+        st.session_state.atras_calculo = atras
+        guardar_df("consumido", consumido)
+        st.session_state.plan_liberado = False
+        st.session_state.id_historial_base = registrar_en_historial("inicial", df_base, cubo_base)
+        for m in MARCOS_REPLAN:
+            guardar_df(m, None)
+        st.session_state.id_historial_final = None
+        # Caché de re‑planificaciones de esta propuesta base
+        st.session_state.firma_base = f"{huella_df(df_base)}:{firma}"
+        if "cache_replan" in st.session_state:
+            descartar_replanes(list(st.session_state.cache_replan["entradas"]))
+        st.session_state.cache_replan = nueva_cache()
+        st.session_state.pop("cuotas_iniciales", None)
+
+        if estado["cambiados"] is not None:
+            centros_info = "todos" if estado["afectados"] is None else ", ".join(sorted(map(str, estado["afectados"]))) or "ninguno"
+            st.info(f"Cálculo incremental: {estado['cambiados']} materiales con cambios · centros re‑planificados: {centros_info}.")
         st.success("✅ Cálculo inicial completado con éxito.")
-
-    # -----------------------------
-    # Utilidad: mostrar y descargar sin Semana/Lote_min/Lote_max
-    # -----------------------------
-    def mostrar_detalle_y_descargar(df, nombre_descarga):
-        cols_visibles = [
-            "Nº de propuesta","Material","Centro","Clase de orden",
-            "Cantidad a fabricar","Unidad","Fecha"
-        ]
-        cols_presentes = [c for c in cols_visibles if c in df.columns]
-
-        st.dataframe(df[cols_presentes], use_container_width=True, height=420)
-
-        output_path = os.path.join(UPLOAD_DIR, f"{nombre_descarga} {datetime.now().strftime('%Y%m%d')}.xlsx")
-        try:
-            df[cols_presentes].to_excel(output_path, index=False)
-            with open(output_path, "rb") as f:
-                st.download_button(
-                    f"📥 Descargar {nombre_descarga} (Excel)",
-                    data=f,
-                    file_name=f"{nombre_descarga} {datetime.now().strftime('%Y%m%d')}.xlsx"
-                )
-        except Exception as e:
-            st.info(f"No se pudo generar el Excel: {e}")
+    bloque_perfil()
 
     # -----------------------------
     # Mostrar resultados del cálculo inicial
     # -----------------------------
+    df_base, cubo_base = leer_df("df_base"), leer_df("cubo_base")
+    if st.session_state.get("calculo_realizado", False) and (df_base is None or cubo_base is None):
+        # Los datos de una sesión inactiva caducan (ver memoria.py)
+        st.session_state.calculo_realizado = False
+        st.info("Los resultados de esta sesión han caducado; vuelve a ejecutar el cálculo.")
     if st.session_state.get("calculo_realizado", False):
-        df_base = st.session_state.df_base
         DG = st.session_state.DG
         MCH = st.session_state.MCH
+        # DG y MCH primero; después el resto de centros de la capacidad
+        centros = list(dict.fromkeys([DG, MCH, *st.session_state.plantas]))
 
-        # Métricas
-        total_props = len(df_base)
-        horas_por_centro = df_base.groupby("Centro")["Horas"].sum().to_dict()
-        m = st.columns(3)
-        m[0].metric("Total Propuestas (inicial)", f"{total_props:,}".replace(",", "."))
-        m[1].metric(f"Horas totales {DG}", f"{horas_por_centro.get(DG, 0):,.1f}h".replace(",", "."))
-        m[2].metric(f"Horas totales {MCH}", f"{horas_por_centro.get(MCH, 0):,.1f}h".replace(",", "."))
+        # Métricas y gráficos: siempre desde el cubo de carga, no desde la propuesta
+        mostrar_metricas("inicial", cubo_base, centros)
 
         # Distribución semanal (inicial)
         st.subheader("📊 Distribución de Carga Horaria (semanal)")
-        df_base_plot = df_base.copy()
-        df_base_plot["Centro"] = df_base_plot["Centro"].astype(str)
-        df_base_plot["Semana"] = df_base_plot["Semana"].astype(str)  # asegura la 'W' como texto
-        carga_plot_ini = (
-            df_base_plot.groupby(["Semana", "Centro"])["Horas"]
-                        .sum()
-                        .unstack()
-                        .fillna(0)
-                        .sort_index()
-        )
-        col_order = [str(DG), str(MCH)]
-        carga_plot_ini = carga_plot_ini.reindex(columns=[c for c in col_order if c in carga_plot_ini.columns])
+        carga_plot_ini = carga_semanal(cubo_base, centros)
         st.bar_chart(carga_plot_ini, use_container_width=True)
         st.caption("Resumen semanal de horas por centro (inicial)")
         st.dataframe(carga_plot_ini.style.format("{:,.1f}"), use_container_width=True)
 
         st.markdown("---")
         st.subheader("📋 Detalle de la Propuesta (inicial)")
-        mostrar_detalle_y_descargar(df_base, "Propuesta Inicial")
+        mostrar_detalle_y_descargar(df_base, "Propuesta Inicial", cubo_base)
 
         st.markdown("---")
         st.subheader("🔁 ¿Quieres reajustar por semana y re‑planificar?")
@@ -573,64 +878,95 @@ with tab2:
             st.session_state.mostrar_reajuste = True
 
         if st.session_state.get("mostrar_reajuste", False):
-            lista_semanas = sorted(df_base["Semana"].dropna().astype(str).unique())
-            st.markdown("**Configura los porcentajes por semana (0% = MCH · 100% = DG)**")
-            ajustes = {}
-            cols_sliders = st.columns(4)
-            for i, sem in enumerate(lista_semanas):
-                with cols_sliders[i % 4]:
-                    ajustes[sem] = st.slider(f"Sem {sem}", 0, 100, 50, key=f"slider_{sem}")
-
-            st.info("Pulsa **Aplicar porcentajes** para re‑planificar.")
-            if st.button("Aplicar porcentajes y re‑planificar", use_container_width=True):
-                with st.spinner("Aplicando reparto y re‑planificando…"):
-                    df_final = replanificar_con_porcentajes(
-                        df_base=st.session_state.df_base,
-                        df_mat=st.session_state.df_mat,
-                        capacidades=st.session_state.capacidades,
-                        DG_code=st.session_state.DG,
-                        MCH_code=st.session_state.MCH,
-                        ajustes=ajustes
-                    )
-                st.session_state.df_final_reajuste = df_final
-                st.success("✅ Re‑planificación completada.")
+            bloque_reajuste(carga_plot_ini.index.tolist(), centros)
+
+        if st.session_state.pop("aviso_replan", False):
+            st.success("✅ Re‑planificación completada.")
 
         # Resultados finales
-        if st.session_state.get("df_final_reajuste", None) is not None:
-            df_final = st.session_state.df_final_reajuste
+        df_final, cubo_final, diferencias = (leer_df(m) for m in MARCOS_REPLAN)
+        if df_final is not None:
 
             st.markdown("---")
             st.subheader("📈 Resultados tras Re‑planificación")
-            horas_por_centro_final = df_final.groupby("Centro")["Horas"].sum().to_dict()
-            m2 = st.columns(3)
-            m2[0].metric("Total Propuestas (reajuste)", f"{len(df_final):,}".replace(",", "."))
-            m2[1].metric(f"Horas totales {DG}", f"{horas_por_centro_final.get(DG, 0):,.1f}h".replace(",", "."))
-            m2[2].metric(f"Horas totales {MCH}", f"{horas_por_centro_final.get(MCH, 0):,.1f}h".replace(",", "."))
+            mostrar_metricas("reajuste", cubo_final, centros)
 
             st.subheader("📊 Distribución de Carga Horaria (semanal) — Re‑planificación")
-            df_final_plot = df_final.copy()
-            df_final_plot["Centro"] = df_final_plot["Centro"].astype(str)
-            df_final_plot["Semana"] = df_final_plot["Semana"].astype(str)
-            carga_plot_fin = (
-                df_final_plot.groupby(["Semana", "Centro"])["Horas"]
-                             .sum()
-                             .unstack()
-                             .fillna(0)
-                             .sort_index()
-            )
-            col_order = [str(DG), str(MCH)]
-            carga_plot_fin = carga_plot_fin.reindex(columns=[c for c in col_order if c in carga_plot_fin.columns])
+            carga_plot_fin = carga_semanal(cubo_final, centros)
             st.bar_chart(carga_plot_fin, use_container_width=True)
             st.caption("Resumen semanal de horas por centro (re‑planificado)")
             st.dataframe(carga_plot_fin.style.format("{:,.1f}"), use_container_width=True)
 
             st.subheader("📋 Detalle de la Propuesta (reajustada)")
-            mostrar_detalle_y_descargar(df_final, "Propuesta Replan")
-
-# Footer — Versión 3
-st.markdown("---")
-st.markdown("""
-<div class="footer">
-    <p>✨ <strong>Sistema de Cálculo de Fabricación</strong> — Versión 3</p>
-</div>
-""", unsafe_allow_html=True)
+            mostrar_detalle_y_descargar(df_final, "Propuesta Replan", cubo_final)
+
+            st.markdown("---")
+            st.subheader("🔍 Cambios respecto a la propuesta inicial")
+            mostrar_diferencias(diferencias, cubo_base, cubo_final, centros)
+
+        st.markdown("---")
+        bloque_liberar()
+
+def bloque_memoria():
+    # Memoria del servidor: marcos de todas las sesiones (ver memoria.py)
+    # y maestros compartidos (ver maestros.py)
+    est = estado_memoria(id_sesion())
+    maestros = estado_maestros()
+    mb = lambda b: f"{b / 2**20:,.1f} MB".replace(",", ".")
+    with st.expander("🧠 Memoria del servidor"):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("En memoria (todas las sesiones)", mb(est["memoria"] + est["mapeado"]),
+                  help=f"Límite: {mb(est['limite'])}; por encima se vuelcan a disco los datos usados hace más tiempo.")
+        c2.metric("Volcado a disco", mb(est["disco"]))
+        c3.metric("Sesiones con datos", est["sesiones"])
+        c4.metric("Maestros compartidos", f"{len(maestros)} · {mb(sum(m[2] for m in maestros) * 2**20)}")
+        propia = est["sesion"]
+        st.caption(
+            f"Esta sesión: {mb(propia['memoria'])} en memoria · {mb(propia['mapeado'])} mapeados desde disco · "
+            f"{mb(propia['disco'])} solo en disco ({propia['marcos']} tablas)"
+        )
+
+def main():
+    """Punto de entrada de la página (lo llama el router de Pantalla_inicio.py)."""
+    st.markdown(ESTILOS, unsafe_allow_html=True)
+
+    # ENCABEZADO — Título y subtítulo centrados en la página
+    st.markdown(
+        """
+        <div style="width:100%;display:flex;justify-content:center;">
+            <div style="max-width:1000px;width:100%;text-align:center;">
+                <h1 style="color:#1f77b4;margin-bottom:0.6rem;">📊 Sistema de Cálculo de Fabricación</h1>
+                <p style="color:#2c3e50;font-size:1.05rem;line-height:1.45;margin:.2rem 0 0 0;padding:0 12px;">
+                    Carga los 4 archivos Excel necesarios, se ejecutará una primera planificación,
+                    y en caso de ser necesario, ajusta los porcentajes por semana y genera la planificación completa.
+                </p>
+            </div>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+    tab1, tab2 = st.tabs(["📥 Carga de Archivos", "⚙️ Ajuste y Ejecución"])
+    with tab1:
+        tab_carga()
+    with tab2:
+        tab_ejecucion()
+    bloque_memoria()
+
+    st.markdown("---")
+    st.markdown("""
+    <div class="footer">
+        <p>✨ <strong>Sistema de Cálculo de Fabricación</strong> — Versión 3</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+if __name__ == "__main__":
+    # Ejecución directa con `streamlit run V3.py`
+    st.set_page_config(
+        page_title="Sistema de Cálculo de Fabricación",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    main()
@@ -0,0 +1,135 @@
+# ============================================================
+# ASIGNACIÓN — Elección de centro con N plantas
+# ============================================================
+# Cada centro de la capacidad tiene su planta (DG, MCH, …) y las columnas
+# de los maestros llevan el nombre de la planta: "Coste unitario DG",
+# "Distáncia a MCH", "Exclusivo DG"… Con ellas se monta una matriz densa
+# demanda × centro de costes y el centro se elige con un argmin por filas,
+# sin recorrer la demanda fila a fila.
+
+import numpy as np
+
+from planificador import a_float, norm_code
+
+# Variantes de nombre de columna que aparecen en los maestros ({p} = planta, {c} = centro)
+COLUMNAS_COSTE_UNITARIO = ["Coste unitario {p}", "Coste fabricacion unidad {p}"]
+COLUMNAS_DISTANCIA = ["Distáncia a {p}", "Distancia a {p}", "Distancia a {c}"]
+COLUMNAS_COSTE_ENVIO = ["Coste del envío {p}", "Coste del envio {p}"]
+COLUMNAS_EXCLUSIVO = ["Exclusivo {p}", "Exclusico {p}"]
+
+
+def plantas_por_centro(df_cap, DG_code=None, MCH_code=None):
+    """{centro: planta}: DG y MCH primero y el resto en el orden del archivo.
+
+    Sin columna 'Planta' se usan los nombres de siempre: DG y MCH para los
+    centros detectados y el propio código para el resto.
+    """
+    centros = [norm_code(c) for c in df_cap["Centro"]]
+    if "Planta" in df_cap.columns:
+        plantas = dict(zip(centros, [str(p).strip() for p in df_cap["Planta"]]))
+    else:
+        plantas = {c: "DG" if c == DG_code else "MCH" if c == MCH_code else c for c in centros}
+    orden = dict.fromkeys([c for c in (DG_code, MCH_code) if c in plantas] + centros)
+    return {c: plantas[c] for c in orden}
+
+
+def columna(df, plantillas, planta, centro):
+    """Primera columna de `df` que encaja con alguna de las `plantillas` (o None)."""
+    for plantilla in plantillas:
+        nombre = plantilla.format(p=planta, c=centro)
+        if nombre in df.columns:
+            return nombre
+    return None
+
+
+def matriz_columnas(df, plantillas, plantas, default=0.0):
+    """Matriz (filas × centros) con la columna de cada planta (o `default` si no existe)."""
+    m = np.full((len(df), len(plantas)), float(default))
+    for j, (centro, planta) in enumerate(plantas.items()):
+        col = columna(df, plantillas, planta, centro)
+        if col is not None:
+            m[:, j] = a_float(df[col], default).to_numpy()
+    return m
+
+
+# ------------------------------------------------------------
+# Costes y elección de centro
+# ------------------------------------------------------------
+def matriz_costes(df, plantas, capacidades=None):
+    """Coste de servir cada fila de demanda desde cada centro.
+
+    coste = Cantidad × (coste unitario + distancia × coste del envío)
+
+    Devuelve (costes, permitido): `permitido` es la máscara de exclusividad
+    (si un cliente es exclusivo de alguna planta solo valen esas) combinada
+    con los centros sin capacidad.
+    """
+    cantidad = a_float(df["Cantidad"], 0).to_numpy()[:, None]
+    unitario = matriz_columnas(df, COLUMNAS_COSTE_UNITARIO, plantas)
+    envio = (
+        matriz_columnas(df, COLUMNAS_DISTANCIA, plantas)
+        * matriz_columnas(df, COLUMNAS_COSTE_ENVIO, plantas)
+    )
+    costes = cantidad * (unitario + envio)
+
+    exclusivo = np.zeros((len(df), len(plantas)), dtype=bool)
+    for j, (centro, planta) in enumerate(plantas.items()):
+        col = columna(df, COLUMNAS_EXCLUSIVO, planta, centro)
+        if col is not None:
+            exclusivo[:, j] = df[col].astype(str).str.strip().str.upper().eq("X").to_numpy()
+    permitido = np.where(exclusivo.any(axis=1, keepdims=True), exclusivo, True)
+
+    if capacidades is not None:
+        con_capacidad = np.array([capacidades.get(c, 0) > 0 for c in plantas], dtype=bool)
+        if con_capacidad.any():
+            permitido &= con_capacidad
+    return costes, permitido
+
+
+def asignar_centros(costes, permitido, centros):
+    """Centro de menor coste permitido para cada fila (argmin vectorizado).
+
+    Los costes no numéricos cuentan como infinitos; si una fila no tiene
+    ningún centro permitido se elige entre todos. En empate gana el último
+    (con DG y MCH, MCH, como en la decisión por coste de siempre).
+    """
+    costes = np.where(np.isnan(costes), np.inf, costes)
+    sin_opcion = ~permitido.any(axis=1, keepdims=True)
+    efectivo = np.where(permitido | sin_opcion, costes, np.inf)
+    ultimo = efectivo.shape[1] - 1 - np.argmin(efectivo[:, ::-1], axis=1)
+    return np.asarray(list(centros), dtype=object)[ultimo]
+
+
+# ------------------------------------------------------------
+# Reparto semanal por cuotas
+# ------------------------------------------------------------
+def cuotas_semana(ajuste, DG_code, MCH_code):
+    """Cuotas {centro: %} de una semana; un número es el % de DG (el resto va a MCH)."""
+    if isinstance(ajuste, dict):
+        return ajuste
+    return {DG_code: float(ajuste), MCH_code: 100.0 - float(ajuste)}
+
+
+def repartir_por_cuotas(df_semana, cuotas):
+    """Reparte las filas de una semana entre centros según sus cuotas de horas.
+
+    Las filas se ordenan por horas (de mayor a menor) y cada una va al
+    centro en cuyo tramo acumulado empieza: con dos centros es el mismo
+    reparto que el de los sliders DG/MCH.
+    """
+    centros = list(cuotas)
+    pesos = np.clip(np.array([float(cuotas[c]) for c in centros]), 0, None)
+    if pesos.sum() <= 0:
+        pesos = np.ones(len(centros))
+    llenos = np.flatnonzero(pesos >= pesos.sum())
+    if len(llenos):
+        df_semana["Centro"] = centros[llenos[0]]
+        return df_semana
+
+    df_semana = df_semana.sort_values("Horas", ascending=False)
+    horas = df_semana["Horas"].to_numpy(dtype=float)
+    umbrales = np.cumsum(pesos / pesos.sum()) * horas.sum()
+    acum_previo = np.cumsum(horas) - horas
+    idx = np.minimum(np.searchsorted(umbrales, acum_previo, side="right"), len(centros) - 1)
+    df_semana["Centro"] = np.asarray(centros, dtype=object)[idx]
+    return df_semana
@@ -0,0 +1,169 @@
+# ============================================================
+# CALENDARIO — Días laborables y capacidad diaria por centro
+# ============================================================
+# Cada centro tiene sus días laborables de la semana, sus festivos y
+# capacidades especiales para días concretos. A partir de eso se
+# precalcula un array de horas disponibles por día para todo el
+# horizonte, que es lo que consulta el planificador.
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+RUTA_CALENDARIOS = os.path.join("archivos_cargados", "calendarios.json")
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+# Sin calendario guardado, el centro trabaja todos los días con su
+# capacidad base (el comportamiento de siempre)
+CALENDARIO_DEFECTO = {"laborables": list(range(7)), "festivos": [], "capacidad": {}}
+
+
+# ------------------------------------------------------------
+# Persistencia
+# ------------------------------------------------------------
+def cargar_calendarios(ruta=RUTA_CALENDARIOS):
+    """{centro: {"laborables": [0..6], "festivos": ["YYYY-MM-DD"], "capacidad": {"YYYY-MM-DD": horas}}}"""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_calendarios(calendarios, ruta=RUTA_CALENDARIOS):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(calendarios, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def calendario_centro(calendarios, centro):
+    cal = dict(CALENDARIO_DEFECTO)
+    cal.update((calendarios or {}).get(centro, {}))
+    return cal
+
+
+# ------------------------------------------------------------
+# Arrays por día
+# ------------------------------------------------------------
+def dias_desde(origen, dias):
+    """Array datetime64[D] con `dias` días consecutivos a partir de `origen`."""
+    return np.datetime64(pd.Timestamp(origen).date(), "D") + np.arange(dias)
+
+
+def capacidad_diaria(cap_base, origen, dias, cal=None):
+    """Horas disponibles en cada uno de los `dias` días a partir de `origen`.
+
+    Los días no laborables y los festivos valen 0; las capacidades
+    especiales sustituyen a la base en su día (también en festivos).
+    """
+    cal = cal or CALENDARIO_DEFECTO
+    fechas = dias_desde(origen, dias)
+    dia_semana = (fechas.astype(np.int64) + 3) % 7          # 1970‑01‑01 fue jueves
+    laborable = np.isin(dia_semana, cal.get("laborables", range(7)))
+    if cal.get("festivos"):
+        laborable &= ~np.isin(fechas, np.array(cal["festivos"], dtype="datetime64[D]"))
+    cap = np.where(laborable, float(cap_base), 0.0)
+
+    especiales = cal.get("capacidad") or {}
+    if especiales:
+        dias_esp = np.array(list(especiales), dtype="datetime64[D]")
+        horas = np.array(list(especiales.values()), dtype=float)
+        idx = (dias_esp - fechas[0]).astype(np.int64)
+        dentro = (idx >= 0) & (idx < dias)
+        cap[idx[dentro]] = horas[dentro]
+    return cap
+
+
+def etiquetas_dias(origen, dias):
+    """Fecha 'dd.mm.YYYY' y semana ISO 'YYYY-Www' de cada día del horizonte."""
+    idx = pd.DatetimeIndex(dias_desde(origen, dias))
+    iso = idx.isocalendar()
+    semanas = iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2)
+    return np.asarray(idx.strftime("%d.%m.%Y")), semanas.to_numpy()
+
+
+def lunes_semana(semana):
+    """Lunes de la semana ISO 'YYYY-Www'."""
+    año, num = semana.split("-W")
+    return pd.Timestamp.fromisocalendar(int(año), int(num), 1)
+
+
+# ------------------------------------------------------------
+# Página "Calendarios"
+# ------------------------------------------------------------
+def main():
+    # planificador.py importa este módulo: norm_code se importa aquí
+    from planificador import norm_code
+
+    st.header("Calendarios de Producción")
+
+    calendarios = cargar_calendarios()
+    capacidades = st.session_state.get("capacidades") or {}
+    centros = sorted(set(calendarios) | set(capacidades))
+
+    c1, c2 = st.columns([2, 1])
+    nuevo = c2.text_input("Añadir centro", key="cal_nuevo").strip()
+    # Mismo código que en la capacidad y el planificador ("833" → "0833")
+    nuevo = norm_code(nuevo) if nuevo else ""
+    if nuevo and nuevo not in centros:
+        centros.append(nuevo)
+    if not centros:
+        st.info("Ejecuta un cálculo o añade un centro para configurar su calendario.")
+        return
+    centro = c1.selectbox("Centro", centros, key="cal_centro")
+    cal = calendario_centro(calendarios, centro)
+
+    laborables = st.multiselect(
+        "Días laborables", list(range(7)), default=cal["laborables"],
+        format_func=lambda d: DIAS_SEMANA[d], key=f"cal_lab_{centro}"
+    )
+
+    e1, e2 = st.columns(2)
+    with e1:
+        st.markdown("**Festivos**")
+        festivos = st.data_editor(
+            pd.DataFrame({"Fecha": pd.to_datetime(pd.Series(cal["festivos"], dtype=object))}),
+            num_rows="dynamic", use_container_width=True, key=f"cal_fest_{centro}",
+            column_config={"Fecha": st.column_config.DateColumn("Fecha", format="DD.MM.YYYY")},
+        )
+    with e2:
+        st.markdown("**Capacidad especial por día**")
+        especiales = st.data_editor(
+            pd.DataFrame({
+                "Fecha": pd.to_datetime(pd.Series(list(cal["capacidad"]), dtype=object)),
+                "Horas": pd.Series(list(cal["capacidad"].values()), dtype=float),
+            }),
+            num_rows="dynamic", use_container_width=True, key=f"cal_cap_{centro}",
+            column_config={"Fecha": st.column_config.DateColumn("Fecha", format="DD.MM.YYYY")},
+        )
+
+    nuevo_cal = {
+        "laborables": sorted(laborables),
+        "festivos": sorted(pd.to_datetime(festivos["Fecha"].dropna()).dt.strftime("%Y-%m-%d").unique().tolist()),
+        "capacidad": {
+            pd.Timestamp(f).strftime("%Y-%m-%d"): float(h)
+            for f, h in zip(especiales["Fecha"], especiales["Horas"])
+            if pd.notna(f) and pd.notna(h)
+        },
+    }
+    if st.button("💾 Guardar calendario", use_container_width=True):
+        calendarios[centro] = nuevo_cal
+        guardar_calendarios(calendarios)
+        st.success(f"✅ Calendario de {centro} guardado.")
+
+    # Vista previa: capacidad de las próximas semanas (semana × día)
+    st.markdown("---")
+    cap_base = st.number_input(
+        "Capacidad base (horas/día)", min_value=0.0,
+        value=float(capacidades.get(centro, 8.0)), key=f"cal_base_{centro}"
+    )
+    lunes = pd.Timestamp.today().normalize() - pd.Timedelta(days=pd.Timestamp.today().weekday())
+    semanas = st.slider("Semanas a mostrar", 4, 52, 12, key="cal_semanas")
+    cap = capacidad_diaria(cap_base, lunes, semanas * 7, nuevo_cal)
+    _, etiquetas = etiquetas_dias(lunes, semanas * 7)
+    vista = pd.DataFrame(cap.reshape(semanas, 7), index=etiquetas[::7], columns=DIAS_SEMANA)
+    st.dataframe(vista.style.format("{:,.1f}"), use_container_width=True)
+    st.caption(f"Total del periodo: {cap.sum():,.1f} h".replace(",", "."))
@@ -0,0 +1,155 @@
+# ============================================================
+# COMPARTIDA — DataFrames en memoria compartida para el pool de procesos
+# ============================================================
+# Mandar un DataFrame a un proceso trabajador lo serializa entero en cada
+# tarea. Aquí se publica una sola vez en un bloque de memoria compartida
+# (multiprocessing.shared_memory) con un array tipado por columna, y a los
+# trabajadores solo viaja un descriptor pequeño (nombre del bloque y
+# posiciones), del mismo tamaño sea cual sea la tabla.
+#
+# Las columnas numéricas, booleanas y de fechas se leen en el trabajador
+# como vistas del bloque, sin copiar. Las de texto se guardan como códigos
+# enteros (también vistas) más sus valores distintos, que van en el mismo
+# bloque; el trabajador rehace la columna con ellos.
+
+import pickle
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Alineación de cada array dentro del bloque
+ALINEACION = 64
+
+# Bloques abiertos en este proceso por `adjuntar` (nombre -> SharedMemory)
+_ADJUNTOS = {}
+_LOCK_REGISTRO = threading.Lock()
+
+
+def _alinear(n):
+    return -(-n // ALINEACION) * ALINEACION
+
+
+def _abrir(nombre):
+    """Abre un bloque existente sin que este proceso lo dé por suyo."""
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 registra también los bloques que solo se abren y el
+    # registro es uno por nombre: se omite para que el de quien lo publicó
+    # siga valiendo hasta `liberar`
+    with _LOCK_REGISTRO:
+        registrar = resource_tracker.register
+        resource_tracker.register = lambda nombre, tipo: None
+        try:
+            return shared_memory.SharedMemory(name=nombre)
+        finally:
+            resource_tracker.register = registrar
+
+
+def _arrays(df):
+    """[(columna, array, valores de texto o None)] con los arrays tipados de `df`."""
+    salida = []
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, np.dtype) and serie.dtype.kind in "biufcmM":
+            salida.append((col, serie.to_numpy(), None))
+        else:
+            codigos, valores = pd.factorize(serie, use_na_sentinel=True)
+            salida.append((col, codigos.astype(np.int32 if len(valores) < 2**31 else np.int64), valores))
+    return salida
+
+
+# ------------------------------------------------------------
+# Publicar y liberar (proceso que reparte el trabajo)
+# ------------------------------------------------------------
+def publicar(df):
+    """Copia `df` a un bloque de memoria compartida y devuelve su descriptor.
+
+    El bloque sigue existiendo hasta `liberar(descriptor)`.
+    """
+    arrays = _arrays(df)
+    textos = {col: pickle.dumps(valores, protocol=pickle.HIGHEST_PROTOCOL)
+              for col, _, valores in arrays if valores is not None}
+    posicion, columnas = 0, []
+    for col, arr, valores in arrays:
+        columna = {"columna": col, "dtype": arr.dtype.str, "inicio": posicion, "texto": None}
+        posicion += _alinear(arr.nbytes)
+        if valores is not None:
+            columna["texto"] = (posicion, len(textos[col]), str(df[col].dtype))
+            posicion += _alinear(len(textos[col]))
+        columnas.append(columna)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(posicion, 1))
+    try:
+        for (col, arr, valores), columna in zip(arrays, columnas):
+            destino = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf, offset=columna["inicio"])
+            destino[:] = arr
+            del destino
+            if valores is not None:
+                inicio, n, _ = columna["texto"]
+                shm.buf[inicio:inicio + n] = textos[col]
+    finally:
+        shm.close()
+    return {"nombre": shm.name, "filas": len(df), "columnas": columnas}
+
+
+def liberar(descriptor):
+    """Borra el bloque de un descriptor (cuando ya no lo usa ningún trabajador)."""
+    shm = _abrir(descriptor["nombre"])
+    shm.close()
+    shm.unlink()
+
+
+# ------------------------------------------------------------
+# Adjuntar (trabajadores)
+# ------------------------------------------------------------
+def _cerrar_otros(actuales):
+    """Cierra los bloques abiertos antes que ya no se usan (los que aún tienen vistas, no)."""
+    for nombre in [n for n in _ADJUNTOS if n not in actuales]:
+        try:
+            _ADJUNTOS[nombre].close()
+        except BufferError:
+            continue
+        del _ADJUNTOS[nombre]
+
+
+def adjuntar(descriptor, mantener=()):
+    """DataFrame publicado con `publicar`, leyendo del bloque compartido.
+
+    Las columnas numéricas son vistas de solo lectura sobre el bloque. El
+    bloque queda abierto en este proceso mientras se use; los de llamadas
+    anteriores que no estén en `mantener` (nombres) se cierran.
+    """
+    nombre = descriptor["nombre"]
+    _cerrar_otros({nombre, *mantener})
+    if nombre not in _ADJUNTOS:
+        _ADJUNTOS[nombre] = _abrir(nombre)
+    buf = _ADJUNTOS[nombre].buf
+
+    datos = {}
+    for columna in descriptor["columnas"]:
+        arr = np.ndarray(
+            (descriptor["filas"],), dtype=np.dtype(columna["dtype"]), buffer=buf, offset=columna["inicio"]
+        )
+        arr.flags.writeable = False
+        if columna["texto"] is None:
+            datos[columna["columna"]] = arr
+        else:
+            inicio, n, dtype = columna["texto"]
+            valores = pickle.loads(buf[inicio:inicio + n])
+            datos[columna["columna"]] = pd.Categorical.from_codes(arr, valores).astype(dtype)
+    return pd.DataFrame(datos, copy=False)
+
+
+def recoger(descriptor):
+    """Copia a memoria propia el DataFrame de un descriptor y borra el bloque."""
+    df = adjuntar(descriptor, mantener=_ADJUNTOS)
+    copia = df.copy(deep=True)
+    del df
+    shm = _ADJUNTOS.pop(descriptor["nombre"])
+    shm.close()
+    shm.unlink()
+    return copia
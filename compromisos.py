@@ -0,0 +1,179 @@
+# ============================================================
+# COMPROMISOS — Capacidad de los planes ya liberados
+# ============================================================
+# Al liberar un plan (pasarlo a SAP) sus horas por centro y día se suman a
+# un libro persistente, junto con la demanda que cubre. El siguiente
+# cálculo arranca con ese libro ya descontado de la capacidad y solo
+# planifica la demanda que aún no está cubierta, así que su coste depende
+# de la demanda nueva y no de todo el horizonte. Liberar otra vez el mismo
+# cálculo (el plan re‑planificado tras el inicial) sustituye lo liberado.
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from historial import RUTA_HISTORIAL, conectar
+from planificador import a_fechas
+
+CLAVES_DEMANDA = ["Material", "Unidad", "Fecha"]
+
+
+def _fechas_iso(serie):
+    return a_fechas(serie).dt.strftime("%Y-%m-%d")
+
+
+# ------------------------------------------------------------
+# Escritura
+# ------------------------------------------------------------
+def liberar_plan(propuesta, demanda, usuario=None, ejecucion_id=None, firma=None, ruta=RUTA_HISTORIAL):
+    """Suma al libro comprometido las horas de `propuesta` y la demanda que cubre.
+
+    `propuesta` necesita Centro, Fecha y Horas; `demanda` es la demanda
+    agregada que se planificó (Material, Unidad, Fecha, Cantidad). Con
+    `firma` (la del cálculo), una liberación anterior del mismo cálculo
+    (p. ej. la del plan inicial antes de re‑planificar) se sustituye en
+    lugar de sumarse.
+    """
+    carga = (
+        propuesta.assign(Centro=propuesta["Centro"].astype(str), Fecha=_fechas_iso(propuesta["Fecha"]))
+        .groupby(["Centro", "Fecha"], as_index=False)["Horas"].sum()
+    )
+    cubierta = (
+        demanda.assign(
+            Material=demanda["Material"].astype(str), Unidad=demanda["Unidad"].astype(str),
+            Fecha=_fechas_iso(demanda["Fecha"]),
+        )
+        .groupby(CLAVES_DEMANDA, as_index=False)["Cantidad"].sum()
+    )
+
+    con = conectar(ruta)
+    try:
+        with con:
+            if firma is not None:
+                _descontar_liberacion(con, firma)
+            con.executemany(
+                "INSERT INTO compromiso_carga VALUES (?, ?, ?) "
+                "ON CONFLICT (centro, fecha) DO UPDATE SET horas = horas + excluded.horas",
+                carga.itertuples(index=False),
+            )
+            con.executemany(
+                "INSERT INTO compromiso_demanda VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (material, unidad, fecha) DO UPDATE SET cantidad = cantidad + excluded.cantidad",
+                cubierta.itertuples(index=False),
+            )
+            if firma is not None:
+                con.executemany(
+                    "INSERT INTO liberacion_carga VALUES (?, ?, ?, ?)",
+                    ((firma, *fila) for fila in carga.itertuples(index=False)),
+                )
+                con.executemany(
+                    "INSERT INTO liberacion_demanda VALUES (?, ?, ?, ?, ?)",
+                    ((firma, *fila) for fila in cubierta.itertuples(index=False)),
+                )
+            con.execute(
+                "INSERT INTO liberaciones (fecha, usuario, ejecucion_id, horas, cantidad, firma) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), usuario, ejecucion_id,
+                 float(carga["Horas"].sum()), float(cubierta["Cantidad"].sum()), firma),
+            )
+    finally:
+        con.close()
+
+
+def _descontar_liberacion(con, firma):
+    """Quita del libro lo que aportó la liberación anterior de `firma` (dentro de la transacción)."""
+    con.execute(
+        "UPDATE compromiso_carga SET horas = horas - (SELECT l.horas FROM liberacion_carga AS l "
+        "WHERE l.firma = ?1 AND l.centro = compromiso_carga.centro AND l.fecha = compromiso_carga.fecha) "
+        "WHERE (centro, fecha) IN (SELECT centro, fecha FROM liberacion_carga WHERE firma = ?1)",
+        (firma,),
+    )
+    con.execute(
+        "UPDATE compromiso_demanda SET cantidad = cantidad - (SELECT l.cantidad FROM liberacion_demanda AS l "
+        "WHERE l.firma = ?1 AND l.material = compromiso_demanda.material "
+        "AND l.unidad = compromiso_demanda.unidad AND l.fecha = compromiso_demanda.fecha) "
+        "WHERE (material, unidad, fecha) IN (SELECT material, unidad, fecha FROM liberacion_demanda WHERE firma = ?1)",
+        (firma,),
+    )
+    con.execute("DELETE FROM compromiso_carga WHERE horas <= 1e-9")
+    con.execute("DELETE FROM compromiso_demanda WHERE cantidad <= 1e-9")
+    con.execute("DELETE FROM liberacion_carga WHERE firma = ?", (firma,))
+    con.execute("DELETE FROM liberacion_demanda WHERE firma = ?", (firma,))
+
+
+def borrar_compromisos(ruta=RUTA_HISTORIAL):
+    """Vacía el libro comprometido (el siguiente cálculo parte de cero)."""
+    con = conectar(ruta)
+    try:
+        with con:
+            con.execute("DELETE FROM compromiso_carga")
+            con.execute("DELETE FROM compromiso_demanda")
+            con.execute("DELETE FROM liberacion_carga")
+            con.execute("DELETE FROM liberacion_demanda")
+    finally:
+        con.close()
+
+
+# ------------------------------------------------------------
+# Lectura
+# ------------------------------------------------------------
+def cargar_carga_comprometida(ruta=RUTA_HISTORIAL):
+    """Horas comprometidas por centro y día (Centro, Fecha, Horas)."""
+    con = conectar(ruta)
+    try:
+        df = pd.read_sql_query("SELECT centro, fecha, horas FROM compromiso_carga", con)
+    finally:
+        con.close()
+    df.columns = ["Centro", "Fecha", "Horas"]
+    df["Fecha"] = pd.to_datetime(df["Fecha"])
+    return df
+
+
+def cargar_demanda_comprometida(ruta=RUTA_HISTORIAL):
+    """Demanda ya cubierta por planes liberados (Material, Unidad, Fecha, Cantidad)."""
+    con = conectar(ruta)
+    try:
+        df = pd.read_sql_query("SELECT material, unidad, fecha, cantidad FROM compromiso_demanda", con)
+    finally:
+        con.close()
+    df.columns = CLAVES_DEMANDA + ["Cantidad"]
+    return df
+
+
+def ultima_liberacion(ruta=RUTA_HISTORIAL):
+    """Fecha, usuario y horas de la última liberación (o None)."""
+    con = conectar(ruta)
+    try:
+        fila = con.execute(
+            "SELECT fecha, usuario, horas FROM liberaciones ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+    finally:
+        con.close()
+    return fila
+
+
+# ------------------------------------------------------------
+# Demanda pendiente
+# ------------------------------------------------------------
+def demanda_pendiente(demanda, cubierta):
+    """Parte de `demanda` que no está cubierta por `cubierta`.
+
+    Por (Material, Unidad, Fecha) la cantidad cubierta se descuenta de las
+    filas en su orden; las filas que quedan a cero se quitan. Si la demanda
+    de una clave baja, lo ya liberado no se toca.
+    """
+    if cubierta is None or cubierta.empty or demanda.empty:
+        return demanda
+    claves = pd.DataFrame({
+        "Material": demanda["Material"].astype(str).to_numpy(),
+        "Unidad": demanda["Unidad"].astype(str).to_numpy(),
+        "Fecha": _fechas_iso(demanda["Fecha"]).to_numpy(),
+    })
+    cubierto = claves.merge(cubierta, on=CLAVES_DEMANDA, how="left")["Cantidad"].fillna(0).to_numpy()
+
+    cantidad = demanda["Cantidad"].to_numpy(dtype=float)
+    acumulada = pd.Series(cantidad).groupby([claves[c] for c in CLAVES_DEMANDA]).cumsum().to_numpy()
+    pendiente = np.clip(acumulada - cubierto, 0, cantidad)
+    demanda = demanda.assign(Cantidad=pendiente)
+    return demanda[pendiente > 1e-9]
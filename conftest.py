@@ -0,0 +1,2 @@
+# Los módulos del planificador están en la raíz del repositorio: pytest la
+# añade a sys.path al cargar este archivo.
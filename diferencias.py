@@ -0,0 +1,143 @@
+# ============================================================
+# DIFERENCIAS — Comparación entre la propuesta inicial y la replanificada
+# ============================================================
+# Las dos propuestas se alinean por (Material, Fecha, Centro) con un
+# merge (hash join) sobre sus agregados, así que el coste no depende de
+# cuántas órdenes haya en cada clave. Las horas que pasan de un centro a
+# otro por semana salen directamente de los cubos de carga.
+
+import numpy as np
+import pandas as pd
+
+CLAVES_DIFERENCIA = ["Material","Fecha","Centro"]
+
+# Columnas que identifican una propuesta al guardar solo los cambios
+COLUMNAS_FILA = ["Material","Centro","Cantidad a fabricar","Unidad","Fecha"]
+
+
+def agregar_por_clave(df):
+    """Cantidad, horas y nº de órdenes por (Material, Fecha, Centro)."""
+    claves = [df[c].astype(str) for c in CLAVES_DIFERENCIA]
+    return df.groupby(claves).agg(
+        Semana=("Semana", "first"),
+        Cantidad=("Cantidad a fabricar", "sum"),
+        Horas=("Horas", "sum"),
+        Ordenes=("Horas", "size"),
+    )
+
+
+def diferencia_propuestas(inicial, replan):
+    """Cambios por (Material, Fecha, Centro) entre dos propuestas.
+
+    Devuelve una fila por clave presente en alguna de las dos, con los
+    valores de cada una, las diferencias (replan − inicial) y la columna
+    'Cambio': Añadida, Eliminada, Modificada o Igual.
+    """
+    a = agregar_por_clave(inicial)
+    b = agregar_por_clave(replan)
+    dif = a.join(b, how="outer", lsuffix=" inicial", rsuffix=" replan")
+
+    en_a = dif["Ordenes inicial"].notna().to_numpy()
+    en_b = dif["Ordenes replan"].notna().to_numpy()
+    dif["Semana"] = dif["Semana inicial"].fillna(dif["Semana replan"]).astype(str)
+    valores = ["Cantidad", "Horas", "Ordenes"]
+    for v in valores:
+        dif[f"{v} inicial"] = dif[f"{v} inicial"].fillna(0)
+        dif[f"{v} replan"] = dif[f"{v} replan"].fillna(0)
+        dif[f"Δ {v}"] = dif[f"{v} replan"] - dif[f"{v} inicial"]
+
+    cambiada = np.abs(dif[[f"Δ {v}" for v in valores]].to_numpy()).max(axis=1) > 1e-9
+    dif["Cambio"] = np.select(
+        [en_a & ~en_b, en_b & ~en_a, cambiada],
+        ["Eliminada", "Añadida", "Modificada"],
+        "Igual",
+    )
+    dif = dif.reset_index()
+    return dif[
+        CLAVES_DIFERENCIA + ["Semana", "Cambio"]
+        + [f"{v} {lado}" for v in valores for lado in ("inicial", "replan")]
+        + [f"Δ {v}" for v in valores]
+    ]
+
+
+def resumen_diferencias(dif):
+    """Resumen compacto de `diferencia_propuestas` (para las métricas)."""
+    cambio = dif["Cambio"]
+    return {
+        "añadidas": int((cambio == "Añadida").sum()),
+        "eliminadas": int((cambio == "Eliminada").sum()),
+        "modificadas": int((cambio == "Modificada").sum()),
+        "iguales": int((cambio == "Igual").sum()),
+        # Cantidad que aparece en claves nuevas o crece en las existentes
+        "cantidad_movida": float(dif["Δ Cantidad"].clip(lower=0).sum()),
+        "delta_ordenes": int(dif["Δ Ordenes"].sum()),
+    }
+
+
+def horas_desplazadas(cubo_inicial, cubo_replan, centros=None):
+    """Δ horas por semana y centro (replan − inicial), a partir de los cubos de carga."""
+    a = cubo_inicial.groupby(["Semana", "Centro"])["Horas"].sum()
+    b = cubo_replan.groupby(["Semana", "Centro"])["Horas"].sum()
+    tabla = b.sub(a, fill_value=0).unstack(fill_value=0).sort_index()
+    if centros is not None:
+        tabla = tabla.reindex(columns=[str(c) for c in centros], fill_value=0)
+    return tabla
+
+
+# ------------------------------------------------------------
+# Cambios a nivel de orden (para guardar solo deltas en el historial)
+# ------------------------------------------------------------
+def diferencia_filas(inicial, replan, columnas=COLUMNAS_FILA):
+    """Órdenes que desaparecen y que aparecen entre dos propuestas.
+
+    Las órdenes idénticas (mismas `columnas`) se emparejan por orden de
+    aparición. Devuelve (posiciones de `inicial` eliminadas, filas de
+    `replan` añadidas).
+    """
+    def con_ocurrencia(df):
+        claves = df[columnas].astype(str)
+        claves["_n"] = claves.groupby(columnas).cumcount()
+        claves["_pos"] = np.arange(len(df))
+        return claves
+
+    cruce = con_ocurrencia(inicial).merge(
+        con_ocurrencia(replan), on=columnas + ["_n"], how="outer",
+        suffixes=("_ini", "_rep"), indicator=True,
+    )
+    eliminadas = cruce.loc[cruce["_merge"] == "left_only", "_pos_ini"].astype(np.int64).to_numpy()
+    añadidas = cruce.loc[cruce["_merge"] == "right_only", "_pos_rep"].astype(np.int64).to_numpy()
+    return np.sort(eliminadas), replan.iloc[np.sort(añadidas)]
+
+
+# ------------------------------------------------------------
+# Cambios en la demanda (cálculo incremental)
+# ------------------------------------------------------------
+CLAVES_DEMANDA = ["Cliente","Material","Unidad","Fecha de necesidad"]
+
+
+def demanda_cambiada(anterior, nueva):
+    """Líneas de demanda cuya cantidad cambia entre dos cargas.
+
+    Se agregan por (Cliente, Material, Unidad, Fecha de necesidad) y se
+    cruzan con un join; una clave que solo está en una de las dos cuenta
+    con cantidad 0 en la otra.
+    """
+    def agregar(df):
+        return df.groupby([df[c].astype(str) for c in CLAVES_DEMANDA])["Cantidad"].sum()
+
+    dif = pd.concat([agregar(anterior), agregar(nueva)], axis=1, keys=["anterior", "nueva"]).fillna(0)
+    return dif[np.abs(dif["nueva"] - dif["anterior"]) > 1e-9].reset_index()
+
+
+def materiales_cambiados(anterior, nueva):
+    """(Material, Unidad) con alguna línea de demanda distinta entre dos cargas."""
+    return demanda_cambiada(anterior, nueva)[["Material","Unidad"]].drop_duplicates(ignore_index=True)
+
+
+def claves_en(df, claves):
+    """Máscara de las filas de `df` cuyo (Material, Unidad) está en `claves`."""
+    if claves.empty:
+        return np.zeros(len(df), dtype=bool)
+    indice = pd.MultiIndex.from_frame(claves[["Material","Unidad"]].astype(str))
+    filas = pd.MultiIndex.from_arrays([df["Material"].astype(str), df["Unidad"].astype(str)])
+    return filas.isin(indice)
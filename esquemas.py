@@ -0,0 +1,98 @@
+# ============================================================
+# ESQUEMAS — Columnas canónicas de los archivos de entrada
+# ============================================================
+# Cada archivo se identifica por la firma de su fila de cabecera. La
+# primera vez que aparece una firma se resuelve qué columna corresponde a
+# cada nombre canónico (con las mismas reglas flexibles de siempre) y el
+# resultado se guarda; las siguientes veces solo se renombra. El resto del
+# código trabaja siempre con los nombres canónicos.
+
+import hashlib
+
+
+def _igual(nombre):
+    objetivo = nombre.lower()
+    return lambda l: l == objetivo
+
+
+def _es_cliente(l):
+    posibles = [
+        "cliente","client","customer",
+        "id cliente","codigo cliente","cod cliente",
+        "cliente id","sap cliente"
+    ]
+    return any(p == l or p in l for p in posibles)
+
+
+# Por tipo de archivo: (nombre canónico, regla sobre el nombre en minúsculas)
+ESQUEMAS = {
+    "capacidad": [
+        ("Planta", _igual("Planta")),
+        ("Centro", _igual("Centro")),
+        ("Capacidad horas", lambda l: "capacidad" in l and "hora" in l),
+    ],
+    "materiales": [
+        ("Material", _igual("Material")),
+        ("Unidad", _igual("Unidad")),
+        ("Tiempo fabricación unidad DG", _igual("Tiempo fabricación unidad DG")),
+        ("Tiempo fabricación unidad MCH", _igual("Tiempo fabricación unidad MCH")),
+        ("Tamaño lote mínimo", _igual("Tamaño lote mínimo")),
+        ("Tamaño lote máximo", _igual("Tamaño lote máximo")),
+        ("Coste unitario DG", lambda l: "dg" in l and "cost" in l),
+        ("Coste unitario MCH", lambda l: "mch" in l and "cost" in l),
+    ],
+    "clientes": [
+        ("Cliente", _es_cliente),
+        ("Prioridad", lambda l: "prioridad" in l or "priority" in l),
+    ],
+    "demanda": [
+        ("Material", _igual("Material")),
+        ("Unidad", _igual("Unidad")),
+        ("Cantidad", _igual("Cantidad")),
+        ("Fecha de necesidad", _igual("Fecha de necesidad")),
+        ("Cliente", _es_cliente),
+    ],
+}
+
+# (tipo, firma de cabecera) -> {columna original: columna canónica}
+_REGISTRO = {}
+
+
+def firma_cabecera(columnas):
+    """Huella de la fila de cabecera (nombres y orden exactos)."""
+    return hashlib.sha1("\x1f".join(map(str, columnas)).encode("utf-8")).hexdigest()
+
+
+def resolver_mapeo(tipo, columnas):
+    """Calcula (o recupera del registro) el renombrado a nombres canónicos.
+
+    Todas las columnas se renombran sin espacios sobrantes. Para cada nombre
+    canónico se prefiere la columna que ya se llama así; si no, la primera
+    que cumple la regla. Las columnas que no encajan se dejan como están.
+    """
+    clave = (tipo, firma_cabecera(columnas))
+    if clave in _REGISTRO:
+        return _REGISTRO[clave]
+
+    limpias = {c: str(c).strip() for c in columnas}
+    mapeo = dict(limpias)
+    usadas = set()
+    for canon, regla in ESQUEMAS.get(tipo, []):
+        orig = next((c for c, l in limpias.items() if l == canon and c not in usadas), None)
+        if orig is None:
+            orig = next((c for c, l in limpias.items() if c not in usadas and regla(l.lower())), None)
+        if orig is None:
+            continue
+        # No pisar otra columna que ya se llame como el nombre canónico
+        if canon in limpias.values() and limpias[orig] != canon:
+            continue
+        mapeo[orig] = canon
+        usadas.add(orig)
+
+    _REGISTRO[clave] = mapeo
+    return mapeo
+
+
+def normalizar_columnas(tipo, df):
+    """Renombra las columnas de `df` a los nombres canónicos de `tipo`."""
+    return df.rename(columns=resolver_mapeo(tipo, list(df.columns)))
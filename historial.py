@@ -0,0 +1,419 @@
+# ============================================================
+# HISTORIAL — Registro de ejecuciones en SQLite
+# ============================================================
+# Cada cálculo (inicial o re‑planificación) se guarda con los hashes de
+# los archivos de entrada, los porcentajes semanales, su cubo de carga
+# (semana × centro × material), las horas por semana y centro y las
+# propuestas. Las consultas de la página de
+# historial van siempre por índice, sin abrir ningún Excel.
+
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from planificador import COLUMNAS_CUBO, agregar_bloque, reunir_cubo, total_propuestas
+from diferencias import diferencia_filas
+
+RUTA_HISTORIAL = os.path.join("archivos_cargados", "historial.db")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ejecuciones (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha           TEXT NOT NULL,
+    usuario         TEXT,
+    tipo            TEXT NOT NULL,
+    hash_capacidad  TEXT,
+    hash_materiales TEXT,
+    hash_clientes   TEXT,
+    hash_demanda    TEXT,
+    ajustes         TEXT,
+    n_propuestas    INTEGER,
+    horas_totales   REAL,
+    base_id         INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_ejecuciones_usuario ON ejecuciones(usuario, id);
+
+CREATE TABLE IF NOT EXISTS carga_semanal (
+    ejecucion_id INTEGER NOT NULL,
+    semana       TEXT NOT NULL,
+    centro       TEXT NOT NULL,
+    horas        REAL,
+    cantidad     REAL,
+    PRIMARY KEY (ejecucion_id, semana, centro)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_carga_semana ON carga_semanal(semana, ejecucion_id);
+
+CREATE TABLE IF NOT EXISTS propuestas (
+    ejecucion_id INTEGER NOT NULL,
+    n_propuesta  INTEGER NOT NULL,
+    material     TEXT,
+    centro       TEXT,
+    cantidad     REAL,
+    unidad       TEXT,
+    fecha        TEXT,
+    semana       TEXT,
+    horas        REAL,
+    PRIMARY KEY (ejecucion_id, n_propuesta)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_propuestas_material ON propuestas(material, ejecucion_id);
+
+-- Ejecuciones guardadas como cambios sobre `base_id`: órdenes de la base
+-- que ya no están (las que se añaden van a `propuestas`)
+CREATE TABLE IF NOT EXISTS propuestas_eliminadas (
+    ejecucion_id INTEGER NOT NULL,
+    n_propuesta  INTEGER NOT NULL,
+    PRIMARY KEY (ejecucion_id, n_propuesta)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cubo_carga (
+    ejecucion_id INTEGER NOT NULL,
+    semana       TEXT NOT NULL,
+    centro       TEXT NOT NULL,
+    material     TEXT NOT NULL,
+    horas        REAL,
+    cantidad     REAL,
+    propuestas   INTEGER,
+    PRIMARY KEY (ejecucion_id, semana, centro, material)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cubo_material ON cubo_carga(material, ejecucion_id);
+
+-- Capacidad comprometida (planes ya liberados, ver compromisos.py):
+-- horas consumidas por centro y día y demanda que ya está cubierta
+CREATE TABLE IF NOT EXISTS compromiso_carga (
+    centro TEXT NOT NULL,
+    fecha  TEXT NOT NULL,
+    horas  REAL,
+    PRIMARY KEY (centro, fecha)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS compromiso_demanda (
+    material TEXT NOT NULL,
+    unidad   TEXT NOT NULL,
+    fecha    TEXT NOT NULL,
+    cantidad REAL,
+    PRIMARY KEY (material, unidad, fecha)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS liberaciones (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha        TEXT NOT NULL,
+    usuario      TEXT,
+    ejecucion_id INTEGER,
+    horas        REAL,
+    cantidad     REAL,
+    firma        TEXT
+);
+
+-- Lo que aportó al libro la última liberación de cada cálculo (firma):
+-- al liberar otra vez el mismo cálculo se descuenta antes de sumar la nueva
+CREATE TABLE IF NOT EXISTS liberacion_carga (
+    firma  TEXT NOT NULL,
+    centro TEXT NOT NULL,
+    fecha  TEXT NOT NULL,
+    horas  REAL,
+    PRIMARY KEY (firma, centro, fecha)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS liberacion_demanda (
+    firma    TEXT NOT NULL,
+    material TEXT NOT NULL,
+    unidad   TEXT NOT NULL,
+    fecha    TEXT NOT NULL,
+    cantidad REAL,
+    PRIMARY KEY (firma, material, unidad, fecha)
+) WITHOUT ROWID;
+"""
+
+# Columnas de la propuesta → columnas de la tabla `propuestas`
+COLUMNAS_PROPUESTA = {
+    "Nº de propuesta": "n_propuesta",
+    "Material": "material",
+    "Centro": "centro",
+    "Cantidad a fabricar": "cantidad",
+    "Unidad": "unidad",
+    "Fecha": "fecha",
+    "Semana": "semana",
+    "Horas": "horas",
+}
+
+# Archivos de entrada en el orden de las columnas hash_*
+ENTRADAS = ["capacidad", "materiales", "clientes", "demanda"]
+
+
+# Rutas cuyo esquema ya se ha creado en este proceso
+_INICIALIZADAS = set()
+
+def conectar(ruta=RUTA_HISTORIAL):
+    """Abre la base de datos (y la crea con sus índices si no existe)."""
+    if ruta not in _INICIALIZADAS:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    con = sqlite3.connect(ruta)
+    if ruta not in _INICIALIZADAS:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        # Bases creadas antes de guardar ejecuciones como cambios
+        columnas = [r[1] for r in con.execute("PRAGMA table_info(ejecuciones)")]
+        if "base_id" not in columnas:
+            con.execute("ALTER TABLE ejecuciones ADD COLUMN base_id INTEGER")
+        # Bases creadas antes de reemplazar las liberaciones de un mismo cálculo
+        columnas = [r[1] for r in con.execute("PRAGMA table_info(liberaciones)")]
+        if "firma" not in columnas:
+            con.execute("ALTER TABLE liberaciones ADD COLUMN firma TEXT")
+        _INICIALIZADAS.add(ruta)
+    return con
+
+
+# ------------------------------------------------------------
+# Escritura
+# ------------------------------------------------------------
+def registrar_ejecucion(tipo, usuario, hashes, ajustes, propuesta, cubo=None,
+                        base_id=None, base=None, ruta=RUTA_HISTORIAL):
+    """Guarda una ejecución y devuelve su id.
+
+    `hashes` es {entrada: hash} con las claves de `ENTRADAS`; `ajustes` el
+    dict de porcentajes por semana (o None en el cálculo inicial); `cubo`
+    el cubo de carga de la propuesta (si no se pasa, se calcula).
+
+    Con `base_id` y su propuesta `base`, si los cambios son menos que la
+    propuesta entera solo se guardan las órdenes añadidas y eliminadas.
+    """
+    if cubo is None:
+        cubo = reunir_cubo([agregar_bloque(propuesta)])
+    carga = cubo.groupby(["Semana", "Centro"], as_index=False)[["Horas", "Cantidad"]].sum()
+
+    eliminadas = []
+    if base_id is not None and base is not None:
+        pos_eliminadas, añadidas = diferencia_filas(base, propuesta)
+        if len(pos_eliminadas) + len(añadidas) < len(propuesta):
+            eliminadas = base["Nº de propuesta"].to_numpy()[pos_eliminadas].tolist()
+            propuesta = añadidas
+        else:
+            base_id = None
+    else:
+        base_id = None
+    filas = propuesta[list(COLUMNAS_PROPUESTA)].astype({
+        "Material": str, "Centro": str, "Unidad": str, "Fecha": str, "Semana": str
+    })
+
+    con = conectar(ruta)
+    try:
+        with con:
+            cur = con.execute(
+                "INSERT INTO ejecuciones (fecha, usuario, tipo, hash_capacidad, hash_materiales, "
+                "hash_clientes, hash_demanda, ajustes, n_propuestas, horas_totales, base_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec="seconds"), usuario, tipo,
+                    *[hashes.get(e) for e in ENTRADAS],
+                    json.dumps(ajustes, sort_keys=True) if ajustes is not None else None,
+                    total_propuestas(cubo), float(cubo["Horas"].sum()), base_id,
+                ),
+            )
+            eid = cur.lastrowid
+            con.executemany(
+                "INSERT INTO carga_semanal VALUES (?, ?, ?, ?, ?)",
+                ((eid, *fila) for fila in carga.itertuples(index=False)),
+            )
+            con.executemany(
+                "INSERT INTO cubo_carga VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((eid, *fila) for fila in cubo[COLUMNAS_CUBO].itertuples(index=False)),
+            )
+            con.executemany(
+                "INSERT INTO propuestas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((eid, *fila) for fila in filas.itertuples(index=False)),
+            )
+            con.executemany(
+                "INSERT INTO propuestas_eliminadas VALUES (?, ?)",
+                ((eid, int(n)) for n in eliminadas),
+            )
+    finally:
+        con.close()
+    return eid
+
+
+# ------------------------------------------------------------
+# Consultas
+# ------------------------------------------------------------
+def _filtro_ejecuciones(material=None, semana=None, usuario=None):
+    """WHERE y parámetros de los filtros del historial (sobre `ejecuciones e`)."""
+    where, params = [], []
+    if usuario:
+        where.append("e.usuario = ?")
+        params.append(usuario)
+    if semana:
+        where.append("EXISTS (SELECT 1 FROM carga_semanal c WHERE c.semana = ? AND c.ejecucion_id = e.id)")
+        params.append(semana)
+    if material:
+        where.append("EXISTS (SELECT 1 FROM cubo_carga c WHERE c.material = ? AND c.ejecucion_id = e.id)")
+        params.append(material)
+    return (f"WHERE {' AND '.join(where)}" if where else ""), params
+
+
+def contar_ejecuciones(material=None, semana=None, usuario=None, ruta=RUTA_HISTORIAL):
+    """Número de ejecuciones que cumplen el filtro."""
+    filtro, params = _filtro_ejecuciones(material, semana, usuario)
+    con = conectar(ruta)
+    try:
+        return con.execute(f"SELECT COUNT(*) FROM ejecuciones e {filtro}", params).fetchone()[0]
+    finally:
+        con.close()
+
+
+def listar_ejecuciones(material=None, semana=None, usuario=None, pagina=0, tam_pagina=50, ruta=RUTA_HISTORIAL):
+    """Página de ejecuciones (más recientes primero) y total que cumple el filtro."""
+    filtro, params = _filtro_ejecuciones(material, semana, usuario)
+    con = conectar(ruta)
+    try:
+        total = con.execute(f"SELECT COUNT(*) FROM ejecuciones e {filtro}", params).fetchone()[0]
+        df = pd.read_sql_query(
+            f"SELECT e.id, e.fecha, e.usuario, e.tipo, e.n_propuestas, e.horas_totales, e.base_id, e.ajustes "
+            f"FROM ejecuciones e {filtro} ORDER BY e.id DESC LIMIT ? OFFSET ?",
+            con, params=[*params, tam_pagina, pagina * tam_pagina],
+        )
+    finally:
+        con.close()
+    return df, total
+
+
+def valores_filtro(ruta=RUTA_HISTORIAL):
+    """Usuarios y semanas registrados (para los desplegables de filtro)."""
+    con = conectar(ruta)
+    try:
+        usuarios = [r[0] for r in con.execute(
+            "SELECT DISTINCT usuario FROM ejecuciones WHERE usuario IS NOT NULL ORDER BY usuario")]
+        semanas = [r[0] for r in con.execute("SELECT DISTINCT semana FROM carga_semanal ORDER BY semana")]
+    finally:
+        con.close()
+    return usuarios, semanas
+
+
+def cargar_carga_semanal(ejecucion_id, material=None, ruta=RUTA_HISTORIAL):
+    """Horas y cantidad por semana y centro; con `material`, solo las de ese material (del cubo)."""
+    if material:
+        sql = ("SELECT semana, centro, SUM(horas) AS horas, SUM(cantidad) AS cantidad FROM cubo_carga "
+               "WHERE ejecucion_id = ? AND material = ? GROUP BY semana, centro ORDER BY semana, centro")
+        params = [ejecucion_id, material]
+    else:
+        sql = "SELECT semana, centro, horas, cantidad FROM carga_semanal WHERE ejecucion_id = ? ORDER BY semana, centro"
+        params = [ejecucion_id]
+    con = conectar(ruta)
+    try:
+        return pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+
+
+def cargar_cubo(ejecucion_id, ruta=RUTA_HISTORIAL):
+    """Cubo de carga de una ejecución, con las columnas de `planificador.COLUMNAS_CUBO`."""
+    con = conectar(ruta)
+    try:
+        df = pd.read_sql_query(
+            "SELECT semana, centro, material, horas, cantidad, propuestas FROM cubo_carga WHERE ejecucion_id = ?",
+            con, params=[ejecucion_id],
+        )
+    finally:
+        con.close()
+    df.columns = COLUMNAS_CUBO
+    return df
+
+
+def cargar_propuesta(ejecucion_id, limite=None, ruta=RUTA_HISTORIAL):
+    """Propuestas de una ejecución con los nombres de columna originales.
+
+    Las ejecuciones guardadas como cambios se reconstruyen a partir de su
+    base; en ese caso las órdenes se ordenan por fecha y se renumeran.
+    """
+    con = conectar(ruta)
+    try:
+        fila = con.execute("SELECT base_id FROM ejecuciones WHERE id = ?", [ejecucion_id]).fetchone()
+        base_id = fila[0] if fila else None
+        if base_id is None:
+            sql = "SELECT * FROM propuestas WHERE ejecucion_id = ? ORDER BY n_propuesta"
+            params = [ejecucion_id]
+        else:
+            campos = "material, centro, cantidad, unidad, fecha, semana, horas"
+            sql = (
+                f"SELECT ? AS ejecucion_id, ROW_NUMBER() OVER (ORDER BY "
+                f"substr(fecha, 7, 4) || substr(fecha, 4, 2) || substr(fecha, 1, 2), material, centro) AS n_propuesta, "
+                f"{campos} FROM ("
+                f"  SELECT {campos} FROM propuestas p WHERE p.ejecucion_id = ? AND NOT EXISTS ("
+                f"    SELECT 1 FROM propuestas_eliminadas x WHERE x.ejecucion_id = ? AND x.n_propuesta = p.n_propuesta)"
+                f"  UNION ALL SELECT {campos} FROM propuestas WHERE ejecucion_id = ?"
+                f") ORDER BY n_propuesta"
+            )
+            params = [ejecucion_id, base_id, ejecucion_id, ejecucion_id]
+        if limite:
+            sql += " LIMIT ?"
+            params.append(limite)
+        df = pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+    return df.drop(columns="ejecucion_id").rename(columns={v: k for k, v in COLUMNAS_PROPUESTA.items()})
+
+
+# ------------------------------------------------------------
+# Página "Historial de propuestas"
+# ------------------------------------------------------------
+TAM_PAGINA = 50
+
+def main():
+    st.header("Historial de propuestas")
+
+    usuarios, semanas = valores_filtro()
+    f1, f2, f3 = st.columns(3)
+    usuario = f1.selectbox("Usuario", ["Todos"] + usuarios, key="hist_usuario")
+    semana = f2.selectbox("Semana", ["Todas"] + semanas, key="hist_semana")
+    material = f3.text_input("Material", key="hist_material").strip()
+
+    filtros = dict(
+        material=material or None,
+        semana=None if semana == "Todas" else semana,
+        usuario=None if usuario == "Todos" else usuario,
+    )
+    # La página se ajusta al total filtrado antes de leerla (al cambiar un
+    # filtro la página guardada puede quedar fuera)
+    total = contar_ejecuciones(**filtros)
+    n_paginas = max(1, -(-total // TAM_PAGINA))
+    pagina = min(st.session_state.get("hist_pagina", 0), n_paginas - 1)
+    st.session_state.hist_pagina = pagina
+    df, total = listar_ejecuciones(**filtros, pagina=pagina, tam_pagina=TAM_PAGINA)
+
+    if total == 0:
+        st.info("No hay ejecuciones registradas con esos filtros.")
+        return
+
+    st.caption(f"{total} ejecuciones · página {pagina + 1} de {n_paginas}")
+    st.dataframe(df.drop(columns="ajustes"), use_container_width=True, hide_index=True)
+
+    p1, _, p2 = st.columns([1, 4, 1])
+    if p1.button("◀ Anterior", disabled=pagina == 0):
+        st.session_state.hist_pagina = pagina - 1
+        st.rerun()
+    if p2.button("Siguiente ▶", disabled=pagina >= n_paginas - 1):
+        st.session_state.hist_pagina = pagina + 1
+        st.rerun()
+
+    st.markdown("---")
+    eid = st.selectbox("Ver ejecución", df["id"].tolist(), key="hist_id")
+    if eid is None:
+        return
+    fila = df[df["id"] == eid].iloc[0]
+    if fila["ajustes"]:
+        with st.expander("Porcentajes por semana (DG)"):
+            st.json(json.loads(fila["ajustes"]))
+
+    carga = cargar_carga_semanal(eid, material=material or None)
+    if material:
+        st.caption(f"Carga del material {material}")
+    tabla = carga.pivot(index="semana", columns="centro", values="horas").fillna(0)
+    st.bar_chart(tabla, use_container_width=True)
+    st.dataframe(tabla.style.format("{:,.1f}"), use_container_width=True)
+
+    limite = 5000
+    st.dataframe(cargar_propuesta(eid, limite=limite), use_container_width=True, height=420)
+    if fila["n_propuestas"] > limite:
+        st.caption(f"Se muestran las primeras {limite:,} de {fila['n_propuestas']:,} propuestas.".replace(",", "."))
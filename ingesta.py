@@ -0,0 +1,105 @@
+# ============================================================
+# INGESTA — Lectura concurrente de los Excel subidos
+# ============================================================
+# openpyxl es Python puro y no libera el GIL, así que los cuatro libros
+# se leen en procesos separados. El pool se crea una sola vez por servidor
+# y lo comparten todas las sesiones.
+
+import io
+import os
+import hashlib
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def leer_excel(datos):
+    """Lee un Excel a partir de sus bytes (se ejecuta en el proceso trabajador)."""
+    return pd.read_excel(io.BytesIO(datos))
+
+
+def huella_bytes(datos):
+    """Hash del contenido de un archivo subido (identifica la entrada)."""
+    return hashlib.sha1(datos).hexdigest()
+
+
+def huella_df(df):
+    """Hash del contenido de un DataFrame (columnas y valores)."""
+    h = hashlib.sha1("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def pool_procesos():
+    """Pool de procesos del servidor (lo comparten la lectura de Excel y la planificación)."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                mp_context=mp.get_context("spawn"),
+            )
+        return _POOL
+
+
+def reiniciar_pool():
+    """Descarta el pool (p. ej. tras caerse un trabajador); el siguiente uso crea otro."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def leer_en_paralelo(archivos, al_terminar=None):
+    """Lee varios Excel a la vez.
+
+    `archivos` es {clave: bytes}. Devuelve {clave: DataFrame o Exception}
+    cuando han terminado todos; `al_terminar(clave, hechos)` se llama cada
+    vez que acaba uno, para mostrar el progreso. Con un solo archivo se lee
+    en el propio proceso; si el pool de procesos no está disponible se
+    recurre a hilos.
+    """
+    resultados = {}
+    if len(archivos) <= 1:
+        for hechos, (clave, datos) in enumerate(archivos.items(), 1):
+            try:
+                resultados[clave] = leer_excel(datos)
+            except Exception as e:
+                resultados[clave] = e
+            if al_terminar:
+                al_terminar(clave, hechos)
+        return resultados
+
+    try:
+        ejecutor = pool_procesos()
+        futuros = {ejecutor.submit(leer_excel, datos): clave for clave, datos in archivos.items()}
+    except (OSError, RuntimeError, BrokenProcessPool):
+        reiniciar_pool()
+        ejecutor = ThreadPoolExecutor(max_workers=len(archivos))
+        futuros = {ejecutor.submit(leer_excel, datos): clave for clave, datos in archivos.items()}
+
+    for hechos, fut in enumerate(as_completed(futuros), 1):
+        clave = futuros[fut]
+        try:
+            resultados[clave] = fut.result()
+        except BrokenProcessPool:
+            reiniciar_pool()
+            try:
+                resultados[clave] = leer_excel(archivos[clave])
+            except Exception as e:
+                resultados[clave] = e
+        except Exception as e:
+            resultados[clave] = e
+        if al_terminar:
+            al_terminar(clave, hechos)
+
+    if isinstance(ejecutor, ThreadPoolExecutor):
+        ejecutor.shutdown(wait=False)
+    return resultados
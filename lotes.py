@@ -0,0 +1,101 @@
+# ============================================================
+# LOTES — Aritmética de cantidades en unidades enteras
+# ============================================================
+# Las cantidades se manejan en centésimas (enteros) para que el reparto
+# en lotes y el llenado de capacidad no generen restos de coma flotante
+# (1e-12, 0.0000001…) que acaban como micro‑propuestas.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Número de unidades base por unidad de material (centésimas)
+ESCALA = 100
+
+# Cantidad mínima de una propuesta parcial limitada por capacidad (1 unidad)
+MINIMO_PARCIAL = ESCALA
+
+# Tolerancia para absorber el error de coma flotante al convertir horas
+EPS = 1e-9
+
+
+def de_centesimas(c):
+    """Convierte centésimas enteras a cantidad (float con 2 decimales)."""
+    return round(c / ESCALA, 2)
+
+
+def horas_de(cant_c, tu):
+    """Horas necesarias para fabricar `cant_c` centésimas con tiempo unitario `tu`."""
+    return cant_c * tu / ESCALA
+
+
+def cantidad_por_capacidad(cap_h, tu, minimo=MINIMO_PARCIAL):
+    """Centésimas que caben en `cap_h` horas con tiempo unitario `tu`.
+
+    Regla de redondeo: hacia abajo y en múltiplos de `minimo` (una unidad),
+    para no superar nunca la capacidad del día ni aprovechar restos de
+    horas con propuestas de fracciones de unidad. Si no cabe ni una unidad
+    devuelve 0 y el día se considera lleno. Cuando una unidad no cabe ni en
+    un día completo, el planificador pasa `minimo=1` (centésimas).
+    """
+    if tu <= 0:
+        return 0
+    c = math.floor(cap_h * ESCALA / tu + EPS)
+    return max(0, c - c % minimo)
+
+
+# ------------------------------------------------------------
+# División vectorizada en órdenes
+# ------------------------------------------------------------
+def dividir_lotes(df, cantidad="Cantidad", lote_min="Tamaño lote mínimo",
+                  lote_max="Tamaño lote máximo", reparto="igual"):
+    """Expande cada fila de `df` en sus órdenes de fabricación (una fila por orden).
+
+    La cantidad de cada fila se sube al lote mínimo y se divide por el lote
+    máximo sin bucles: el nº de órdenes por fila se calcula con NumPy, las
+    filas se repiten con `np.repeat` y 'Nº de propuesta' es un rango continuo.
+
+    reparto="igual":  ceil(total / lote_max) órdenes de la misma cantidad
+                      (redondeada a 2 decimales), como en los cálculos de
+                      pantalla.py y porcentajes.py.
+    reparto="maximo": lotes completos de lote_max más un último lote con el
+                      resto, en centésimas enteras (lo usa `modo_C`).
+
+    Un lote máximo vacío o no positivo deja la fila en una sola orden.
+    Devuelve las columnas de `df` más 'Cantidad a fabricar' y 'Nº de propuesta'.
+    """
+    cant = pd.to_numeric(df[cantidad], errors="coerce").to_numpy(dtype=float)
+    lmin = pd.to_numeric(df[lote_min], errors="coerce").to_numpy(dtype=float)
+    lmax = pd.to_numeric(df[lote_max], errors="coerce").to_numpy(dtype=float)
+
+    total = np.fmax(np.nan_to_num(cant), lmin)
+    valido = np.isfinite(lmax) & (lmax > 0)
+
+    if reparto == "maximo":
+        total_c = np.rint(total * ESCALA).astype(np.int64)
+        lmax_c = np.where(valido, np.maximum(1, np.rint(np.nan_to_num(lmax) * ESCALA)), total_c).astype(np.int64)
+        lmax_c = np.maximum(lmax_c, 1)
+        completos, resto = np.divmod(np.maximum(total_c, 0), lmax_c)
+        n = completos + (resto > 0)
+    elif reparto == "igual":
+        lmax_s = np.where(valido, lmax, np.where(total > 0, total, 1.0))
+        n = np.ceil(np.maximum(total, 0) / lmax_s).astype(np.int64)
+    else:
+        raise ValueError(f"Reparto de lotes desconocido: {reparto}")
+
+    idx = np.repeat(np.arange(len(df)), n)
+    out = df.iloc[idx].reset_index(drop=True)
+
+    if reparto == "maximo":
+        # Posición de cada orden dentro de su fila: la última lleva el resto
+        inicio = np.repeat(np.cumsum(n) - n, n)
+        ultima = (np.arange(len(idx)) - inicio) == (n[idx] - 1)
+        q_c = np.where(ultima & (resto[idx] > 0), resto[idx], lmax_c[idx])
+        out["Cantidad a fabricar"] = q_c / ESCALA
+    else:
+        q = np.divide(total, n, out=np.zeros_like(total), where=n > 0)
+        out["Cantidad a fabricar"] = np.round(q[idx], 2)
+
+    out.insert(0, "Nº de propuesta", np.arange(1, len(out) + 1))
+    return out
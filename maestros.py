@@ -0,0 +1,127 @@
+# ============================================================
+# MAESTROS — Caché de maestros compartida entre sesiones
+# ============================================================
+# Materiales, clientes y capacidad son los mismos archivos para todos los
+# planificadores del servidor. Cada maestro se lee y normaliza una sola vez
+# por proceso y se guarda por el hash de su contenido; las sesiones no se
+# quedan con una copia propia sino con una vista (copia superficial): con
+# el copy‑on‑write de pandas (siempre activo desde pandas 3, ver
+# requirements.txt) comparten los datos y, si alguna vez una
+# sesión modifica su vista, se copia solo lo modificado y el maestro
+# compartido no cambia.
+#
+# Cada entrada cuenta las vistas vivas que tiene (al recolectarse una vista
+# se descuenta sola) y guarda los índices derivados del maestro (tiempos de
+# fabricación, capacidades…), que se construyen una vez para todos. Las
+# entradas que ninguna sesión usa se descartan, de la menos usada a la más,
+# cuando la caché pasa de LIMITE_MAESTROS.
+
+import threading
+import weakref
+from collections import OrderedDict
+
+# Memoria máxima de los maestros sin sesiones que se conservan
+LIMITE_MAESTROS = 512 * 2**20
+
+_MAESTROS = OrderedDict()   # huella -> {"df", "indices", "sesiones", "bytes"}
+_VISTAS = {}                # id(vista) -> huella
+# Reentrante: una vista puede recolectarse (y soltarse) con el cerrojo tomado
+_LOCK = threading.RLock()
+
+
+def huella_maestro(tipo, huella):
+    """Clave de un maestro: el tipo (se normaliza distinto) y el hash del archivo."""
+    return f"{tipo}:{huella}"
+
+
+# ------------------------------------------------------------
+# Vistas por sesión
+# ------------------------------------------------------------
+def _soltar(huella, id_vista):
+    with _LOCK:
+        _VISTAS.pop(id_vista, None)
+        entrada = _MAESTROS.get(huella)
+        if entrada is not None:
+            entrada["sesiones"] -= 1
+            _recortar()
+
+
+def _vista(huella, entrada):
+    """Copia superficial del maestro que se da a una sesión (con _LOCK tomado)."""
+    vista = entrada["df"].copy(deep=False)
+    entrada["sesiones"] += 1
+    _VISTAS[id(vista)] = huella
+    weakref.finalize(vista, _soltar, huella, id(vista))
+    return vista
+
+
+def _recortar():
+    """Descarta maestros sin sesiones hasta volver al límite (con _LOCK tomado)."""
+    total = sum(e["bytes"] for e in _MAESTROS.values())
+    for huella in [h for h, e in _MAESTROS.items() if e["sesiones"] <= 0]:
+        if total <= LIMITE_MAESTROS:
+            break
+        entrada = _MAESTROS.pop(huella, None)
+        if entrada is not None:
+            total -= entrada["bytes"]
+
+
+def buscar_maestro(huella):
+    """Vista del maestro guardado con `huella` (o None si no está en la caché)."""
+    with _LOCK:
+        entrada = _MAESTROS.get(huella)
+        if entrada is None:
+            return None
+        _MAESTROS.move_to_end(huella)
+        return _vista(huella, entrada)
+
+
+def compartir_maestro(huella, df):
+    """Guarda `df` como maestro compartido y devuelve una vista para la sesión.
+
+    Si otra sesión ya guardó el mismo contenido se devuelve una vista del
+    que ya estaba y `df` se descarta.
+    """
+    nueva = {
+        "df": df,
+        "indices": {},
+        "sesiones": 0,
+        "bytes": int(df.memory_usage(index=True, deep=True).sum()),
+    }
+    with _LOCK:
+        entrada = _MAESTROS.setdefault(huella, nueva)
+        _MAESTROS.move_to_end(huella)
+        vista = _vista(huella, entrada)
+        _recortar()
+        return vista
+
+
+# ------------------------------------------------------------
+# Índices derivados
+# ------------------------------------------------------------
+def indice(df, nombre, construir):
+    """`construir(df)`, construido una sola vez por maestro compartido.
+
+    Si `df` es una vista de la caché el resultado se guarda con el maestro
+    y lo reutilizan todas las sesiones (no debe modificarse); si no, se
+    construye sin más.
+    """
+    with _LOCK:
+        huella = _VISTAS.get(id(df))
+        entrada = _MAESTROS.get(huella) if huella is not None else None
+        if entrada is not None and nombre in entrada["indices"]:
+            return entrada["indices"][nombre]
+    valor = construir(df)
+    if entrada is not None:
+        with _LOCK:
+            valor = entrada["indices"].setdefault(nombre, valor)
+    return valor
+
+
+def estado_maestros():
+    """Maestros en caché: [(huella, sesiones, MB, índices)] del menos al más reciente."""
+    with _LOCK:
+        return [
+            (h, e["sesiones"], e["bytes"] / 2**20, sorted(map(str, e["indices"])))
+            for h, e in _MAESTROS.items()
+        ]
@@ -0,0 +1,215 @@
+# ============================================================
+# MEMORIA — Gobernador de memoria de las sesiones
+# ============================================================
+# Los DataFrames propios de cada sesión (demanda, propuestas, cubos de
+# carga, diferencias…) no viven en st.session_state sino aquí, por sesión
+# y clave, para poder repartir un presupuesto de memoria común a todo el
+# servidor. Cuando los marcos en memoria pasan de LIMITE_MEMORIA, los
+# usados hace más tiempo (de cualquier sesión) se vuelcan a un archivo
+# columnar (Arrow/Feather) en disco y se sueltan; al volver a pedirlos se
+# abren con memory‑map, así que solo ocupan las páginas que se leen y el
+# sistema puede descartarlas. Los marcos se tratan como de solo lectura:
+# para cambiar uno se guarda otro con la misma clave.
+#
+# Sin pyarrow no se vuelca nada: solo se llevan las cuentas.
+
+import os
+import atexit
+import functools
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
+
+# Memoria máxima de los marcos de todas las sesiones (sin contar los maestros)
+LIMITE_MEMORIA = 1024 * 2**20
+# Los datos de una sesión que no se usan en este tiempo se borran (segundos)
+CADUCIDAD = 12 * 3600
+# Directorio de volcado del proceso (se crea al primer volcado y se borra al salir)
+_DIR_VOLCADO = None
+
+# Cada marco guardado es un registro; si una sesión guarda el mismo
+# objeto con dos claves (p. ej. la propuesta y el estado del cálculo) las
+# dos apuntan al mismo registro y cuenta una sola vez.
+_REGISTROS = OrderedDict()  # id -> {"df", "objeto", "ruta", "bytes", "sesion", "claves", "uso", "volcable"}
+_CLAVES = {}                # (sesion, clave) -> id del registro
+_LOCK = threading.RLock()
+
+
+def nueva_sesion():
+    """Identificador para los marcos de una sesión nueva."""
+    return uuid.uuid4().hex
+
+
+def _tamano(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+# ------------------------------------------------------------
+# Volcado a disco
+# ------------------------------------------------------------
+def _directorio():
+    global _DIR_VOLCADO
+    if _DIR_VOLCADO is None:
+        _DIR_VOLCADO = tempfile.mkdtemp(prefix="planificador_volcado_")
+        atexit.register(shutil.rmtree, _DIR_VOLCADO, True)
+    return _DIR_VOLCADO
+
+
+def _volcar(rid, registro):
+    """Escribe el marco en disco (si no lo estaba ya) y lo suelta de memoria."""
+    if registro["ruta"] is None:
+        ruta = os.path.join(_directorio(), f"{registro['sesion']}_{rid}.arrow")
+        try:
+            feather.write_feather(
+                pa.Table.from_pandas(registro["df"], preserve_index=True), ruta, compression="uncompressed"
+            )
+        except (pa.ArrowException, OSError, TypeError, ValueError):
+            # Columnas que Arrow no sabe representar: el marco se queda en memoria
+            registro["volcable"] = False
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            return False
+        registro["ruta"] = ruta
+    registro["df"] = None
+    return True
+
+
+def _mapear(registro):
+    """Vuelve a abrir un marco volcado (memory‑map, sin copiar lo que se pueda)."""
+    tabla = feather.read_table(registro["ruta"], memory_map=True)
+    return tabla.to_pandas(split_blocks=True)
+
+
+def _borrar(rid):
+    registro = _REGISTROS.pop(rid)
+    if registro["ruta"] is not None and os.path.exists(registro["ruta"]):
+        os.remove(registro["ruta"])
+
+
+def _recortar(proteger=None):
+    """Caduca sesiones viejas y vuelca marcos hasta volver al límite (con _LOCK tomado).
+
+    Cuentan todos los marcos abiertos, también los mapeados. Se vuelcan del
+    usado hace más tiempo al más reciente; `proteger` (el que se acaba de
+    usar) no se vuelca.
+    """
+    limite_uso = time.time() - CADUCIDAD
+    for rid in [r for r, reg in _REGISTROS.items() if reg["uso"] < limite_uso]:
+        for clave in _REGISTROS[rid]["claves"]:
+            _CLAVES.pop((_REGISTROS[rid]["sesion"], clave), None)
+        _borrar(rid)
+
+    if feather is None:
+        return
+    residente = sum(r["bytes"] for r in _REGISTROS.values() if r["df"] is not None)
+    for rid, registro in list(_REGISTROS.items()):
+        if residente <= LIMITE_MEMORIA:
+            break
+        if rid == proteger or registro["df"] is None or not registro["volcable"]:
+            continue
+        # Un marco mapeado ya está en disco: basta con soltarlo
+        if _volcar(rid, registro):
+            residente -= registro["bytes"]
+
+
+# ------------------------------------------------------------
+# Guardar y leer
+# ------------------------------------------------------------
+def guardar_marco(sesion, clave, df):
+    """Guarda `df` como `clave` de la sesión (None la borra)."""
+    with _LOCK:
+        anterior = _CLAVES.pop((sesion, clave), None)
+        if anterior is not None:
+            _REGISTROS[anterior]["claves"].discard(clave)
+            if not _REGISTROS[anterior]["claves"]:
+                _borrar(anterior)
+        if df is None:
+            return
+
+        # `objeto` reconoce el mismo DataFrame aunque ya esté volcado
+        rid = next(
+            (r for r, reg in _REGISTROS.items() if reg["sesion"] == sesion and reg["objeto"]() is df),
+            None,
+        )
+        if rid is None:
+            rid = uuid.uuid4().hex
+            _REGISTROS[rid] = {
+                "df": df, "objeto": weakref.ref(df), "ruta": None, "bytes": _tamano(df),
+                "sesion": sesion, "claves": set(), "uso": 0.0, "volcable": True,
+            }
+        registro = _REGISTROS[rid]
+        registro["claves"].add(clave)
+        registro["uso"] = time.time()
+        _REGISTROS.move_to_end(rid)
+        _CLAVES[(sesion, clave)] = rid
+        _recortar(proteger=rid)
+
+
+def leer_marco(sesion, clave, default=None):
+    """Marco guardado como `clave` de la sesión; si estaba en disco se mapea de vuelta."""
+    with _LOCK:
+        rid = _CLAVES.get((sesion, clave))
+        if rid is None:
+            return default
+        registro = _REGISTROS[rid]
+        if registro["df"] is None:
+            registro["df"] = _mapear(registro)
+            registro["objeto"] = weakref.ref(registro["df"])
+        registro["uso"] = time.time()
+        _REGISTROS.move_to_end(rid)
+        df = registro["df"]
+        _recortar(proteger=rid)
+        return df
+
+
+def soltar_sesion(sesion):
+    """Borra todos los marcos de una sesión (memoria y disco)."""
+    with _LOCK:
+        for rid in [r for r, reg in _REGISTROS.items() if reg["sesion"] == sesion]:
+            for clave in _REGISTROS[rid]["claves"]:
+                _CLAVES.pop((sesion, clave), None)
+            _borrar(rid)
+
+
+def testigo_sesion(sesion):
+    """Objeto para guardar en el estado de la sesión de Streamlit.
+
+    Cuando Streamlit descarta la sesión (al cerrarse la pestaña y caducar la
+    conexión) el testigo se recolecta y los marcos de la sesión se borran
+    de memoria y de disco sin esperar a CADUCIDAD.
+    """
+    testigo = functools.partial(soltar_sesion, sesion)
+    weakref.finalize(testigo, soltar_sesion, sesion)
+    return testigo
+
+
+# ------------------------------------------------------------
+# Estadísticas
+# ------------------------------------------------------------
+def estado_memoria(sesion=None):
+    """Bytes en memoria, mapeados desde disco y solo en disco (de todo el servidor y de `sesion`)."""
+    with _LOCK:
+        def cuentas(registros):
+            registros = list(registros)
+            return {
+                "memoria": sum(r["bytes"] for r in registros if r["df"] is not None and r["ruta"] is None),
+                "mapeado": sum(r["bytes"] for r in registros if r["df"] is not None and r["ruta"] is not None),
+                "disco": sum(r["bytes"] for r in registros if r["df"] is None),
+                "marcos": len(registros),
+            }
+        total = cuentas(_REGISTROS.values())
+        total["sesiones"] = len({r["sesion"] for r in _REGISTROS.values()})
+        total["limite"] = LIMITE_MEMORIA
+        if sesion is not None:
+            total["sesion"] = cuentas(r for r in _REGISTROS.values() if r["sesion"] == sesion)
+        return total
@@ -0,0 +1,230 @@
+# ============================================================
+# NÚCLEO — Llenado de capacidad compilado (opcional)
+# ============================================================
+# El llenado de capacidad de `modo_C_en_bloques` es secuencial por
+# naturaleza (cada lote consume horas del libro que ve el siguiente), así
+# que no se vectoriza con NumPy. Aquí está el mismo bucle escrito sobre
+# arrays tipados, en el subconjunto de Python que compila Numba: con numba
+# instalado se compila una vez por proceso y el planificador lo usa en los
+# cálculos hacia adelante sin desvío; sin numba (o si no compila) el
+# planificador sigue con su motor en Python puro.
+#
+# `python nucleo.py` comprueba que los dos motores dan la misma propuesta
+# en casos sintéticos (sale con error si alguna difiere) y mide lo que
+# tarda cada uno; tests/test_nucleo.py hace la misma comprobación con pytest.
+
+import math
+import sys
+import threading
+import time
+
+import numpy as np
+
+from lotes import ESCALA, EPS, MINIMO_PARCIAL
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Estado en que devuelve el control `llenar`
+TERMINADO = 0
+BLOQUE_LLENO = 1
+FALTA_HORIZONTE = 2
+
+
+def llenar(secuencia, centro, dia, tu, cant, fila, cap, fin_fila, pos, p, d, out_lote, out_q, out_dia):
+    """Encaja los lotes de `secuencia[pos:]` en el libro `cap` (centros × días).
+
+    Por lote `i`: `centro[i]` es la fila de `cap`, `dia[i]` el día de
+    necesidad, `tu[i]` el tiempo unitario, `cant[i]` las centésimas y
+    `fila[i]` la fila de demanda (sus lotes siguen desde `fin_fila`). Las
+    reglas son las de `colocar` en planificador.py: el lote entero si cabe,
+    si no las unidades enteras que caben (y el día queda lleno), y si no
+    cabe ninguna, el siguiente día con horas libres.
+
+    Cada propuesta se escribe en `out_lote`, `out_q` y `out_dia`. Devuelve
+    (pos, p, d, n, estado): `n` propuestas escritas y dónde seguir; p = -1
+    indica que el lote `secuencia[pos]` aún no ha empezado. Se para con
+    BLOQUE_LLENO cuando se llenan las salidas y con FALTA_HORIZONTE cuando
+    un lote pasa del último día de `cap` (hay que ampliar el libro).
+    """
+    n = 0
+    horizonte = cap.shape[1]
+    while pos < len(secuencia):
+        i = secuencia[pos]
+        c = centro[i]
+        if p < 0:
+            p = cant[i]
+            d = max(dia[i], fin_fila[fila[i]])
+        while p > 0:
+            if d >= horizonte:
+                return pos, p, d, n, FALTA_HORIZONTE
+            capd = cap[c, d]
+            hnec = p * tu[i] / ESCALA
+            if capd + EPS >= hnec:
+                cap[c, d] = max(0.0, capd - hnec)
+                q = p
+            else:
+                q = 0
+                if tu[i] > 0:
+                    q = int(math.floor(capd * ESCALA / tu[i] + EPS))
+                    q = min(p, max(0, q - q % MINIMO_PARCIAL))
+                if q == 0:
+                    # Siguiente día con horas libres en el centro
+                    d += 1
+                    while d < horizonte and cap[c, d] <= EPS:
+                        d += 1
+                    continue
+                cap[c, d] = 0.0
+            out_lote[n] = i
+            out_q[n] = q
+            out_dia[n] = d
+            n += 1
+            p -= q
+            if n == len(out_q):
+                if p == 0:
+                    fin_fila[fila[i]] = d
+                    pos += 1
+                    p = -1
+                return pos, p, d, n, BLOQUE_LLENO
+        fin_fila[fila[i]] = d
+        pos += 1
+        p = -1
+    return pos, p, d, n, TERMINADO
+
+
+# ------------------------------------------------------------
+# Compilación
+# ------------------------------------------------------------
+_COMPILADO = None
+_PROBADO = False
+_LOCK = threading.Lock()
+
+
+def compilado():
+    """`llenar` compilado con Numba (o None si no hay numba o no compila).
+
+    Se compila la primera vez con un caso mínimo, para que un fallo de
+    compilación caiga al motor en Python en lugar de a mitad de un cálculo.
+    """
+    global _COMPILADO, _PROBADO
+    with _LOCK:
+        if not _PROBADO:
+            _PROBADO = True
+            if numba is not None:
+                try:
+                    funcion = numba.njit(cache=True, nogil=True)(llenar)
+                    enteros = np.zeros(1, dtype=np.int64)
+                    funcion(
+                        enteros, enteros, enteros, np.ones(1), np.full(1, ESCALA, dtype=np.int64), enteros,
+                        np.ones((1, 2)), np.full(1, -1, dtype=np.int64), 0, -1, 0,
+                        np.empty(1, dtype=np.int64), np.empty(1, dtype=np.int64), np.empty(1, dtype=np.int64),
+                    )
+                    _COMPILADO = funcion
+                except Exception:
+                    _COMPILADO = None
+        return _COMPILADO
+
+
+# ------------------------------------------------------------
+# Paridad y rendimiento frente al motor en Python
+# ------------------------------------------------------------
+def caso_sintetico(n_filas=2000, n_materiales=300, centros=("0833", "0184"), dias=120, semilla=0, capacidad=None):
+    """(df_agr, df_mat, capacidades, DG, MCH) con demanda aleatoria para comparar motores.
+
+    Sin `capacidad` (horas diarias de cada centro) se elige una proporcional
+    a la demanda; con poca capacidad el libro tiene que ampliarse.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(semilla)
+    materiales = [f"M{k:05d}" for k in range(n_materiales)]
+    df_mat = pd.DataFrame({
+        "Material": materiales,
+        "Unidad": "UN",
+        "Tiempo fabricación unidad DG": rng.uniform(0.01, 0.5, n_materiales).round(3),
+        "Tiempo fabricación unidad MCH": rng.uniform(0.01, 0.5, n_materiales).round(3),
+        "Tamaño lote mínimo": rng.integers(0, 50, n_materiales).astype(float),
+        "Tamaño lote máximo": rng.choice([50.0, 100.0, 250.0, 1000.0], n_materiales),
+    })
+    fechas = pd.Timestamp("2025-01-06") + pd.to_timedelta(rng.integers(0, dias, n_filas), unit="D")
+    df_agr = pd.DataFrame({
+        "Material": rng.choice(materiales, n_filas),
+        "Unidad": "UN",
+        "Centro": rng.choice(list(centros), n_filas),
+        "Cantidad": rng.integers(1, 2000, n_filas).astype(float) + rng.choice([0.0, 0.25, 0.5], n_filas),
+        "Fecha": fechas.strftime("%Y-%m-%d"),
+        "Prioridad": rng.integers(1, 4, n_filas).astype(float),
+    }).sort_values(["Material", "Unidad", "Centro", "Fecha"], ignore_index=True)
+    df_agr["Semana"] = ""
+    df_agr["Lote_min"] = df_agr["Material"].map(df_mat.set_index("Material")["Tamaño lote mínimo"])
+    df_agr["Lote_max"] = df_agr["Material"].map(df_mat.set_index("Material")["Tamaño lote máximo"])
+    # Capacidad proporcional a la demanda para que quepa en el horizonte
+    capacidades = {
+        c: float(capacidad) if capacidad is not None else float(rng.integers(20, 60)) * max(1.0, n_filas / 1000)
+        for c in centros
+    }
+    return df_agr, df_mat, capacidades, centros[0], centros[-1]
+
+
+def comparar_motores(df_agr, df_mat, capacidades, DG_code, MCH_code, motor="nucleo", **opciones):
+    """Planifica con el motor en Python y con el núcleo y compara las propuestas.
+
+    Devuelve {"iguales", "filas", "segundos_python", "segundos_nucleo"};
+    con `motor="jit"` se usa el núcleo compilado (si no lo hay, el
+    resultado lleva "iguales": None).
+    """
+    import pandas as pd
+    from planificador import modo_C_en_bloques, reunir_bloques
+
+    if motor == "jit" and compilado() is None:
+        return {"iguales": None, "filas": 0, "segundos_python": None, "segundos_nucleo": None}
+
+    resultados, segundos = {}, {}
+    for nombre in ("python", motor):
+        t = time.perf_counter()
+        resultados[nombre] = reunir_bloques(modo_C_en_bloques(
+            df_agr, df_mat, capacidades, DG_code, MCH_code,
+            motor=None if nombre == "jit" else nombre, **opciones
+        ))
+        segundos[nombre] = time.perf_counter() - t
+    try:
+        pd.testing.assert_frame_equal(resultados["python"], resultados[motor])
+        iguales = True
+    except AssertionError:
+        iguales = False
+    return {
+        "iguales": iguales, "filas": len(resultados["python"]),
+        "segundos_python": segundos["python"], "segundos_nucleo": segundos[motor],
+    }
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    motor = "jit" if compilado() is not None else "nucleo"
+    print(f"Núcleo: {'compilado con numba' if motor == 'jit' else 'sin numba (se prueba el núcleo sin compilar)'}")
+    casos = [  # (filas, días de demanda, filas por bloque, capacidad)
+        (300, 30, 50_000, None), (100, 20, 13, 60.0), (2000, 120, 50_000, None),
+        (2000, 120, 97, None), (10000, 365, 50_000, None),
+    ]
+    diferentes = 0
+    for semilla, (n_filas, dias, tam, capacidad) in enumerate(casos):
+        caso = caso_sintetico(n_filas=n_filas, dias=dias, semilla=semilla, capacidad=capacidad)
+        for orden in (None, "fecha", "prioridad", "lote"):
+            for consumido in (None, "dia"):
+                opciones = {"orden": orden, "tam_bloque": tam}
+                if consumido:
+                    opciones["consumido"] = pd.DataFrame({
+                        "Centro": [caso[3]], "Fecha": [caso[0]["Fecha"].iloc[0]], "Horas": [np.inf],
+                    })
+                r = comparar_motores(*caso, motor=motor, **opciones)
+                diferentes += r["iguales"] is False
+                print(
+                    f"{n_filas:>6} filas · bloque {tam:>6} · orden {str(orden):<9} · "
+                    f"{'consumido' if consumido else 'libre':<9} → {'OK ' if r['iguales'] else 'DIFERENTE'} "
+                    f"{r['filas']:>7} propuestas · python {r['segundos_python']:.3f}s · núcleo {r['segundos_nucleo']:.3f}s"
+                )
+    if diferentes:
+        sys.exit(f"{diferentes} casos con propuestas distintas entre motores")
@@ -1,11 +1,11 @@
 # Hola
 import streamlit as st
 import pandas as pd
-import numpy as np
 import os
-import math
 from datetime import datetime
 
+from lotes import dividir_lotes
+
 # Configuración de página
 st.set_page_config(
     page_title="Sistema de Cálculo de Fabricación",
@@ -232,35 +232,8 @@ def ejecutar_calculo(df_mat, df_cli, df_dem, df_cap):
             'Suiza': df_cap.loc[df_cap['Planta'] == 'MCH', 'Centro'].values[0] if len(df_cap.loc[df_cap['Planta'] == 'MCH']) > 0 else 'MCH'
         }
 
-        resultado_lotes = []
-        cont_propuesta = 1
-
-        for _, fila in df_agrupado.iterrows():
-            cant_total = fila['Cantidad']
-            lote_min = fila['Tamaño lote mínimo']
-            lote_max = fila['Tamaño lote máximo']
-            
-            # Ajuste al Lote Mínimo
-            if cant_total < lote_min:
-                cant_total = lote_min
-                
-            # División por Lote Máximo
-            num_ordenes = math.ceil(cant_total / lote_max)
-            cant_por_orden = cant_total / num_ordenes
-
-            for _ in range(num_ordenes):
-                fecha_str = pd.to_datetime(fila['Fecha de necesidad']).strftime('%Y%m%d')
-                
-                resultado_lotes.append({
-                    'Nº de propuesta': cont_propuesta,
-                    'Material': fila['Material'],
-                    'Centro': centros_map[fila['Planta_Temp']],
-                    'Clase de orden': 'NORM',
-                    'Cantidad a fabricar': round(cant_por_orden, 2),
-                    'Unidad': fila['Unidad'],
-                    'Fecha de fabricación': fecha_str
-                })
-                cont_propuesta += 1
+        # Ajuste al lote mínimo y división por lote máximo
+        df_lotes = dividir_lotes(df_agrupado, reparto="igual")
 
         status_text.write("💾 Guardando resultados...")
         progress_bar.progress(90)
@@ -268,7 +241,15 @@ def ejecutar_calculo(df_mat, df_cli, df_dem, df_cap):
         # ==========================================
         # EXPORTACIÓN
         # ==========================================
-        df_final = pd.DataFrame(resultado_lotes)
+        df_final = pd.DataFrame({
+            'Nº de propuesta': df_lotes['Nº de propuesta'],
+            'Material': df_lotes['Material'],
+            'Centro': df_lotes['Planta_Temp'].map(centros_map),
+            'Clase de orden': 'NORM',
+            'Cantidad a fabricar': df_lotes['Cantidad a fabricar'],
+            'Unidad': df_lotes['Unidad'],
+            'Fecha de fabricación': pd.to_datetime(df_lotes['Fecha de necesidad']).dt.strftime('%Y%m%d')
+        })
         ruta_salida = os.path.join(UPLOAD_DIR, f"Propuesta_Fabricacion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
         df_final.to_excel(ruta_salida, index=False)
 
@@ -0,0 +1,124 @@
+# ============================================================
+# PARALELO — Planificación por centros en el pool de procesos
+# ============================================================
+# Sin desvío, cada centro solo consume su propio libro de capacidad, así
+# que los centros se pueden planificar a la vez en procesos distintos (el
+# pool de ingesta.py). La demanda, el maestro de materiales y las horas
+# comprometidas se publican una sola vez en memoria compartida (ver
+# compartida.py): a cada tarea solo viajan los descriptores y su centro,
+# y la propuesta de cada centro vuelve también por memoria compartida.
+#
+# Las propuestas de los centros se juntan en el orden de un cálculo en un
+# solo proceso (por material, unidad y centro, en el orden en que llegan
+# en la demanda) y se renumeran. Sin `orden` el resultado es idéntico
+# cuando las filas de cada material, unidad y centro van seguidas (como
+# las deja `agregar_demanda`); con políticas de orden la numeración
+# puede variar.
+
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from compartida import publicar, adjuntar, recoger, liberar
+from ingesta import pool_procesos, reiniciar_pool
+from planificador import TAM_BLOQUE, norm_code, columnas_tiempo, modo_C_en_bloques, reunir_bloques
+
+# Por debajo de estas filas de demanda se planifica en el propio proceso
+MIN_FILAS_PARALELO = 20_000
+
+
+def _planificar_centro(planos, centro, capacidades, DG_code, MCH_code, opciones):
+    """Planifica un centro con los datos publicados (se ejecuta en el trabajador)."""
+    nombres = {p["nombre"] for p in planos.values() if p is not None}
+    df_agr = adjuntar(planos["demanda"], nombres)
+    df_mat = adjuntar(planos["materiales"], nombres)
+    consumido = adjuntar(planos["consumido"], nombres) if planos["consumido"] is not None else None
+    propuesta = reunir_bloques(modo_C_en_bloques(
+        df_agr[df_agr["Centro"].map(norm_code) == centro], df_mat, capacidades, DG_code, MCH_code,
+        consumido=consumido, **opciones
+    ))
+    return publicar(propuesta)
+
+
+def _orden_calculo(df_agr, propuesta):
+    """Posiciones que ponen `propuesta` en el orden de un cálculo en un solo proceso."""
+    claves = pd.MultiIndex.from_arrays([
+        df_agr["Material"].astype(str), df_agr["Unidad"].astype(str), df_agr["Centro"].map(norm_code),
+    ]).unique()
+    rango = claves.get_indexer(pd.MultiIndex.from_arrays([
+        propuesta["Material"].astype(str), propuesta["Unidad"].astype(str), propuesta["Centro"].astype(str),
+    ]))
+    return np.argsort(rango, kind="stable")
+
+
+def planificar_por_centros(df_agr, df_mat, capacidades, DG_code, MCH_code, tam_bloque=TAM_BLOQUE,
+                           consumido=None, procesos=None, minimo_filas=MIN_FILAS_PARALELO, **opciones):
+    """`modo_C_en_bloques` con cada centro en un proceso del pool.
+
+    Mismos argumentos y órdenes que `modo_C_en_bloques`; sin `orden` y con
+    la demanda agrupada por material, unidad y centro, también la misma
+    numeración. Con `orden` las órdenes se numeran igual, por material,
+    unidad y centro, y no en el orden de la política como en un solo
+    proceso. Con desvío
+    (`coste_retraso`), un solo centro, un solo procesador (`procesos`, por
+    defecto los del equipo) o menos de `minimo_filas` filas se planifica
+    en el propio proceso, igual que si el pool no está disponible.
+    """
+    centros = list(dict.fromkeys(df_agr["Centro"].map(norm_code)))
+    procesos = procesos or os.cpu_count() or 1
+    if (opciones.get("coste_retraso") is not None or len(centros) < 2 or procesos < 2
+            or len(df_agr) < minimo_filas):
+        yield from modo_C_en_bloques(
+            df_agr, df_mat, capacidades, DG_code, MCH_code, tam_bloque=tam_bloque, consumido=consumido, **opciones
+        )
+        return
+
+    # Del maestro solo viaja lo que usa el planificador sin desvío
+    materiales = df_mat[
+        ["Material","Unidad"] + columnas_tiempo(df_mat) + ["Tamaño lote mínimo","Tamaño lote máximo"]
+    ]
+    planos = {"demanda": None, "materiales": None, "consumido": None}
+    futuros, descriptores, error = None, [], None
+    try:
+        planos["demanda"] = publicar(df_agr)
+        planos["materiales"] = publicar(materiales)
+        if consumido is not None:
+            planos["consumido"] = publicar(consumido)
+        try:
+            ejecutor = pool_procesos()
+            futuros = [
+                ejecutor.submit(_planificar_centro, planos, c, capacidades, DG_code, MCH_code, opciones)
+                for c in centros
+            ]
+        except (OSError, RuntimeError, BrokenProcessPool):
+            reiniciar_pool()
+        # Se esperan todos los centros aunque alguno falle: los bloques de
+        # los que terminaron hay que recogerlos para que no queden sin borrar
+        for futuro in futuros or []:
+            try:
+                descriptores.append(futuro.result())
+            except Exception as e:
+                error = error or e
+    finally:
+        for plano in planos.values():
+            if plano is not None:
+                liberar(plano)
+        partes = [recoger(d) for d in descriptores]
+
+    if error is not None and not isinstance(error, BrokenProcessPool):
+        raise error
+    if futuros is None or error is not None:
+        if error is not None:
+            reiniciar_pool()
+        yield from modo_C_en_bloques(
+            df_agr, df_mat, capacidades, DG_code, MCH_code, tam_bloque=tam_bloque, consumido=consumido, **opciones
+        )
+        return
+
+    propuesta = reunir_bloques(p for p in partes if len(p))
+    propuesta = propuesta.iloc[_orden_calculo(df_agr, propuesta)].reset_index(drop=True)
+    propuesta["Nº de propuesta"] = np.arange(1, len(propuesta) + 1)
+    for inicio in range(0, len(propuesta), tam_bloque):
+        yield propuesta.iloc[inicio:inicio + tam_bloque].reset_index(drop=True)
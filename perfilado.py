@@ -0,0 +1,249 @@
+# ============================================================
+# PERFILADO — Captura de perfiles de un cálculo y reproducción
+# ============================================================
+# Cuando un planificador dice que «la propuesta va lenta», sus entradas
+# solo existen en su sesión. Con «Perfilar» activado, el cálculo (inicial
+# o re‑planificación) se ejecuta bajo cProfile y se guarda una captura en
+# RUTA_PERFILES/<fecha>_<tipo>/:
+#
+#   perfil.pstats   estadísticas de cProfile (pstats, snakeviz…)
+#   perfil.folded   pilas colapsadas (flamegraph.pl, speedscope, inferno)
+#   entradas.pkl    los argumentos exactos de la llamada
+#   perfil.json     función, huellas de las entradas y del resultado,
+#                   segundos y versiones
+#
+# `python perfilado.py <captura> [--perfilar]` repite la llamada sin
+# interfaz con las mismas entradas, comprueba sus huellas y las del
+# resultado y, con --perfilar, vuelve a perfilarla. Solo se perfila el
+# proceso de la sesión: los centros planificados en el pool (ver
+# paralelo.py) aparecen como espera.
+
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import zipfile
+import cProfile
+import importlib
+import platform
+import pstats
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ingesta import huella_df
+
+RUTA_PERFILES = os.path.join("archivos_cargados", "perfiles")
+
+# En las pilas colapsadas, las ramas de menos de estos segundos se suman a su llamador
+UMBRAL_PILA = 1e-4
+# Profundidad máxima de las pilas colapsadas
+MAX_PROFUNDIDAD = 80
+
+
+# ------------------------------------------------------------
+# Huellas
+# ------------------------------------------------------------
+def huella_valor(valor):
+    """Hash del contenido de un argumento o resultado (DataFrames, dicts, listas…)."""
+    if isinstance(valor, pd.DataFrame):
+        return huella_df(valor)
+    if isinstance(valor, pd.Series):
+        return huella_df(valor.to_frame())
+    if isinstance(valor, dict):
+        return {str(k): huella_valor(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)) and any(isinstance(v, (pd.DataFrame, pd.Series, dict)) for v in valor):
+        return [huella_valor(v) for v in valor]
+    if isinstance(valor, (set, frozenset)):
+        valor = sorted(map(str, valor))
+    return hashlib.sha1(json.dumps(valor, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------
+# Pilas colapsadas
+# ------------------------------------------------------------
+def _etiqueta(funcion):
+    archivo, linea, nombre = funcion
+    if archivo == "~":
+        return nombre.replace(";", ",")
+    return f"{nombre} ({os.path.basename(archivo)}:{linea})".replace(";", ",")
+
+
+def pilas_colapsadas(estadisticas):
+    """{"a;b;c": microsegundos} a partir de unas `pstats.Stats`.
+
+    cProfile no guarda pilas sino llamadas entre pares de funciones: el
+    tiempo de cada función se reparte entre sus llamadores en proporción
+    al tiempo acumulado de cada llamada (lo mismo que hacen flameprof y
+    gprof2dot), así que es una aproximación.
+    """
+    datos = estadisticas.stats
+    hijos = defaultdict(dict)
+    for funcion, (_, _, _, _, llamadores) in datos.items():
+        for llamador, arista in llamadores.items():
+            hijos[llamador][funcion] = arista[3]
+    raices = [f for f, v in datos.items() if not any(g in datos for g in v[4])]
+
+    pilas = defaultdict(float)
+
+    def visitar(funcion, pila, en_pila, fraccion):
+        _, _, tt, _, _ = datos[funcion]
+        pila = pila + (_etiqueta(funcion),)
+        # Las ramas que se omiten cuentan como tiempo propio de la función
+        propio = tt
+        for hijo, ct in hijos.get(funcion, {}).items():
+            total = datos[hijo][3]
+            if hijo in en_pila or total <= 0:
+                continue
+            if ct * fraccion < UMBRAL_PILA or len(pila) >= MAX_PROFUNDIDAD:
+                propio += ct
+                continue
+            visitar(hijo, pila, en_pila | {hijo}, fraccion * min(1.0, ct / total))
+        pilas[";".join(pila)] += propio * fraccion
+
+    for raiz in raices:
+        visitar(raiz, (), {raiz}, 1.0)
+    return {pila: int(round(s * 1e6)) for pila, s in pilas.items() if s * 1e6 >= 0.5}
+
+
+def _escribir_folded(estadisticas, ruta):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for pila, us in sorted(pilas_colapsadas(estadisticas).items()):
+            f.write(f"{pila} {us}\n")
+
+
+def resumen_perfil(ruta, n=20):
+    """Las `n` funciones con más tiempo acumulado de una captura (DataFrame)."""
+    datos = pstats.Stats(os.path.join(ruta, "perfil.pstats")).stats
+    filas = [
+        {"Función": _etiqueta(f), "Llamadas": nc, "Propio (s)": tt, "Acumulado (s)": ct}
+        for f, (_, nc, tt, ct, _) in datos.items()
+    ]
+    return pd.DataFrame(filas).sort_values("Acumulado (s)", ascending=False, ignore_index=True).head(n)
+
+
+# ------------------------------------------------------------
+# Captura
+# ------------------------------------------------------------
+def _modulo(funcion):
+    # Con `streamlit run` el módulo de V3 se llama "__main__": se guarda el archivo
+    return os.path.splitext(os.path.basename(inspect.getfile(funcion)))[0]
+
+
+def _guardar_perfil(perfil, ruta):
+    perfil.dump_stats(os.path.join(ruta, "perfil.pstats"))
+    _escribir_folded(pstats.Stats(perfil), os.path.join(ruta, "perfil.folded"))
+
+
+def perfilar(tipo, funcion, argumentos, ruta=RUTA_PERFILES):
+    """`funcion(**argumentos)` bajo cProfile; devuelve (resultado, carpeta de la captura).
+
+    Si ya hay otro perfilador activo en el proceso se ejecuta sin perfilar
+    y la carpeta es None.
+    """
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        return funcion(**argumentos), None
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion(**argumentos)
+    finally:
+        perfil.disable()
+    segundos = time.perf_counter() - inicio
+
+    carpeta = os.path.join(ruta, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{tipo}")
+    os.makedirs(carpeta, exist_ok=True)
+    _guardar_perfil(perfil, carpeta)
+    with open(os.path.join(carpeta, "entradas.pkl"), "wb") as f:
+        pickle.dump(argumentos, f, protocol=pickle.HIGHEST_PROTOCOL)
+    manifiesto = {
+        "tipo": tipo,
+        "modulo": _modulo(funcion),
+        "funcion": funcion.__name__,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "segundos": segundos,
+        "entradas": {k: huella_valor(v) for k, v in argumentos.items()},
+        "resultado": huella_valor(resultado),
+        "versiones": {
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+        },
+    }
+    with open(os.path.join(carpeta, "perfil.json"), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return resultado, carpeta
+
+
+def comprimir_captura(carpeta):
+    """Bytes de un .zip con los archivos de una captura (para descargarla)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        for nombre in sorted(os.listdir(carpeta)):
+            z.write(os.path.join(carpeta, nombre), nombre)
+    return buffer.getvalue()
+
+
+# ------------------------------------------------------------
+# Reproducción sin interfaz
+# ------------------------------------------------------------
+def reproducir(carpeta, perfilar_de_nuevo=False):
+    """Repite la llamada de una captura con sus mismas entradas.
+
+    Devuelve {"segundos", "entradas_iguales", "resultado_igual", "perfil"}:
+    si las huellas de las entradas o del resultado no coinciden con las
+    guardadas, la ejecución no es la misma que se capturó. Con
+    `perfilar_de_nuevo` se guarda el perfil nuevo en la carpeta de la
+    captura como repeticion.pstats / repeticion.folded.
+    """
+    with open(os.path.join(carpeta, "perfil.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    with open(os.path.join(carpeta, "entradas.pkl"), "rb") as f:
+        argumentos = pickle.load(f)
+    funcion = getattr(importlib.import_module(manifiesto["modulo"]), manifiesto["funcion"])
+    entradas_iguales = {k: huella_valor(v) for k, v in argumentos.items()} == manifiesto["entradas"]
+
+    perfil = cProfile.Profile() if perfilar_de_nuevo else None
+    inicio = time.perf_counter()
+    if perfil is not None:
+        perfil.enable()
+    try:
+        resultado = funcion(**argumentos)
+    finally:
+        if perfil is not None:
+            perfil.disable()
+    segundos = time.perf_counter() - inicio
+
+    if perfil is not None:
+        perfil.dump_stats(os.path.join(carpeta, "repeticion.pstats"))
+        _escribir_folded(pstats.Stats(perfil), os.path.join(carpeta, "repeticion.folded"))
+    return {
+        "segundos": segundos,
+        "entradas_iguales": entradas_iguales,
+        "resultado_igual": huella_valor(resultado) == manifiesto["resultado"],
+        "perfil": os.path.join(carpeta, "repeticion.pstats") if perfil is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Uso: python perfilado.py <carpeta de la captura> [--perfilar]")
+    carpeta = sys.argv[1]
+    # El módulo de la función (V3…) está junto a este archivo
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(carpeta, "perfil.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    r = reproducir(carpeta, perfilar_de_nuevo="--perfilar" in sys.argv[2:])
+    print(f"{manifiesto['modulo']}.{manifiesto['funcion']} ({manifiesto['tipo']}, capturado {manifiesto['fecha']})")
+    print(f"  entradas: {'iguales' if r['entradas_iguales'] else 'DISTINTAS'} · "
+          f"resultado: {'igual' if r['resultado_igual'] else 'DISTINTO'}")
+    print(f"  {r['segundos']:.2f}s ahora · {manifiesto['segundos']:.2f}s en la captura")
+    if r["perfil"]:
+        print(f"  perfil: {r['perfil']}")
+        pstats.Stats(r["perfil"]).sort_stats("cumulative").print_stats(20)
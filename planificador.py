@@ -0,0 +1,698 @@
+# ============================================================
+# PLANIFICADOR — Lotes con capacidad diaria (modo C)
+# ============================================================
+# Motor sin dependencias de Streamlit: lo usan V3.py y el resto de
+# pantallas, y se puede ejecutar desde scripts sin levantar la interfaz.
+
+import heapq
+
+import numpy as np
+import pandas as pd
+from lotes import (
+    ESCALA, EPS, MINIMO_PARCIAL, de_centesimas, horas_de,
+    cantidad_por_capacidad, dividir_lotes,
+)
+from calendario import calendario_centro, capacidad_diaria, etiquetas_dias
+from maestros import indice
+import nucleo
+
+# ------------------------------------------------------------
+# UTILIDADES
+# ------------------------------------------------------------
+def to_float_safe(v, default=0.0):
+    if pd.isna(v): return float(default)
+    if isinstance(v, str):
+        v = v.replace(",", ".").strip()
+        if v == "": return float(default)
+    try:
+        return float(v)
+    except:
+        return float(default)
+
+def a_float(serie, default=0.0):
+    """Versión por columnas de `to_float_safe`."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float).fillna(float(default))
+    return serie.map(lambda v: to_float_safe(v, default)).astype(float)
+
+def a_fechas(serie):
+    """Columna de fechas: las que ya son fechas tal cual, las 'dd.mm.YYYY'
+    del planificador con su formato y el resto (fechas de la demanda) con el
+    lector de pandas, el mismo con el que se calcula su semana."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    propias = pd.to_datetime(serie, format="%d.%m.%Y", errors="coerce")
+    resto = serie.where(propias.isna() & serie.notna())
+    if resto.notna().any():
+        propias = propias.fillna(pd.to_datetime(resto, format="mixed"))
+    return propias
+
+def norm_code(code):
+    s = str(code).strip()
+    if s.endswith(".0"): s = s[:-2]
+    digits = "".join(ch for ch in s if s and ch.isdigit())
+    if digits == "": return s
+    if len(digits) < 4:
+        digits = digits.zfill(4)
+    return digits
+
+def columnas_tiempo(df):
+    return [c for c in df.columns if str(c).startswith("Tiempo fabricación unidad ")]
+
+def tiempo_por_centro(df, DG_code, plantas=None):
+    """Tiempo unitario de cada fila según su centro.
+
+    `plantas` es {centro: planta} (ver asignacion.py) y se usa la columna
+    'Tiempo fabricación unidad {planta}'; sin él, DG o MCH como siempre.
+    """
+    if not plantas:
+        return np.where(
+            df["Centro"].astype(str) == str(DG_code),
+            a_float(df["Tiempo fabricación unidad DG"], 0),
+            a_float(df["Tiempo fabricación unidad MCH"], 0)
+        )
+    centro = df["Centro"].astype(str).to_numpy()
+    tu = np.zeros(len(df))
+    for c, planta in plantas.items():
+        col = f"Tiempo fabricación unidad {planta}"
+        if col in df.columns:
+            tu = np.where(centro == str(c), a_float(df[col], 0).to_numpy(), tu)
+    return tu
+
+def semana_iso_str_from_ts(ts: pd.Timestamp) -> str:
+    """Devuelve semana ISO como 'YYYY-Www' (lunes-domingo)."""
+    iso = ts.isocalendar()
+    return f"{int(iso.year)}-W{int(iso.week):02d}"
+
+# ------------------------------------------------------------
+# Planificador por lotes con capacidad diaria
+# ------------------------------------------------------------
+# Columnas de una propuesta tal como salen del planificador
+COLUMNAS_PROPUESTA = [
+    "Nº de propuesta","Material","Centro","Clase de orden",
+    "Cantidad a fabricar","Unidad","Fecha","Semana","Lote_min","Lote_max"
+]
+
+# Filas por bloque en la salida en streaming
+TAM_BLOQUE = 50_000
+
+# Límite de días que se puede desplazar la planificación (20 años)
+MAX_HORIZONTE = 7300
+
+# Políticas de orden para la cola de prioridad de `modo_C_en_bloques`:
+# reciben los lotes y devuelven las columnas de la clave (menor = antes).
+# 'Dia' es el día de necesidad (desde el origen) y 'Prioridad' la del
+# cliente (menor = más urgente; 0 si no viene).
+POLITICAS_ORDEN = {
+    "fecha": lambda l: [l["Dia"]],
+    "prioridad": lambda l: [l["Prioridad"], l["Dia"]],
+    "lote": lambda l: [l["Dia"], l["Cantidad a fabricar"]],
+}
+
+# ------------------------------------------------------------
+# Libro de capacidad
+# ------------------------------------------------------------
+# Por centro, un array con las horas libres de cada día del horizonte
+# (desde `origen`), sacado del calendario del centro y con las horas ya
+# comprometidas descontadas. Los arrays se crean al pedir cada centro y, si
+# la planificación se sale del horizonte, se amplían al doble. El libro es
+# un dict con el horizonte y las etiquetas de sus días.
+def nuevo_libro(capacidades, calendarios, origen, horizonte, consumido=None):
+    """Libro de `horizonte` días desde `origen`; `consumido` (Centro, Fecha, Horas) se descuenta."""
+    # Horas ya comprometidas por centro: (días desde el origen, horas)
+    comprometido = {}
+    if consumido is not None and len(consumido):
+        dias_c = (a_fechas(consumido["Fecha"]).dt.normalize() - origen).dt.days
+        horas_c = a_float(consumido["Horas"], 0)
+        for centro, grupo in horas_c.groupby([consumido["Centro"].map(norm_code), dias_c]).sum().groupby(level=0):
+            comprometido[centro] = (grupo.index.get_level_values(1).to_numpy(np.int64), grupo.to_numpy())
+    fechas, semanas = etiquetas_dias(origen, horizonte)
+    return {
+        "capacidades": capacidades, "calendarios": calendarios, "origen": origen,
+        "horizonte": horizonte, "fechas": fechas, "semanas": semanas,
+        "restante": {}, "comprometido": comprometido,
+        "dia_completo": {}, "anterior": {},
+    }
+
+def _descontar(libro, centro, arr, desde):
+    if centro in libro["comprometido"]:
+        dias, horas = libro["comprometido"][centro]
+        dentro = (dias >= desde) & (dias < desde + len(arr))
+        arr[dias[dentro] - desde] -= horas[dentro]
+        np.maximum(arr, 0.0, out=arr)
+    return arr
+
+def horas_libres(libro, centro):
+    """Array de horas libres por día de `centro` (se modifica al planificar)."""
+    restante = libro["restante"]
+    if centro not in restante:
+        restante[centro] = _descontar(libro, centro, capacidad_diaria(
+            libro["capacidades"].get(centro, 0), libro["origen"], libro["horizonte"],
+            calendario_centro(libro["calendarios"], centro)
+        ), 0)
+    return restante[centro]
+
+def ampliar_libro(libro):
+    """Duplica el horizonte del libro (error si pasa de MAX_HORIZONTE)."""
+    horizonte = libro["horizonte"]
+    if horizonte >= MAX_HORIZONTE:
+        raise ValueError("No hay capacidad suficiente en el horizonte máximo de planificación.")
+    inicio = libro["origen"] + pd.Timedelta(days=horizonte)
+    restante = libro["restante"]
+    for centro, arr in restante.items():
+        extra = capacidad_diaria(
+            libro["capacidades"].get(centro, 0), inicio, horizonte, calendario_centro(libro["calendarios"], centro)
+        )
+        restante[centro] = np.concatenate([arr, _descontar(libro, centro, extra, horizonte)])
+    f_extra, s_extra = etiquetas_dias(inicio, horizonte)
+    libro["fechas"] = np.concatenate([libro["fechas"], f_extra])
+    libro["semanas"] = np.concatenate([libro["semanas"], s_extra])
+    libro["horizonte"] = horizonte * 2
+
+def minimo_parcial(libro, centro, tu):
+    """Centésimas mínimas de un lote parcial en `centro`.
+
+    Una unidad entera si cabe en un día completo del centro (la base o la
+    mayor capacidad especial); si una unidad lleva más horas que el día,
+    centésimas (la unidad se reparte entre varios días en lugar de no
+    caber nunca).
+    """
+    dia_completo = libro["dia_completo"]
+    if centro not in dia_completo:
+        especiales = (calendario_centro(libro["calendarios"], centro).get("capacidad") or {}).values()
+        dia_completo[centro] = max([to_float_safe(libro["capacidades"].get(centro, 0), 0), *map(float, especiales)])
+    return MINIMO_PARCIAL if horas_de(MINIMO_PARCIAL, tu) <= dia_completo[centro] + EPS else 1
+
+# Índice inverso por centro para la planificación hacia atrás: anterior[d]
+# apunta a un día <= d que puede tener horas libres (-1 si no queda
+# ninguno). Los días agotados se enlazan con el anterior y los saltos se
+# comprimen al buscar (union‑find), así que cada búsqueda es casi O(1).
+def indice_atras(libro, centro):
+    cap_dias = horas_libres(libro, centro)
+    ant = libro["anterior"].setdefault(centro, [])
+    for dia in range(len(ant), len(cap_dias)):
+        ant.append(dia if cap_dias[dia] > EPS else dia - 1)
+    return ant
+
+def ultimo_libre(ant, d):
+    raiz = d
+    while raiz >= 0 and ant[raiz] != raiz:
+        raiz = ant[raiz]
+    while d > raiz:
+        ant[d], d = raiz, ant[d]
+    return raiz
+
+# ------------------------------------------------------------
+# Motor de llenado
+# ------------------------------------------------------------
+def motor_llenado(motor, lotes, libro, desviar, atras):
+    """Función de llenado del núcleo (nucleo.py) para estos lotes, o None para el bucle en Python.
+
+    El núcleo solo planifica hacia adelante, sin desvío y con unidades
+    enteras: si alguna unidad no cabe en un día completo de su centro,
+    sigue el motor en Python. `motor="python"` lo fuerza siempre y
+    `motor="nucleo"` usa el núcleo aunque no esté compilado.
+    """
+    if motor == "python" or desviar or atras is not None:
+        return None
+    llenar = nucleo.llenar if motor == "nucleo" else nucleo.compilado()
+    if llenar is not None and any(
+        minimo_parcial(libro, c, tu) != MINIMO_PARCIAL for c, tu in lotes.groupby("Centro")["TU"].max().items()
+    ):
+        return None
+    return llenar
+
+def llenar_con_nucleo(llenar, lotes, secuencia, libro, n_filas, tam_bloque):
+    """Bloques de propuestas del núcleo: el mismo llenado sobre arrays, con
+    el libro de los centros en una matriz centros × días."""
+    centros_lote = list(dict.fromkeys(lotes["Centro"]))
+    for centro in centros_lote:
+        horas_libres(libro, centro)
+    arrays = (
+        secuencia,
+        lotes["Centro"].map({c: j for j, c in enumerate(centros_lote)}).to_numpy(np.int64),
+        lotes["Dia"].to_numpy(np.int64),
+        lotes["TU"].to_numpy(np.float64),
+        lotes["Cantidad a fabricar"].to_numpy(np.int64),
+        lotes["Fila"].to_numpy(np.int64),
+    )
+    fin_fila = np.full(n_filas, -1, dtype=np.int64)
+    salida = tuple(np.empty(tam_bloque, dtype=np.int64) for _ in range(3))
+    columnas_salida = {c: lotes[c].to_numpy() for c in ["Material","Centro","Unidad","Lote_min","Lote_max"]}
+    restante = libro["restante"]
+    contador = 1
+    pos, p, d, estado = 0, -1, 0, nucleo.BLOQUE_LLENO
+    while estado != nucleo.TERMINADO:
+        cap = np.array([restante[c] for c in centros_lote]).reshape(len(centros_lote), libro["horizonte"])
+        estado = nucleo.BLOQUE_LLENO
+        while estado == nucleo.BLOQUE_LLENO:
+            pos, p, d, n, estado = llenar(*arrays, cap, fin_fila, pos, p, d, *salida)
+            if n:
+                i, q, dias = (a[:n] for a in salida)
+                bloque = pd.DataFrame({
+                    "Nº de propuesta": np.arange(contador, contador + n),
+                    **{c: v[i] for c, v in columnas_salida.items()},
+                    "Cantidad a fabricar": q / ESCALA,
+                    "Fecha": libro["fechas"][dias],
+                    "Semana": libro["semanas"][dias],
+                })
+                bloque["Clase de orden"] = "NORM"
+                contador += n
+                yield bloque[COLUMNAS_PROPUESTA]
+        for j, centro in enumerate(centros_lote):
+            restante[centro] = cap[j]
+        if estado == nucleo.FALTA_HORIZONTE:
+            ampliar_libro(libro)
+
+# ------------------------------------------------------------
+# Planificador
+# ------------------------------------------------------------
+def modo_C_en_bloques(df_agr, df_mat, capacidades, DG_code, MCH_code, tam_bloque=TAM_BLOQUE,
+                      calendarios=None, plantas=None, coste_retraso=None, orden=None, atras=None,
+                      consumido=None, motor=None, hoy=None):
+    """Reparte la demanda agregada en lotes y la encaja en la capacidad diaria.
+
+    Generador: entrega las propuestas en DataFrames de hasta `tam_bloque`
+    filas a medida que se generan (la numeración sigue entre bloques), de
+    modo que nunca se guarda la lista completa de propuestas en memoria.
+
+    Las cantidades se trabajan en centésimas enteras (ver `lotes.py`):
+    los lotes se obtienen con división entera y la cantidad limitada por
+    capacidad se redondea hacia abajo, así que no quedan restos flotantes
+    que generen propuestas diminutas ni iteraciones de más.
+
+    La división en lotes se hace de una vez con `dividir_lotes`; el bucle
+    solo recorre los lotes para ir consumiendo la capacidad diaria, que se
+    lee de arrays precalculados con el calendario de cada centro
+    (`calendarios`, ver calendario.py; sin calendario, todos los días).
+    Con `plantas` ({centro: planta}) el tiempo unitario sale de la columna
+    de la planta de cada centro, para cualquier número de centros.
+
+    Desvío entre centros: con `coste_retraso` (coste por unidad y día de
+    retraso), cuando el centro de una orden no tiene horas ese día se mira
+    en el libro si otro centro las tiene ese mismo día. Se desvía si el
+    sobrecoste unitario de fabricar allí es menor que el coste de esperar
+    al siguiente día libre del centro propio. El coste unitario por centro
+    se lee de las columnas 'Coste {centro}' de `df_agr` si vienen (con el
+    envío incluido) o si no de 'Coste unitario {planta}' del maestro; las
+    filas con 'Desviable' a False (clientes exclusivos) no se desvían.
+    Sin `coste_retraso` el trabajo solo se desplaza en el tiempo.
+
+    Orden: sin `orden` los lotes se planifican en el orden en que llegan
+    (el de la agrupación, alfabético por material). Con `orden` (nombre de
+    `POLITICAS_ORDEN` o una función igual) se usa una cola de prioridad:
+    los lotes con menor clave de la política cogen la capacidad primero.
+
+    Hacia atrás (justo a tiempo): con `atras` (días) cada lote se coloca en
+    los últimos días con horas libres hasta su fecha de necesidad, como
+    mucho `atras` días antes y nunca antes de `hoy` (por defecto la fecha
+    actual); solo lo que no cabe ahí sigue hacia adelante desde la fecha
+    (con el desvío de siempre). Sin `atras`, solo adelante.
+
+    Arranque en caliente: `consumido` (Centro, Fecha, Horas) son horas ya
+    comprometidas por planes anteriores y se descuentan del libro antes de
+    planificar (ver compromisos.py).
+
+    Motor: hacia adelante y sin desvío, el llenado de capacidad se hace en
+    el núcleo compilado de nucleo.py si numba está disponible (la propuesta
+    es la misma). `motor="python"` fuerza el bucle en Python y
+    `motor="nucleo"` el núcleo aunque no esté compilado (para compararlos).
+    """
+    def tabla_tiempos(df_mat):
+        columnas_coste = [c for c in df_mat.columns if str(c).startswith("Coste unitario ")]
+        return df_mat[
+            ["Material","Unidad"] + columnas_tiempo(df_mat)
+            + (columnas_coste if coste_retraso is not None else [])
+            + ["Tamaño lote mínimo","Tamaño lote máximo"]
+        ].drop_duplicates()
+    # Con un maestro compartido (ver maestros.py) la tabla se monta una vez
+    tiempos = indice(df_mat, ("planificar", coste_retraso is not None), tabla_tiempos)
+
+    df = df_agr.merge(tiempos, on=["Material","Unidad"], how="left")
+
+    col_min = "Lote_min" if "Lote_min" in df.columns else "Tamaño lote mínimo"
+    col_max = "Lote_max" if "Lote_max" in df.columns else "Tamaño lote máximo"
+    df["Fila"] = np.arange(len(df))
+    df["Centro"] = df["Centro"].map(norm_code)
+    df["Fecha"] = a_fechas(df["Fecha"]).dt.normalize()
+    df["Cantidad"] = a_float(df["Cantidad"], 0)
+    df["Lote_min"] = a_float(df[col_min], 0)
+    df["Lote_max"] = a_float(df[col_max], 1).clip(lower=1.0)
+    df["TU"] = tiempo_por_centro(df, DG_code, plantas)
+    df["Prioridad"] = a_float(df["Prioridad"], 0) if "Prioridad" in df.columns else 0.0
+
+    # Desvío: tiempo y coste unitario de cada fila en cada centro posible
+    centros_ruta = list(plantas) if plantas else list(dict.fromkeys([norm_code(DG_code), norm_code(MCH_code)]))
+    desviar = coste_retraso is not None and len(centros_ruta) > 1
+    if desviar:
+        nombres = plantas or {centros_ruta[0]: "DG", centros_ruta[-1]: "MCH"}
+        pos_ruta = {c: j for j, c in enumerate(centros_ruta)}
+        tu_ruta = np.column_stack([
+            a_float(df[f"Tiempo fabricación unidad {nombres[c]}"], 0) if f"Tiempo fabricación unidad {nombres[c]}" in df.columns
+            else np.zeros(len(df)) for c in centros_ruta
+        ])
+        coste_ruta = np.column_stack([
+            a_float(df[f"Coste {c}"], 0) if f"Coste {c}" in df.columns
+            else a_float(df[f"Coste unitario {nombres[c]}"], 0) if f"Coste unitario {nombres[c]}" in df.columns
+            else np.zeros(len(df)) for c in centros_ruta
+        ])
+        desviable = (
+            df["Desviable"].fillna(True).astype(bool).to_numpy() if "Desviable" in df.columns
+            else np.ones(len(df), dtype=bool)
+        )
+
+    lotes = dividir_lotes(df, "Cantidad", "Lote_min", "Lote_max", reparto="maximo")
+    lotes["Cantidad a fabricar"] = np.rint(lotes["Cantidad a fabricar"] * ESCALA).astype(np.int64)
+
+    # Libro de capacidad (ver `nuevo_libro`)
+    if lotes["Fecha"].isna().any():
+        raise ValueError("Hay demanda sin 'Fecha de necesidad'.")
+    origen = lotes["Fecha"].min() if len(lotes) else pd.Timestamp.today().normalize()
+    if atras is not None:
+        atras = max(0, int(atras))
+        origen -= pd.Timedelta(days=atras)
+        # Hacia atrás no se planifica en días ya pasados
+        dia_hoy = (pd.Timestamp(hoy if hoy is not None else pd.Timestamp.today()).normalize() - origen).days
+    lotes["Dia"] = (lotes["Fecha"] - origen).dt.days
+    horizonte = int(lotes["Dia"].max()) + 1 + 31 if len(lotes) else 31
+    libro = nuevo_libro(capacidades, calendarios, origen, horizonte, consumido)
+
+    def mejor_desvio(fila, centro, d, p, coste_espera):
+        """(centro, centésimas) del desvío más barato el día `d`, o None.
+
+        Solo se consideran centros con horas libres ese día y con un
+        sobrecoste unitario menor que `coste_espera`; la capacidad usada
+        se descuenta del libro del centro elegido.
+        """
+        if not desviable[fila]:
+            return None
+        propio = coste_ruta[fila, pos_ruta[centro]] if centro in pos_ruta else 0.0
+        mejor = None
+        for j, alt in enumerate(centros_ruta):
+            tu_alt = tu_ruta[fila, j]
+            extra = coste_ruta[fila, j] - propio
+            if alt == centro or tu_alt <= 0 or extra >= coste_espera:
+                continue
+            if mejor is not None and extra >= mejor[0]:
+                continue
+            cap_alt = horas_libres(libro, alt)[d]
+            q_alt = p if cap_alt + EPS >= horas_de(p, tu_alt) else min(p, cantidad_por_capacidad(cap_alt, tu_alt, minimo_parcial(libro, alt, tu_alt)))
+            if q_alt > 0:
+                mejor = (extra, j, alt, q_alt)
+        if mejor is None:
+            return None
+        _, j, alt, q_alt = mejor
+        arr = horas_libres(libro, alt)
+        arr[d] = max(0.0, arr[d] - horas_de(q_alt, tu_ruta[fila, j])) if q_alt == p else 0.0
+        return alt, q_alt
+
+    # Buffer por columnas (no una lista de dicts) que se vacía en cada bloque
+    buf = {c: [] for c in COLUMNAS_PROPUESTA if c != "Clase de orden"}
+    def volcar():
+        bloque = pd.DataFrame(buf)
+        for v in buf.values():
+            v.clear()
+        bloque["Clase de orden"] = "NORM"
+        return bloque[COLUMNAS_PROPUESTA]
+
+    def colocar(fila, centro, d, p, tu):
+        """Intenta fabricar `p` centésimas el día `d`.
+
+        Devuelve (centro, q, d): q > 0 si ese día se fabrica algo (en su
+        centro o desviado a otro); q == 0 si hay que esperar al día d.
+        """
+        cap_dias = horas_libres(libro, centro)
+        cap = cap_dias[d]
+        hnec = horas_de(p, tu)
+
+        if cap + EPS >= hnec:
+            cap_dias[d] = max(0.0, cap - hnec)
+            return centro, p, d
+        # Lote parcial: unidades enteras que caben; el resto de
+        # horas del día (menos de una unidad) queda consumido.
+        q = min(p, cantidad_por_capacidad(cap, tu, minimo_parcial(libro, centro, tu)))
+        if q > 0:
+            cap_dias[d] = 0.0
+            return centro, q, d
+        # Siguiente día con horas libres en el centro propio
+        libres = np.flatnonzero(cap_dias[d + 1:] > EPS)
+        d_sig = d + 1 + libres[0] if len(libres) else libro["horizonte"]
+        alternativa = mejor_desvio(fila, centro, d, p, coste_retraso * (d_sig - d)) if desviar else None
+        if alternativa is None:
+            return centro, 0, d_sig
+        return alternativa[0], alternativa[1], d
+
+    contador = 1
+    def emitir(material, destino, q, unidad, d, lote_min, lote_max):
+        nonlocal contador
+        buf["Nº de propuesta"].append(contador)
+        buf["Material"].append(material)
+        buf["Centro"].append(destino)
+        buf["Cantidad a fabricar"].append(de_centesimas(q))
+        buf["Unidad"].append(unidad)
+        buf["Fecha"].append(libro["fechas"][d])
+        buf["Semana"].append(libro["semanas"][d])      # (se usa internamente)
+        buf["Lote_min"].append(lote_min)
+        buf["Lote_max"].append(lote_max)
+        contador += 1
+
+    def encajar(fila, material, centro, unidad, d, lote_min, lote_max, tu, p):
+        """Coloca `p` centésimas desde el día `d` hacia adelante; devuelve el último día."""
+        while p > 0:
+            if d >= libro["horizonte"]:
+                ampliar_libro(libro)
+            destino, q, d = colocar(fila, centro, d, p, tu)
+            if q == 0:
+                continue
+            emitir(material, destino, q, unidad, d, lote_min, lote_max)
+            p -= q
+
+            if len(buf["Material"]) >= tam_bloque:
+                yield volcar()
+        return d
+
+    def encajar_atras(fila, material, centro, unidad, d, lote_min, lote_max, tu, p):
+        """Coloca `p` centésimas en los últimos días libres hasta el día `d`.
+
+        No se adelanta más de `atras` días ni antes de hoy; lo que no quepa
+        se planifica hacia adelante desde `d` como siempre.
+        """
+        cap_dias = horas_libres(libro, centro)
+        ant = indice_atras(libro, centro)
+        limite = max(0, dia_hoy, d - atras)
+        dia = ultimo_libre(ant, d)
+        while p > 0 and dia >= limite:
+            cap = cap_dias[dia]
+            hnec = horas_de(p, tu)
+            q = p if cap + EPS >= hnec else min(p, cantidad_por_capacidad(cap, tu, minimo_parcial(libro, centro, tu)))
+            if q > 0:
+                cap_dias[dia] = max(0.0, cap - hnec) if q == p else 0.0
+                emitir(material, centro, q, unidad, dia, lote_min, lote_max)
+                p -= q
+                if len(buf["Material"]) >= tam_bloque:
+                    yield volcar()
+            if cap_dias[dia] <= EPS:
+                ant[dia] = dia - 1
+            if p > 0:
+                dia = ultimo_libre(ant, dia - 1)
+        if p > 0:
+            d = yield from encajar(fila, material, centro, unidad, d, lote_min, lote_max, tu, p)
+        return d
+
+    colocar_lote = encajar if atras is None else encajar_atras
+
+    # Orden de los lotes con una política: el de salida de la cola de
+    # prioridad (las claves no cambian al planificar)
+    if orden is not None:
+        politica = POLITICAS_ORDEN[orden] if isinstance(orden, str) else orden
+        claves = list(zip(*[np.asarray(c).tolist() for c in politica(lotes)]))
+
+    llenar = motor_llenado(motor, lotes, libro, desviar, atras)
+    if llenar is not None:
+        secuencia = (
+            np.arange(len(lotes), dtype=np.int64) if orden is None
+            else np.array(sorted(range(len(lotes)), key=claves.__getitem__), dtype=np.int64)
+        )
+        yield from llenar_con_nucleo(llenar, lotes, secuencia, libro, len(df), tam_bloque)
+        return
+
+    columnas_lote = [
+        lotes["Fila"], lotes["Material"], lotes["Centro"], lotes["Unidad"], lotes["Dia"],
+        lotes["Lote_min"], lotes["Lote_max"], lotes["TU"], lotes["Cantidad a fabricar"]
+    ]
+
+    if orden is None:
+        # Orden de llegada (el de la agrupación: por material)
+        fila_previa = -1
+        for fila, material, centro, unidad, dia_fila, lote_min, lote_max, tu, p in zip(*columnas_lote):
+            # Los lotes de una misma fila siguen desde el día en que acabó el
+            # anterior (hacia atrás, todos parten de la fecha de necesidad)
+            if fila != fila_previa or atras is not None:
+                d = dia_fila
+                fila_previa = fila
+            d = yield from colocar_lote(fila, material, centro, unidad, d, lote_min, lote_max, tu, p)
+    else:
+        # Cola de prioridad por la clave de la política: cada lote que sale
+        # se encaja entero (desde su día de necesidad) antes del siguiente.
+        # Los lotes de una fila siguen desde donde acabó el anterior de esa
+        # fila, como en el orden de llegada.
+        datos = list(zip(*columnas_lote))
+        cola = [(claves[i], i) for i in range(len(datos))]
+        heapq.heapify(cola)
+        fin_fila = {}
+
+        while cola:
+            _, i = heapq.heappop(cola)
+            fila, material, centro, unidad, dia_fila, lote_min, lote_max, tu, p = datos[i]
+            d = dia_fila if atras is not None else max(dia_fila, fin_fila.get(fila, dia_fila))
+            fin_fila[fila] = yield from colocar_lote(fila, material, centro, unidad, d, lote_min, lote_max, tu, p)
+
+    if buf["Material"]:
+        yield volcar()
+
+def reunir_bloques(bloques, columnas=COLUMNAS_PROPUESTA):
+    """Concatena un flujo de bloques en un único DataFrame."""
+    bloques = list(bloques)
+    if not bloques:
+        return pd.DataFrame(columns=columnas)
+    return pd.concat(bloques, ignore_index=True)
+
+def modo_C(df_agr, df_mat, capacidades, DG_code, MCH_code, calendarios=None, plantas=None,
+           coste_retraso=None, orden=None, atras=None, consumido=None, tam_bloque=TAM_BLOQUE, motor=None, hoy=None):
+    """Versión no streaming de `modo_C_en_bloques`: devuelve la propuesta completa."""
+    return reunir_bloques(modo_C_en_bloques(
+        df_agr, df_mat, capacidades, DG_code, MCH_code, tam_bloque=tam_bloque,
+        calendarios=calendarios, plantas=plantas, coste_retraso=coste_retraso, orden=orden,
+        atras=atras, consumido=consumido, motor=motor, hoy=hoy
+    ))
+
+def consumo_de_propuestas(df_agr, propuesta, df_mat, DG_code, plantas=None):
+    """Libro de horas (Centro, Fecha, Horas) que deja `propuesta` al planificar `df_agr`.
+
+    Reproduce lo que hizo `modo_C_en_bloques` con la capacidad: las órdenes
+    que completan su lote descuentan sus horas y las parciales dejan el día
+    sin capacidad (Horas = inf). Las órdenes de la propuesta tienen que
+    venir en el orden en que se emitieron y cubrir enteros los lotes de
+    `df_agr` (con 'Lote_min' y 'Lote_max'), en el mismo orden.
+    """
+    lotes = dividir_lotes(
+        pd.DataFrame({
+            "Cantidad": a_float(df_agr["Cantidad"], 0).to_numpy(),
+            "Lote_min": a_float(df_agr["Lote_min"], 0).to_numpy(),
+            "Lote_max": a_float(df_agr["Lote_max"], 1).clip(lower=1.0).to_numpy(),
+        }),
+        "Cantidad", "Lote_min", "Lote_max", reparto="maximo",
+    )
+    fin_lotes = np.cumsum(np.rint(lotes["Cantidad a fabricar"].to_numpy() * ESCALA).astype(np.int64))
+
+    q = np.rint(propuesta["Cantidad a fabricar"].to_numpy(dtype=float) * ESCALA).astype(np.int64)
+    fin_ordenes = np.cumsum(q)
+    if len(fin_lotes) != 0 and (len(fin_ordenes) == 0 or fin_ordenes[-1] != fin_lotes[-1]):
+        raise ValueError("La propuesta no cubre los lotes de la demanda.")
+
+    tiempos = tiempos_fabricacion(df_mat)
+    tu = tiempo_por_centro(propuesta[["Material","Unidad","Centro"]].merge(
+        tiempos, on=["Material","Unidad"], how="left"
+    ), DG_code, plantas)
+    horas = np.where(np.isin(fin_ordenes, fin_lotes), horas_de(q, tu), np.inf)
+    return (
+        pd.DataFrame({"Centro": propuesta["Centro"].to_numpy(), "Fecha": propuesta["Fecha"].to_numpy(), "Horas": horas})
+        .groupby(["Centro", "Fecha"], as_index=False)["Horas"].sum()
+    )
+
+# ------------------------------------------------------------
+# Consumidores de la salida en bloques
+# ------------------------------------------------------------
+def tiempos_fabricacion(df_mat):
+    return indice(
+        df_mat, "tiempos",
+        lambda df: df[["Material","Unidad"] + columnas_tiempo(df)].drop_duplicates(),
+    )
+
+def calcular_horas(df_c, tiempos, DG_code, plantas=None):
+    """Añade los tiempos unitarios y la columna 'Horas' según el centro."""
+    df_c = df_c.merge(tiempos, on=["Material","Unidad"], how="left")
+    if plantas:
+        df_c["Horas"] = df_c["Cantidad a fabricar"] * tiempo_por_centro(df_c, DG_code, plantas)
+    else:
+        df_c["Horas"] = np.where(
+            df_c["Centro"].astype(str) == str(DG_code),
+            df_c["Cantidad a fabricar"] * df_c["Tiempo fabricación unidad DG"],
+            df_c["Cantidad a fabricar"] * df_c["Tiempo fabricación unidad MCH"]
+        )
+    return df_c
+
+def bloques_con_horas(bloques, df_mat, DG_code, plantas=None):
+    """Aplica `calcular_horas` a cada bloque según va llegando."""
+    tiempos = tiempos_fabricacion(df_mat)
+    for bloque in bloques:
+        yield calcular_horas(bloque, tiempos, DG_code, plantas)
+
+# ------------------------------------------------------------
+# Cubo de carga: Semana × Centro × Material
+# ------------------------------------------------------------
+# Se va agregando bloque a bloque mientras sale la propuesta; métricas,
+# gráficos, historial y comparaciones leen de aquí y no de la propuesta.
+CLAVES_CUBO = ["Semana","Centro","Material"]
+COLUMNAS_CUBO = CLAVES_CUBO + ["Horas","Cantidad","Propuestas"]
+
+def agregar_bloque(bloque):
+    """Horas, cantidad y nº de propuestas de un bloque por Semana × Centro × Material."""
+    claves = [bloque[c].astype(str) for c in CLAVES_CUBO]
+    return bloque.groupby(claves).agg(
+        Horas=("Horas", "sum"),
+        Cantidad=("Cantidad a fabricar", "sum"),
+        Propuestas=("Horas", "size"),
+    )
+
+def acumular_cubo(bloques, partes):
+    """Deja pasar los bloques y guarda en la lista `partes` su agregado."""
+    for bloque in bloques:
+        partes.append(agregar_bloque(bloque))
+        # Compactar de vez en cuando para que `partes` no crezca con el plan
+        if len(partes) >= 16:
+            partes[:] = [pd.concat(partes).groupby(level=[0, 1, 2]).sum()]
+        yield bloque
+
+def reunir_cubo(partes):
+    """Cubo final (formato largo, una fila por Semana × Centro × Material)."""
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_CUBO)
+    return pd.concat(partes).groupby(level=[0, 1, 2]).sum().reset_index()[COLUMNAS_CUBO]
+
+def horas_por_centro(cubo):
+    return cubo.groupby("Centro")["Horas"].sum().to_dict()
+
+def total_propuestas(cubo):
+    return int(cubo["Propuestas"].sum())
+
+def carga_semanal(cubo, centros=None, valor="Horas"):
+    """Tabla Semana × Centro de `valor`; `centros` fija el orden de las columnas."""
+    tabla = cubo.pivot_table(index="Semana", columns="Centro", values=valor, aggfunc="sum", fill_value=0).sort_index()
+    tabla.columns.name = "Centro"
+    if centros is not None:
+        tabla = tabla.reindex(columns=[str(c) for c in centros if str(c) in tabla.columns])
+    return tabla
+
+def exportar_en_bloques(bloques, ruta, columnas):
+    """Escribe un flujo de bloques de propuestas en un Excel sin juntarlos.
+
+    Se usa un libro `write_only` de openpyxl: las filas se escriben según
+    llegan los bloques y el libro no se guarda entero en memoria (como sí
+    hace `to_excel`). Devuelve el número de filas escritas.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(columnas)
+
+    total = 0
+    for bloque in bloques:
+        bloque = bloque[columnas].astype(object)
+        for fila in bloque.where(bloque.notna(), None).itertuples(index=False):
+            ws.append(list(fila))
+        total += len(bloque)
+
+    wb.save(ruta)
+    return total
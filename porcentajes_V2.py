@@ -2,9 +2,10 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-import math
 from datetime import datetime
 
+from lotes import dividir_lotes
+
 # Configuración de página
 st.set_page_config(
     page_title="Sistema de Cálculo de Fabricación",
@@ -95,28 +96,24 @@ def procesar_logica_estable(df_dem, df_mat, df_cli, df_cap, ajustes_semanales):
         'Tiempo fabricación unidad MCH': 'first'
     }).reset_index()
 
-    resultado_lotes = []
-    cont = 1
-    for _, fila in df_agrupado.iterrows():
-        cant_total = max(fila['Cantidad'], fila['Tamaño lote mínimo'])
-        num_ordenes = math.ceil(cant_total / fila['Tamaño lote máximo'])
-        cant_por_orden = round(cant_total / num_ordenes, 2)
-
-        for _ in range(num_ordenes):
-            t_fab = fila['Tiempo fabricación unidad DG'] if fila['Centro_Final'] == C1 else fila['Tiempo fabricación unidad MCH']
-            resultado_lotes.append({
-                'Nº de propuesta': cont,
-                'Material': fila['Material'],
-                'Centro': fila['Centro_Final'],
-                'Clase de orden': 'NORM',
-                'Cantidad a fabricar': cant_por_orden,
-                'Unidad': fila['Unidad'],
-                'Fecha de fabricación': pd.to_datetime(fila['Fecha de necesidad']).strftime('%Y%m%d'),
-                'Semana': fila['Semana_Label'],
-                'Horas': cant_por_orden * t_fab
-            })
-            cont += 1
-    return pd.DataFrame(resultado_lotes)
+    df_lotes = dividir_lotes(df_agrupado, reparto="igual")
+    t_fab = np.where(
+        df_lotes['Centro_Final'] == C1,
+        df_lotes['Tiempo fabricación unidad DG'],
+        df_lotes['Tiempo fabricación unidad MCH']
+    )
+
+    return pd.DataFrame({
+        'Nº de propuesta': df_lotes['Nº de propuesta'],
+        'Material': df_lotes['Material'],
+        'Centro': df_lotes['Centro_Final'],
+        'Clase de orden': 'NORM',
+        'Cantidad a fabricar': df_lotes['Cantidad a fabricar'],
+        'Unidad': df_lotes['Unidad'],
+        'Fecha de fabricación': pd.to_datetime(df_lotes['Fecha de necesidad']).dt.strftime('%Y%m%d'),
+        'Semana': df_lotes['Semana_Label'],
+        'Horas': df_lotes['Cantidad a fabricar'] * t_fab
+    })
 
 # ==========================================
 # INTERFAZ PRINCIPAL
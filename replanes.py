@@ -0,0 +1,109 @@
+# ============================================================
+# REPLANES — Caché de re‑planificaciones y deshacer / rehacer
+# ============================================================
+# Cada re‑planificación se guarda con una clave que resume la propuesta
+# base, los porcentajes (normalizados) y el resto de entradas; volver a
+# una configuración ya evaluada no vuelve a planificar. La caché es LRU
+# con un límite de memoria y vive en la sesión de cada usuario. Las
+# configuraciones aplicadas forman un historial lineal para deshacer y
+# rehacer.
+
+import json
+import hashlib
+from collections import OrderedDict
+
+# Memoria máxima de los resultados guardados por sesión
+LIMITE_CACHE = 256 * 2**20
+
+
+def nueva_cache(limite=LIMITE_CACHE):
+    return {
+        "entradas": OrderedDict(),   # clave -> (valor, bytes)
+        "bytes": 0,
+        "limite": limite,
+        "pasos": [],                 # [(clave, ajustes, opciones)] en orden de aplicación
+        "posicion": -1,
+    }
+
+
+# ------------------------------------------------------------
+# Claves
+# ------------------------------------------------------------
+def normalizar_ajustes(ajustes):
+    """Porcentajes con claves de texto y valores redondeados (iguales ⇒ misma clave)."""
+    def valor(v):
+        if isinstance(v, dict):
+            return {str(c): round(float(x), 4) for c, x in v.items()}
+        return round(float(v), 4)
+    return {str(sem): valor(v) for sem, v in ajustes.items()}
+
+
+def clave_replan(firma_base, ajustes, **opciones):
+    """Clave de una re‑planificación: propuesta base + porcentajes + opciones."""
+    texto = json.dumps(
+        [firma_base, normalizar_ajustes(ajustes), opciones], sort_keys=True, default=str
+    )
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def tamano(*dfs):
+    """Bytes que ocupan los DataFrames (para el límite de la caché)."""
+    return int(sum(df.memory_usage(index=True, deep=True).sum() for df in dfs if df is not None))
+
+
+# ------------------------------------------------------------
+# Caché LRU
+# ------------------------------------------------------------
+def buscar(cache, clave):
+    """Resultado guardado para `clave` (o None); lo marca como el más reciente."""
+    entrada = cache["entradas"].get(clave)
+    if entrada is None:
+        return None
+    cache["entradas"].move_to_end(clave)
+    return entrada[0]
+
+
+def guardar(cache, clave, valor, bytes_valor):
+    """Guarda `valor` y descarta los menos usados hasta volver al límite.
+
+    El último resultado se conserva siempre, aunque supere el límite.
+    Devuelve las claves descartadas.
+    """
+    entradas = cache["entradas"]
+    if clave in entradas:
+        cache["bytes"] -= entradas.pop(clave)[1]
+    entradas[clave] = (valor, bytes_valor)
+    cache["bytes"] += bytes_valor
+    descartadas = []
+    while cache["bytes"] > cache["limite"] and len(entradas) > 1:
+        vieja, (_, b) = entradas.popitem(last=False)
+        cache["bytes"] -= b
+        descartadas.append(vieja)
+    return descartadas
+
+
+# ------------------------------------------------------------
+# Deshacer / rehacer
+# ------------------------------------------------------------
+def registrar_paso(cache, clave, ajustes, opciones=None):
+    """Añade una configuración aplicada; lo que hubiera para rehacer se pierde."""
+    pasos = cache["pasos"]
+    if 0 <= cache["posicion"] < len(pasos) and pasos[cache["posicion"]][0] == clave:
+        return
+    del pasos[cache["posicion"] + 1:]
+    pasos.append((clave, ajustes, opciones or {}))
+    cache["posicion"] = len(pasos) - 1
+
+
+def puede_deshacer(cache):
+    return cache["posicion"] > 0
+
+
+def puede_rehacer(cache):
+    return cache["posicion"] < len(cache["pasos"]) - 1
+
+
+def mover(cache, paso):
+    """Se mueve `paso` posiciones (-1 deshacer, +1 rehacer) y devuelve (clave, ajustes, opciones)."""
+    cache["posicion"] = min(max(cache["posicion"] + paso, 0), len(cache["pasos"]) - 1)
+    return cache["pasos"][cache["posicion"]]
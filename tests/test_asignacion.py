@@ -0,0 +1,40 @@
+import pandas as pd
+
+from asignacion import matriz_costes, asignar_centros
+
+PLANTAS = {"0833": "DG", "0184": "MCH", "0200": "VAL"}
+
+
+def _demanda(**columnas):
+    base = {
+        "Cantidad": [10.0, 10.0, 10.0],
+        "Coste unitario DG": [1.0, 3.0, 1.0], "Coste unitario MCH": [2.0, 1.0, 2.0],
+        "Coste unitario VAL": [3.0, 2.0, 0.5],
+        "Distáncia a DG": 100, "Distáncia a MCH": 100, "Distancia a 0200": 100,
+        "Coste del envío DG": 0.01, "Coste del envío MCH": 0.01, "Coste del envío VAL": 0.01,
+    }
+    return pd.DataFrame({**base, **columnas})
+
+
+def test_elige_el_centro_de_menor_coste():
+    costes, permitido = matriz_costes(_demanda(), PLANTAS)
+    # Cantidad × (unitario + distancia × envío)
+    assert costes[0].tolist() == [20.0, 30.0, 40.0]
+    assert asignar_centros(costes, permitido, PLANTAS).tolist() == ["0833", "0184", "0200"]
+
+    # Los centros sin capacidad no se eligen
+    costes, permitido = matriz_costes(_demanda(), PLANTAS, {"0833": 40, "0184": 40, "0200": 0})
+    assert asignar_centros(costes, permitido, PLANTAS).tolist() == ["0833", "0184", "0833"]
+
+
+def test_cliente_exclusivo_manda_sobre_el_coste():
+    df = _demanda(**{"Exclusivo MCH": ["X", "", " x "], "Exclusico DG": ["", "", ""]})
+    costes, permitido = matriz_costes(df, PLANTAS)
+    assert permitido.tolist() == [[False, True, False], [True, True, True], [False, True, False]]
+    assert asignar_centros(costes, permitido, PLANTAS).tolist() == ["0184", "0184", "0184"]
+
+    # Si el centro exclusivo no tiene capacidad, la fila se queda sin opción
+    # y se elige entre todos por coste; la no exclusiva evita 0184
+    costes, permitido = matriz_costes(df, PLANTAS, {"0833": 40, "0184": 0, "0200": 40})
+    assert not permitido[0].any() and not permitido[2].any()
+    assert asignar_centros(costes, permitido, PLANTAS).tolist() == ["0833", "0200", "0200"]
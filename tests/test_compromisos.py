@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from compromisos import liberar_plan, cargar_carga_comprometida, cargar_demanda_comprometida
+
+
+def _plan(horas):
+    propuesta = pd.DataFrame({"Centro": ["0833", "0833"], "Fecha": ["02.11.2026", "03.11.2026"], "Horas": horas})
+    demanda = pd.DataFrame({
+        "Material": ["M1"], "Unidad": ["UN"], "Fecha": ["2026-11-03"], "Cantidad": [sum(horas) * 10],
+    })
+    return propuesta, demanda
+
+
+def test_liberar_dos_veces_el_mismo_calculo_sustituye(tmp_path):
+    ruta = str(tmp_path / "historial.db")
+    liberar_plan(*_plan([4.0, 6.0]), firma="calculo-1", ruta=ruta)
+    liberar_plan(*_plan([5.0, 2.0]), firma="calculo-1", ruta=ruta)  # el re‑planificado
+    carga = cargar_carga_comprometida(ruta).sort_values("Fecha")
+    assert carga["Horas"].tolist() == pytest.approx([5.0, 2.0])
+    assert cargar_demanda_comprometida(ruta)["Cantidad"].tolist() == pytest.approx([70.0])
+
+    # Otro cálculo sí se suma
+    liberar_plan(*_plan([1.0, 1.0]), firma="calculo-2", ruta=ruta)
+    carga = cargar_carga_comprometida(ruta).sort_values("Fecha")
+    assert carga["Horas"].tolist() == pytest.approx([6.0, 3.0])
+    assert cargar_demanda_comprometida(ruta)["Cantidad"].tolist() == pytest.approx([90.0])
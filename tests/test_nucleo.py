@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo import caso_sintetico, comparar_motores, compilado
+
+
+@pytest.mark.parametrize("orden", [None, "fecha", "prioridad", "lote"])
+@pytest.mark.parametrize("n_filas, dias, tam_bloque, capacidad", [
+    (300, 30, 50_000, None),
+    (100, 20, 13, 60.0),  # bloques pequeños y libro que se amplía
+])
+def test_nucleo_igual_que_python(orden, n_filas, dias, tam_bloque, capacidad):
+    caso = caso_sintetico(n_filas=n_filas, dias=dias, capacidad=capacidad)
+    consumido = pd.DataFrame({"Centro": [caso[3]], "Fecha": [caso[0]["Fecha"].iloc[0]], "Horas": [np.inf]})
+    for opciones in ({}, {"consumido": consumido}):
+        r = comparar_motores(*caso, motor="nucleo", orden=orden, tam_bloque=tam_bloque, **opciones)
+        assert r["iguales"] and r["filas"] > 0
+
+
+@pytest.mark.skipif(compilado() is None, reason="numba no está instalado")
+def test_nucleo_compilado_igual_que_python():
+    r = comparar_motores(*caso_sintetico(n_filas=300, dias=30), motor="jit", orden="fecha")
+    assert r["iguales"]
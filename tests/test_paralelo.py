@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import paralelo
+
+from ingesta import reiniciar_pool
+from nucleo import caso_sintetico
+from planificador import modo_C_en_bloques, reunir_bloques
+
+
+@pytest.fixture(autouse=True)
+def _sin_pool():
+    yield
+    reiniciar_pool()
+
+
+@pytest.mark.parametrize("orden", [None, "fecha", "prioridad"])
+def test_por_centros_igual_que_un_solo_proceso(orden, monkeypatch):
+    df_agr, df_mat, capacidades, DG, MCH = caso_sintetico(n_filas=600, dias=30, centros=("0833", "0184", "0200"))
+    opciones = {"orden": orden, "tam_bloque": 97}
+    serie = reunir_bloques(modo_C_en_bloques(df_agr, df_mat, capacidades, DG, MCH, **opciones))
+    # Sin recurrir al cálculo en el propio proceso
+    def en_proceso(*args, **kwargs):
+        raise AssertionError("se planificó sin el pool")
+    monkeypatch.setattr(paralelo, "modo_C_en_bloques", en_proceso)
+    bloques = list(paralelo.planificar_por_centros(df_agr, df_mat, capacidades, DG, MCH, procesos=2, minimo_filas=0, **opciones))
+    por_centros = reunir_bloques(bloques)
+    assert all(len(b) <= 97 for b in bloques)
+    if orden is None:
+        pd.testing.assert_frame_equal(por_centros, serie)
+    else:
+        # Mismas órdenes; la numeración va por material, unidad y centro
+        columnas = [c for c in serie.columns if c != "Nº de propuesta"]
+        ordenar = lambda df: df[columnas].sort_values(columnas, ignore_index=True)
+        pd.testing.assert_frame_equal(ordenar(por_centros), ordenar(serie))
+        assert por_centros["Nº de propuesta"].tolist() == list(range(1, len(serie) + 1))
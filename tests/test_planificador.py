@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+from planificador import modo_C, modo_C_en_bloques, reunir_bloques
+
+
+def _demanda_futura(n=40):
+    """Demanda con necesidad desde el 02/11/2026 y capacidad justa (fuerza a adelantar)."""
+    df_mat = pd.DataFrame({
+        "Material": [f"M{k}" for k in range(4)], "Unidad": "UN",
+        "Tiempo fabricación unidad DG": 0.5, "Tiempo fabricación unidad MCH": 0.5,
+        "Tamaño lote mínimo": 0.0, "Tamaño lote máximo": 100.0,
+    })
+    fechas = pd.Timestamp("2026-11-02") + pd.to_timedelta([k % 5 for k in range(n)], unit="D")
+    df_agr = pd.DataFrame({
+        "Material": [f"M{k % 4}" for k in range(n)], "Unidad": "UN", "Centro": "0833",
+        "Cantidad": 200.0, "Fecha": fechas.strftime("%Y-%m-%d"), "Semana": "",
+    })
+    return df_agr, df_mat, {"0833": 40.0, "0184": 40.0}
+
+
+def test_hacia_atras_no_planifica_en_el_pasado():
+    df_agr, df_mat, capacidades = _demanda_futura()
+    hoy = pd.Timestamp("2026-10-19")
+    propuesta = reunir_bloques(modo_C_en_bloques(df_agr, df_mat, capacidades, "0833", "0184", atras=30, hoy=hoy))
+    fechas = pd.to_datetime(propuesta["Fecha"], format="%d.%m.%Y")
+    assert len(propuesta)
+    assert (fechas < pd.Timestamp("2026-11-02")).any()  # sí se adelanta
+    assert (fechas >= hoy).all()
+
+    # La versión no streaming pasa las mismas opciones
+    completa = modo_C(df_agr, df_mat, capacidades, "0833", "0184", atras=30, hoy=hoy, tam_bloque=7, motor="python")
+    pd.testing.assert_frame_equal(completa, propuesta)
+
+
+def test_unidad_mas_larga_que_un_dia_se_reparte_en_centesimas():
+    df_mat = pd.DataFrame({
+        "Material": ["M"], "Unidad": "UN",
+        "Tiempo fabricación unidad DG": 10.0, "Tiempo fabricación unidad MCH": 10.0,
+        "Tamaño lote mínimo": 0.0, "Tamaño lote máximo": 100.0,
+    })
+    df_agr = pd.DataFrame({
+        "Material": ["M"], "Unidad": "UN", "Centro": "0833", "Cantidad": [3.0],
+        "Fecha": ["2026-11-02"], "Semana": "",
+    })
+    for motor in ("python", "nucleo"):
+        propuesta = reunir_bloques(modo_C_en_bloques(
+            df_agr, df_mat, {"0833": 8.0, "0184": 8.0}, "0833", "0184", motor=motor
+        ))
+        assert propuesta["Cantidad a fabricar"].tolist() == [0.8, 0.8, 0.8, 0.6]
+
+
+def test_fechas_iso_no_se_leen_como_dia_primero():
+    df_agr, df_mat, capacidades = _demanda_futura(n=1)
+    df_agr["Fecha"] = ["2025-01-06"]
+    propuesta = reunir_bloques(modo_C_en_bloques(df_agr, df_mat, capacidades, "0833", "0184"))
+    assert propuesta["Fecha"].iloc[0] == "06.01.2025"
+    assert propuesta["Semana"].iloc[0] == "2025-W02"
+
+
+def test_desvio_manda_el_exceso_a_la_otra_planta():
+    # Un día de demanda en 0833 con el doble de horas de las que tiene
+    df_agr, df_mat, _ = _demanda_futura(n=1)
+    df_agr["Cantidad"] = [160.0]  # 80 h a 0,5 h/unidad
+    df_mat["Coste unitario DG"], df_mat["Coste unitario MCH"] = 1.0, 1.2
+    capacidades = {"0833": 40.0, "0184": 40.0}
+    plantas = {"0833": "DG", "0184": "MCH"}
+
+    propuesta = reunir_bloques(modo_C_en_bloques(
+        df_agr, df_mat, capacidades, "0833", "0184", plantas=plantas, coste_retraso=1.0
+    ))
+    el_dia = propuesta[propuesta["Fecha"] == "02.11.2026"].groupby("Centro")["Cantidad a fabricar"].sum()
+    assert el_dia.to_dict() == {"0184": 80.0, "0833": 80.0}
+
+    # Sin coste de retraso, o si el cliente es exclusivo, el exceso espera en 0833
+    df_agr["Desviable"] = False
+    for opciones in ({}, {"coste_retraso": 1.0}):
+        propuesta = reunir_bloques(modo_C_en_bloques(
+            df_agr, df_mat, capacidades, "0833", "0184", plantas=plantas, **opciones
+        ))
+        assert set(propuesta["Centro"]) == {"0833"}
+        assert propuesta["Fecha"].nunique() == 2
+
+
+@pytest.mark.parametrize("orden, esperado", [
+    (None, ["A", "B", "C"]),          # como llegan
+    ("fecha", ["B", "C", "A"]),       # día de necesidad (empate: como llegan)
+    ("prioridad", ["B", "A", "C"]),   # prioridad del cliente y luego día
+    ("lote", ["C", "B", "A"]),        # día y luego el lote más pequeño
+])
+def test_orden_de_colocacion_por_politica(orden, esperado):
+    df_agr, df_mat, capacidades = _demanda_futura(n=3)
+    df_agr["Material"] = ["A", "B", "C"]
+    df_agr["Fecha"] = ["2026-11-03", "2026-11-02", "2026-11-02"]
+    df_agr["Cantidad"] = [80.0, 80.0, 40.0]
+    df_agr["Prioridad"] = [2, 1, 3]
+    df_mat["Material"] = ["A", "B", "C", "D"]
+    propuesta = reunir_bloques(modo_C_en_bloques(df_agr, df_mat, capacidades, "0833", "0184", orden=orden))
+    colocados = propuesta.sort_values("Nº de propuesta")["Material"].drop_duplicates().tolist()
+    assert colocados == esperado
@@ -0,0 +1,49 @@
+from replanes import (
+    nueva_cache, clave_replan, buscar, guardar, registrar_paso, puede_deshacer, puede_rehacer, mover,
+)
+
+
+def test_lru_descarta_las_menos_usadas():
+    cache = nueva_cache(limite=300)
+    assert guardar(cache, "a", "A", 100) == []
+    assert guardar(cache, "b", "B", 100) == []
+    assert guardar(cache, "c", "C", 100) == []
+    assert buscar(cache, "a") == "A"  # "a" pasa a ser la más reciente
+    assert guardar(cache, "d", "D", 150) == ["b", "c"]
+    assert list(cache["entradas"]) == ["a", "d"] and cache["bytes"] == 250
+    assert buscar(cache, "b") is None
+    # El último resultado se conserva aunque pase del límite
+    assert guardar(cache, "e", "E", 500) == ["a", "d"]
+    assert buscar(cache, "e") == "E"
+
+
+def test_deshacer_y_rehacer_siguen_el_orden_de_aplicacion():
+    cache = nueva_cache()
+    for clave in ("a", "b", "c"):
+        registrar_paso(cache, clave, {"2026-W45": clave})
+    assert puede_deshacer(cache) and not puede_rehacer(cache)
+    assert mover(cache, -1)[0] == "b"
+    assert mover(cache, -1)[0] == "a"
+    assert not puede_deshacer(cache)
+    assert mover(cache, -1)[0] == "a"  # no pasa del primero
+    assert mover(cache, +1)[0] == "b"
+    # Aplicar otra configuración descarta lo que quedaba por rehacer
+    registrar_paso(cache, "d", {})
+    assert [p[0] for p in cache["pasos"]] == ["a", "b", "d"]
+    assert not puede_rehacer(cache)
+    # Repetir la configuración actual no añade un paso
+    registrar_paso(cache, "d", {})
+    assert len(cache["pasos"]) == 3
+
+
+def test_la_clave_cambia_con_la_base_y_las_opciones():
+    ajustes = {"2026-W45": 60}
+    clave = clave_replan("base", ajustes, valla=None, orden=None)
+    assert clave_replan("base", {"2026-W45": 60.00001}, valla=None, orden=None) == clave
+    assert clave_replan("otra base", ajustes, valla=None, orden=None) != clave
+    assert clave_replan("base", ajustes, valla="2026-W46", orden=None) != clave
+    assert clave_replan("base", ajustes, valla=None, orden="fecha") != clave
+
+    cache = nueva_cache()
+    guardar(cache, clave, "resultado", 10)
+    assert buscar(cache, clave_replan("base", ajustes, valla=None, orden="fecha")) is None
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import V3
+from asignacion import plantas_por_centro
+from V3 import ejecutar_modoC_base, replanificar_con_porcentajes, lunes_semana
+
+
+def _entradas(n_dem=400, n_mat=12, n_cli=6, semilla=0):
+    """Capacidad, materiales, clientes y demanda sintéticos (columnas ya canónicas)."""
+    rng = np.random.default_rng(semilla)
+    df_cap = pd.DataFrame({"Planta": ["DG", "MCH"], "Centro": [833, 184], "Capacidad horas": [40, 20]})
+    materiales = [f"M{i:04d}" for i in range(n_mat)]
+    df_mat = pd.DataFrame({
+        "Material": materiales, "Unidad": "UN",
+        "Tiempo fabricación unidad DG": rng.uniform(0.01, 0.2, n_mat).round(3),
+        "Tiempo fabricación unidad MCH": rng.uniform(0.01, 0.2, n_mat).round(3),
+        "Coste unitario DG": rng.uniform(1, 5, n_mat).round(2),
+        "Coste unitario MCH": rng.uniform(1, 5, n_mat).round(2),
+        "Tamaño lote mínimo": rng.integers(10, 50, n_mat),
+        "Tamaño lote máximo": rng.integers(100, 300, n_mat),
+        "% fijo DG": 0, "% fijo MCH": 0,
+    })
+    clientes = [f"C{i:03d}" for i in range(n_cli)]
+    df_cli = pd.DataFrame({
+        "Cliente": clientes,
+        "Distáncia a DG": rng.integers(10, 900, n_cli), "Distáncia a MCH": rng.integers(10, 900, n_cli),
+        "Coste del envío DG": 0.1, "Coste del envío MCH": 0.12,
+        "Exclusico DG": "", "Exclusivo MCH": "",
+    })
+    df_dem = pd.DataFrame({
+        "Material": rng.choice(materiales, n_dem), "Unidad": "UN",
+        "Cantidad": rng.integers(1, 700, n_dem).astype(float),
+        "Fecha de necesidad": pd.Timestamp("2025-03-03") + pd.to_timedelta(rng.integers(0, 60, n_dem), unit="D"),
+        "Cliente": rng.choice(clientes, n_dem),
+    })
+    return df_cap, df_mat, df_cli, df_dem
+
+
+@pytest.mark.parametrize("opciones", [
+    {}, {"atras": 7}, {"coste_retraso": 0.5},
+    {"orden": "fecha"}, {"orden": "prioridad"}, {"orden": "lote"},
+])
+def test_incremental_igual_que_recalcular(opciones):
+    df_cap, df_mat, df_cli, df_dem = _entradas()
+    estado = ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem, **opciones)[5]
+    df_dem = df_dem.copy()
+    df_dem.loc[df_dem["Material"].isin(["M0005", "M0009"]), "Cantidad"] *= 1.5
+
+    completo = ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem, **opciones)[0]
+    incremental, *_, estado = ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem, previo=estado, **opciones)
+    assert estado["cambiados"] == 2
+    if "orden" not in opciones:
+        pd.testing.assert_frame_equal(incremental, completo)
+    else:
+        # Con políticas de orden salen las mismas órdenes, pero la numeración puede variar
+        columnas = [c for c in completo.columns if c != "Nº de propuesta"]
+        ordenar = lambda df: df[columnas].sort_values(columnas, ignore_index=True)
+        pd.testing.assert_frame_equal(ordenar(incremental), ordenar(completo))
+        assert sorted(incremental["Nº de propuesta"]) == list(range(1, len(completo) + 1))
+
+
+def test_replan_conserva_las_semanas_congeladas(monkeypatch):
+    df_cap, df_mat, df_cli, df_dem = _entradas()
+    df_base, capacidades, DG, MCH, *_ = ejecutar_modoC_base(df_cap, df_mat, df_cli, df_dem, atras=14)
+    valla = "2025-W14"
+    congeladas = df_base[df_base["Semana"] < valla].reset_index(drop=True)
+    assert len(congeladas)
+
+    # Se guarda el libro de horas con el que se re‑planifica
+    libros = []
+    planificar = V3.modo_C_en_bloques
+    def espia(*args, consumido=None, **kwargs):
+        libros.append(consumido)
+        return planificar(*args, consumido=consumido, **kwargs)
+    monkeypatch.setattr(V3, "modo_C_en_bloques", espia)
+
+    df_final, _ = replanificar_con_porcentajes(
+        df_base, df_mat, capacidades, DG, MCH, {"2025-W15": 80}, plantas=plantas_por_centro(df_cap, DG, MCH),
+        atras=14, valla=valla,
+    )
+    # Las órdenes congeladas van primero y sin cambios
+    pd.testing.assert_frame_equal(df_final.iloc[:len(congeladas)], congeladas)
+
+    # Sus horas quedan reservadas en el libro de capacidad
+    reservado = libros[0].groupby(["Centro", "Fecha"])["Horas"].sum()
+    congelado = congeladas.groupby(["Centro", "Fecha"])["Horas"].sum()
+    assert (reservado.reindex(congelado.index) >= congelado - 1e-9).all()
+
+    # Las nuevas no entran en la ventana congelada ni pasan de la capacidad
+    # que dejan libre las congeladas
+    nuevas = df_final.iloc[len(congeladas):]
+    assert (pd.to_datetime(nuevas["Fecha"], format="%d.%m.%Y") >= lunes_semana(valla)).all()
+    horas = df_final.groupby(["Centro", "Fecha"])["Horas"].sum()
+    assert (horas <= horas.index.get_level_values("Centro").map(capacidades) + 1e-6).all()
+
+    # La numeración sigue tras la de las congeladas
+    assert nuevas["Nº de propuesta"].tolist() == list(
+        range(congeladas["Nº de propuesta"].max() + 1, congeladas["Nº de propuesta"].max() + 1 + len(nuevas))
+    )
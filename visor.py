@@ -0,0 +1,129 @@
+# ============================================================
+# VISOR — Tablas grandes paginadas en el servidor
+# ============================================================
+# En lugar de mandar al navegador la propuesta completa (cientos de miles
+# de filas en cada rerun), se filtra y ordena aquí y solo se envía la
+# página pedida. Para los archivos subidos se muestra una cabecera corta y
+# un resumen por columna calculado una única vez al cargar.
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+TAMANOS_PAGINA = [50, 100, 250, 500, 1000]
+
+# Filas de la vista previa de los archivos subidos
+FILAS_VISTA_PREVIA = 100
+
+TODOS = "Todos"
+
+
+# ------------------------------------------------------------
+# Filtro, orden y paginado (sin Streamlit)
+# ------------------------------------------------------------
+def filtrar(df, material=None, centro=None, semana=None):
+    """Filas de `df` que cumplen los filtros (texto de material contenido, centro y semana exactos)."""
+    mascara = np.ones(len(df), dtype=bool)
+    if material:
+        mascara &= df["Material"].astype(str).str.contains(material, case=False, regex=False).to_numpy()
+    if centro:
+        mascara &= (df["Centro"].astype(str) == str(centro)).to_numpy()
+    if semana and "Semana" in df.columns:
+        mascara &= (df["Semana"].astype(str) == str(semana)).to_numpy()
+    return df if mascara.all() else df[mascara]
+
+
+def pagina_de(df, pagina, tam_pagina, orden=None, ascendente=True):
+    """Página `pagina` (desde 0) de `df` ordenado por `orden`.
+
+    Solo se copian las filas de la página: el orden se calcula sobre la
+    columna (argsort estable) y se indexa con las posiciones de la página.
+    """
+    inicio = pagina * tam_pagina
+    if orden is None or orden not in df.columns:
+        return df.iloc[inicio:inicio + tam_pagina]
+    valores = df[orden].to_numpy()
+    try:
+        posiciones = np.argsort(valores, kind="stable")
+    except TypeError:
+        # Columnas con tipos mezclados (códigos numéricos y texto)
+        posiciones = np.argsort(valores.astype(str), kind="stable")
+    if not ascendente:
+        posiciones = posiciones[::-1]
+    return df.iloc[posiciones[inicio:inicio + tam_pagina]]
+
+
+def resumen_columnas(df):
+    """Tipo, nulos, distintos y rango de cada columna (vista previa de archivos)."""
+    filas = []
+    for c in df.columns:
+        s = df[c]
+        num = pd.to_numeric(s, errors="coerce") if pd.api.types.is_string_dtype(s) else s
+        es_num = pd.api.types.is_numeric_dtype(num) and num.notna().any()
+        filas.append({
+            "Columna": str(c),
+            "Tipo": str(s.dtype),
+            "Nulos": int(s.isna().sum()),
+            "Distintos": int(s.nunique(dropna=True)),
+            "Mín": float(num.min()) if es_num else None,
+            "Máx": float(num.max()) if es_num else None,
+        })
+    return pd.DataFrame(filas)
+
+
+# ------------------------------------------------------------
+# Componentes de Streamlit
+# ------------------------------------------------------------
+def visor_paginado(df, clave, columnas=None, alto=420, centros=None, semanas=None):
+    """Tabla con filtros por material/centro/semana, orden y paginado en el servidor.
+
+    `clave` distingue los widgets de cada visor en la misma página. Las
+    opciones de centro y semana pueden venir ya calculadas (del cubo de
+    carga) para no recorrer la propuesta en cada rerun.
+    """
+    f1, f2, f3 = st.columns(3)
+    material = f1.text_input("Material", key=f"{clave}_material").strip()
+    if centros is None:
+        centros = sorted(df["Centro"].dropna().astype(str).unique()) if "Centro" in df.columns else []
+    centro = f2.selectbox("Centro", [TODOS] + centros, key=f"{clave}_centro")
+    if semanas is None:
+        semanas = sorted(df["Semana"].dropna().astype(str).unique()) if "Semana" in df.columns else []
+    semana = f3.selectbox("Semana", [TODOS] + semanas, key=f"{clave}_semana")
+
+    columnas = [c for c in (columnas or df.columns) if c in df.columns]
+    o1, o2, o3, o4 = st.columns([2, 1, 1, 1])
+    orden = o1.selectbox("Ordenar por", columnas, key=f"{clave}_orden")
+    ascendente = o2.selectbox("Sentido", ["Ascendente", "Descendente"], key=f"{clave}_sentido") == "Ascendente"
+    tam = o3.selectbox("Filas por página", TAMANOS_PAGINA, key=f"{clave}_tam")
+
+    filtrado = filtrar(
+        df, material or None,
+        None if centro == TODOS else centro,
+        None if semana == TODOS else semana,
+    )
+    total = len(filtrado)
+    n_paginas = max(1, -(-total // tam))
+    # Si el filtro deja menos páginas, se vuelve a la primera
+    if st.session_state.get(f"{clave}_pagina", 1) > n_paginas:
+        st.session_state[f"{clave}_pagina"] = 1
+    pagina = int(o4.number_input("Página", min_value=1, max_value=n_paginas, key=f"{clave}_pagina")) - 1
+
+    st.dataframe(
+        pagina_de(filtrado, pagina, tam, orden, ascendente)[columnas],
+        use_container_width=True, height=alto, hide_index=True,
+    )
+    desde = pagina * tam + 1 if total else 0
+    hasta = min(total, (pagina + 1) * tam)
+    st.caption(f"Filas {desde:,}–{hasta:,} de {total:,} · página {pagina + 1} de {n_paginas}".replace(",", "."))
+
+
+def vista_previa(df, resumen=None, alto=400):
+    """Primeras filas de un archivo subido más su resumen por columnas."""
+    st.dataframe(df.head(FILAS_VISTA_PREVIA), use_container_width=True, height=alto)
+    st.caption(
+        f"{len(df):,} filas · {df.shape[1]} columnas".replace(",", ".")
+        + (f" (se muestran las {FILAS_VISTA_PREVIA} primeras)" if len(df) > FILAS_VISTA_PREVIA else "")
+    )
+    with st.expander("Resumen por columna"):
+        st.dataframe(resumen if resumen is not None else resumen_columnas(df),
+                     use_container_width=True, hide_index=True)